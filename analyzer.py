@@ -1,9 +1,235 @@
+import collections
+import copy
+import logging
 import re
-import spacy
+
+from cache import AnalysisCache, make_cache_key
+from cleaning import clean_line, clean_text
+from instrumentation import NULL_TRACE
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisError(Exception):
+    """バッチ解析中に特定の文書で発生したエラー (index で入力位置を特定できる)"""
+
+    def __init__(self, index, error):
+        super().__init__(f"文書 {index} の解析中にエラーが発生しました: {error}")
+        self.index = index
+        self.error = error
+
+
+# 動詞句に部分木ごと含める依存関係
+VP_SUBTREE_DEPS = frozenset([
+    'dobj', 'iobj', 'attr', 'acomp', 'xcomp', 'ccomp', # 補語/引数
+    'advmod', 'prep', 'prt', 'neg', 'agent', 'oprd', 'advcl', # 修飾語
+    'csubj', 'csubjpass', 'obj', 'obl', # その他の引数/補語
+    'relcl', 'acl' # 関係節や形容詞句が動詞の補語/修飾語となる場合
+])
+
+# トークン情報のキー (この順序で辞書を作る)
+TOKEN_FIELDS = (
+    'id', 'text', 'lemma', 'pos', 'tag', 'dep', 'dep_japanese', 'head_id', 'children_ids',
+    'is_root', 'pos_japanese', 'start', 'end', 'morph', 'morph_japanese', 'ent_type',
+    'ent_type_japanese', 'is_entity_part', 'entity_text', 'entity_type',
+)
+# 日本語訳のキー -> 翻訳元となるキー
+JAPANESE_FIELDS = {
+    'dep_japanese': 'dep',
+    'pos_japanese': 'pos',
+    'morph_japanese': 'morph',
+    'ent_type_japanese': 'ent_type',
+}
+
+# 解析プロファイル: 無効にするパイプライン部品、出力しないトークン情報のキー、句を抽出するか
+ENTITY_FIELDS = ('ent_type', 'ent_type_japanese', 'is_entity_part', 'entity_text', 'entity_type')
+DEPENDENCY_FIELDS = ('dep', 'dep_japanese', 'head_id', 'children_ids', 'is_root')
+ANALYSIS_PROFILES = {
+    'full': {
+        'disable': (),
+        'drop_fields': (),
+        'chunks': True,
+    },
+    'chunks-only': {
+        'disable': ('lemmatizer', 'ner'),
+        'drop_fields': ('lemma',) + ENTITY_FIELDS,
+        'chunks': True,
+    },
+    'pos-only': {
+        'disable': ('parser', 'lemmatizer', 'ner'),
+        'drop_fields': ('lemma',) + DEPENDENCY_FIELDS + ENTITY_FIELDS,
+        'chunks': False,
+    },
+}
+
+
+def load_pipeline(model_name="en_core_web_sm", profile="full"):
+    """プロファイルで使わないパイプライン部品を除外して spaCy モデルを読み込む"""
+    import spacy  # 読み込みに時間がかかるため、モデルを読み込むときまで import しない
+    return spacy.load(model_name, exclude=list(ANALYSIS_PROFILES[profile]['disable']))
+
+
+# 同じ範囲の句が複数ある場合に親として扱う順序 (小さい値ほど外側)
+CHUNK_TYPE_ORDER = {'VP': 0, 'PP': 1, 'NP': 2, 'ADVP': 3}
+
+
+def get_chunk_id(chunk):
+    """チャンクを一意に識別するID (例: NP_0_2) を返す"""
+    return f"{chunk['type']}_{chunk['start_id']}_{chunk['end_id']}"
+
+
+def build_chunk_hierarchy(chunks):
+    """チャンクの包含関係 (親・深さ・同種の句への包含) をまとめて計算する
+
+    開始位置の昇順・終了位置の降順に並べ、スタックで区間の入れ子をたどるため
+    O(n log n) で済む。戻り値は {チャンクID: {'parent', 'depth', 'is_subset'}} の辞書で、
+    parent は自分を含む最小のチャンクのID (トップレベルなら None)、is_subset は
+    同じ種類のより大きな句に完全に包含されているかどうかを表す。
+    """
+    ordered = sorted(chunks, key=lambda c: (
+        c['start_id'], -c['end_id'], CHUNK_TYPE_ORDER.get(c['type'], len(CHUNK_TYPE_ORDER))))
+
+    hierarchy = {}
+    stack = []
+    widest_by_type = {}  # 種類 -> (これまでの最大の終了位置, その句の開始位置)
+    for chunk in ordered:
+        start, end = chunk['start_id'], chunk['end_id']
+
+        while stack and stack[-1]['end_id'] < start:
+            stack.pop()
+        # 入れ子になっていれば先頭がそのまま親になる。交差する句がある場合は、自分を含む句の
+        # うち最も短いもの (同じ長さなら開始位置が前のもの) を親にする
+        parent = min((c for c in reversed(stack) if c['end_id'] >= end),
+                     key=lambda c: (c['end_id'] - c['start_id'], c['start_id']), default=None)
+
+        widest = widest_by_type.get(chunk['type'])
+        is_subset = widest is not None and (widest[0] > end or (widest[0] == end and widest[1] < start))
+        if widest is None or end > widest[0]:
+            widest_by_type[chunk['type']] = (end, start)
+
+        parent_id = get_chunk_id(parent) if parent is not None else None
+        hierarchy[get_chunk_id(chunk)] = {
+            'parent': parent_id,
+            'depth': hierarchy[parent_id]['depth'] + 1 if parent_id is not None else 0,
+            'is_subset': is_subset,
+        }
+        stack.append(chunk)
+    return hierarchy
+
+
+def build_chunk_index(chunks, hierarchy=None):
+    """チャンクの区間の索引を作る (表示側で包含関係を走査せずに引けるようにする)
+
+    戻り値は {'children': {チャンクID: [子チャンクID, ...]}, 'innermost': {トークンID: チャンクID}}。
+    children は開始位置順、innermost はトークンを含む最も内側のチャンクで、
+    どのチャンクにも含まれないトークンは含まない。各チャンクについて子チャンクの区間を
+    除いた範囲だけを埋めるため、句が入れ子になっていればトークン数+チャンク数に比例する。
+    """
+    hierarchy = hierarchy if hierarchy is not None else build_chunk_hierarchy(chunks)
+    spans = {get_chunk_id(chunk): (chunk['start_id'], chunk['end_id']) for chunk in chunks}
+    children = {chunk_id: [] for chunk_id in hierarchy}
+    for chunk_id, info in hierarchy.items():
+        if info['parent'] is not None:
+            children[info['parent']].append(chunk_id)
+
+    innermost = {}
+    # hierarchy は外側のチャンクが先に並ぶため内側のチャンクで上書きされる (交差する句では後に始まる方が優先)
+    for chunk_id in hierarchy:
+        start, end = spans[chunk_id]
+        position = start
+        for child_id in children[chunk_id]:
+            child_start, child_end = spans[child_id]
+            for token_id in range(position, child_start):
+                innermost[token_id] = chunk_id
+            position = max(position, child_end + 1)
+        for token_id in range(position, end + 1):
+            innermost[token_id] = chunk_id
+    return {'children': children, 'innermost': innermost}
+
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+SENTENCE_END_CHARS = ('.', '!', '?')
+
+
+def split_long_line(line, max_chars):
+    """max_chars 文字を超える1行を、max_chars 文字以下の (部分, 直後の空白) のリストに分ける
+
+    文の終わり (. ! ? の後の空白) で分けられる位置があればその中で最も後ろ、なければ
+    最も後ろの空白で分ける。空白のない max_chars 文字を超える部分は分けられないため ValueError。
+    """
+    pieces = []
+    while len(line) > max_chars:
+        cut = sentence_cut = None
+        for match in WHITESPACE_PATTERN.finditer(line, 1, max_chars + 1):
+            cut = match
+            if line[max(0, match.start() - 8):match.start()].rstrip("\"')]")[-1:] in SENTENCE_END_CHARS:
+                sentence_cut = match
+        cut = sentence_cut or cut
+        if cut is None:
+            raise ValueError(f"空白を含まない {max_chars} 文字 (nlp.max_length) を超える部分は解析できません")
+        end = WHITESPACE_PATTERN.match(line, cut.start()).end()  # 空白の続きが max_chars の先にある場合
+        pieces.append((line[:cut.start()], line[cut.start():end]))
+        line = line[end:]
+    pieces.append((line, ""))
+    return pieces
+
+
+class LazyTokenInfo(dict):
+    """日本語訳のキーを参照されたときに初めて計算して埋めるトークン辞書
+
+    辞書には spaCy の生のラベルだけを持ち、dep_japanese などは translator
+    (SentenceAnalyzer) の translate_label で求める。JSONへの変換やpickleでは
+    生のラベルだけの通常の辞書として扱われる。
+    """
+
+    __slots__ = ('_translator',)
+
+    def __init__(self, translator, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._translator = translator
+
+    def __missing__(self, key):
+        if key not in JAPANESE_FIELDS:
+            raise KeyError(key)
+        value = self._translator.translate_label(key, self)
+        self[key] = value
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __copy__(self):
+        return LazyTokenInfo(self._translator, self)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
 
 class SentenceAnalyzer:
-    def __init__(self, nlp_model):
+    def __init__(self, nlp_model, cache=None, sentence_cache=None, lazy_labels=False, profile="full"):
+        if profile not in ANALYSIS_PROFILES:
+            raise ValueError(f"未知の解析プロファイルです: {profile} (選択肢: {', '.join(ANALYSIS_PROFILES)})")
         self.nlp = nlp_model
+        # プロファイルに応じて不要なパイプライン部品を呼び出しごとに無効化する (nlp 自体は変更しない)
+        self.profile = profile
+        self._profile = ANALYSIS_PROFILES[profile]
+        self._disabled = [name for name in self._profile['disable'] if name in nlp_model.pipe_names]
+        self._token_fields = tuple(f for f in TOKEN_FIELDS if f not in self._profile['drop_fields'])
+        # True の場合、トークン情報には生のラベルだけを入れ、日本語訳は参照時に求める
+        self.lazy_labels = lazy_labels
+        self._morph_japanese_memo = {}
+        # cache には cache.AnalysisCache などの get/put を持つオブジェクトを渡す
+        self.cache = cache
+        # 差分解析 (incremental=True) で文単位の結果を再利用するためのキャッシュ
+        self.sentence_cache = sentence_cache if sentence_cache is not None else AnalysisCache(max_entries=1024)
+        from spacy.pipeline import Sentencizer  # モデルを受け取った時点で spaCy は読み込み済み
+        self._sentencizer = Sentencizer()
+        meta = getattr(nlp_model, "meta", {}) or {}
+        self.model_name = f"{meta.get('lang', '')}_{meta.get('name', '')}"
+        self.model_version = meta.get("version", "")
         self.pos_map = {
             "PROPN": "名詞 (固有名詞)", "NOUN": "名詞", "VERB": "動詞", "ADP": "前置詞",
             "DET": "冠詞", "ADJ": "形容詞", "ADV": "副詞", "CONJ": "接続詞",
@@ -129,9 +355,13 @@ class SentenceAnalyzer:
     def get_morph_japanese(self, morph_str):
         if not morph_str:
             return ""
-        parts = morph_str.split('|')
-        translated_parts = [self.morph_map.get(part, part) for part in parts]
-        return ", ".join(translated_parts)
+        # 同じ形態素情報の文字列は何度も現れるため、訳をメモ化する
+        translated = self._morph_japanese_memo.get(morph_str)
+        if translated is None:
+            parts = morph_str.split('|')
+            translated_parts = [self.morph_map.get(part, part) for part in parts]
+            translated = self._morph_japanese_memo[morph_str] = ", ".join(translated_parts)
+        return translated
 
     def get_ent_type_japanese(self, ent_type):
         return self.ent_type_map.get(ent_type, ent_type)
@@ -140,26 +370,305 @@ class SentenceAnalyzer:
         return self.dep_map.get(dep_tag, dep_tag)
 
     def get_pos_japanese(self, token):
-        if token.pos_ == "PUNCT":
-            if token.text == ".": return "句読点 (ピリオド)"
-            if token.text == ",": return "句読点 (カンマ)"
-        return self.pos_map.get(token.pos_, token.pos_)
-
-    def analyze_text(self, text):
-        cleaned_lines = [
-            re.sub(r"^(?:\d+\.\s*)+", "", line).strip()
-            for line in text.split("\n")
-            if re.search(r"[a-zA-Z]", line)
-        ]
-        clean_text = "\n".join(cleaned_lines)
-        if not clean_text.strip():
+        return self.get_pos_japanese_from_pos_tag(token.pos_, token.text)
+
+    def get_pos_japanese_from_pos_tag(self, pos_tag, text=None):
+        if pos_tag == "PUNCT":
+            if text == ".": return "句読点 (ピリオド)"
+            if text == ",": return "句読点 (カンマ)"
+        return self.pos_map.get(pos_tag, pos_tag)
+
+    def translate_label(self, key, token_info):
+        """トークン情報の生のラベルから、日本語訳のキー (dep_japanese など) の値を求める"""
+        if key == 'dep_japanese':
+            return self.get_dep_japanese(token_info['dep'])
+        if key == 'pos_japanese':
+            return self.get_pos_japanese_from_pos_tag(token_info['pos'], token_info['text'])
+        if key == 'morph_japanese':
+            return self.get_morph_japanese(token_info['morph'])
+        if key == 'ent_type_japanese':
+            return self.get_ent_type_japanese(token_info['ent_type'])
+        raise KeyError(key)
+
+    def _clean_line(self, line):
+        """1行から行頭の番号 (例: "1. ") を取り除く (英字を含まない行は None)"""
+        return clean_line(line)
+
+    def clean(self, text):
+        """英字を含まない行と行頭の番号を取り除き、元のテキストとの位置の対応表を持つ CleanedText を返す
+
+        解析結果の文字位置 (start, end, sent_offset) は整形後のテキスト上の位置なので、
+        元の入力上で強調表示する場合は CleanedText.span_to_raw で変換する。
+        """
+        return clean_text(text)
+
+    def _clean_text(self, text):
+        """英字を含まない行と行頭の番号 (例: "1. ") を取り除く"""
+        return clean_text(text).text
+
+    def analyze_text(self, text, incremental=False, trace=None):
+        """テキストを解析し、文ごとの解析結果のリストを返す
+
+        incremental=True の場合は文単位で結果をキャッシュし、前回から変更された文だけを
+        モデルに通す (長い文章の一部だけを編集して再解析する場合に有効)。
+        trace に instrumentation.Trace を渡すと、段階ごとの処理時間を記録する。
+        """
+        trace = trace if trace is not None else NULL_TRACE
+        with trace.span("clean"):
+            clean_text = self._clean_text(text)
+        if not clean_text:
             return []
 
-        doc = self.nlp(clean_text)
-        return [self._analyze_sentence(sent) for sent in doc.sents if sent.text.strip()]
+        if self.cache is not None:
+            cache_key = make_cache_key(clean_text, self.model_name, self.model_version, incremental, self.lazy_labels, self.profile)
+            cached = self.cache.get(cache_key)
+            trace.annotate("cache", "hit" if cached is not None else "miss")
+            if cached is not None:
+                return cached
+
+        if incremental:
+            result = self._analyze_incremental(clean_text, trace)
+        else:
+            with trace.span("parse"):
+                doc = self.nlp(clean_text, disable=self._disabled)
+                sentences = self._sentences(doc)
+            result = [self._analyze_sentence(sent, trace) for sent in sentences]
+        if self.cache is not None:
+            self.cache.put(cache_key, result)
+        return result
+
+    def _sentences(self, doc):
+        """空でない文を返す (構文解析器を無効にしたプロファイルではルールベースで文分割する)"""
+        if not doc.has_annotation("SENT_START"):
+            doc = self._sentencizer(doc)
+        return [sent for sent in doc.sents if sent.text.strip()]
+
+    def _split_sentences(self, clean_text):
+        """モデルを使わずにトークナイザとルールベースの文分割で (開始文字位置, 開始トークンID, 文) を求める
+
+        Sentencizer は文の間の改行などの空白トークンを次の文の先頭に置くが、パーサーは
+        前の文の末尾に含めるため、nlp(text).sents と同じ区切りになるよう空白トークンは
+        前の文に含める。
+        """
+        doc = self._sentencizer(self.nlp.make_doc(clean_text))
+        starts = []
+        for sent in doc.sents:
+            start = sent.start
+            if starts:
+                while start < len(doc) and doc[start].is_space:
+                    start += 1
+                if start == len(doc):
+                    continue
+            starts.append(start)
+        spans = [doc[start:end] for start, end in zip(starts, starts[1:] + [len(doc)])]
+        return [(span.start_char, span.start, span.text) for span in spans if span.text.strip()]
+
+    def _analyze_incremental(self, clean_text, trace=NULL_TRACE):
+        """文ごとにキャッシュを引き、未解析の文だけをまとめてモデルに通す
+
+        キャッシュには文単体で解析した結果 (トークンIDと文字位置が0始まり) を保存し、
+        文書内の位置に合わせてIDと文字位置をずらして返す。
+        """
+        with trace.span("split"):
+            segments = self._split_sentences(clean_text)
+        keys = [make_cache_key(text, self.model_name, self.model_version, "sentence", self.lazy_labels, self.profile) for _, _, text in segments]
+        cached = {key: self.sentence_cache.get(key) for key in keys}
+
+        missing = list({key: text for key, (_, _, text) in zip(keys, segments) if cached[key] is None}.items())
+        trace.annotate("reparsed_sentences", len(missing))
+        docs = self.nlp.pipe((text for _, text in missing), disable=self._disabled)
+        for key, _ in missing:
+            with trace.span("parse"):
+                doc = next(docs)
+                doc_sentences = self._sentences(doc)
+            sentences = [self._analyze_sentence(sent, trace) for sent in doc_sentences]
+            self.sentence_cache.put(key, sentences)
+            cached[key] = sentences
+
+        result = []
+        for (start_char, start_token, _), key in zip(segments, keys):
+            result.extend(self._shift_sentence(sent, start_token, start_char) for sent in cached[key])
+        return result
+
+    @staticmethod
+    def _shift_sentence(sentence, token_offset, char_offset):
+        """文単体の解析結果のトークンIDと文字位置を、文書内の位置に合わせてずらした新しい結果を返す"""
+        if not token_offset and not char_offset:
+            return sentence
+        shifted = dict(sentence)
+        shifted["sent_offset"] = sentence["sent_offset"] + char_offset
+        shifted_tokens = []
+        for token in sentence["tokens"]:
+            shifted_token = copy.copy(token)
+            shifted_token.update(
+                id=token["id"] + token_offset,
+                start=token["start"] + char_offset,
+                end=token["end"] + char_offset,
+            )
+            if "head_id" in token:
+                shifted_token["head_id"] = token["head_id"] + token_offset
+                shifted_token["children_ids"] = [child_id + token_offset for child_id in token["children_ids"]]
+            shifted_tokens.append(shifted_token)
+        shifted["tokens"] = shifted_tokens
+        shifted["chunks"] = [
+            dict(chunk, start_id=chunk["start_id"] + token_offset, end_id=chunk["end_id"] + token_offset)
+            for chunk in sentence["chunks"]
+        ]
+        shifted["chunk_hierarchy"] = build_chunk_hierarchy(shifted["chunks"])
+        shifted["chunk_index"] = build_chunk_index(shifted["chunks"], shifted["chunk_hierarchy"])
+        return shifted
+
+    def _iter_blocks(self, lines, block_chars):
+        """行の列を _clean_text と同じ規則で整形し、段落単位でまとめた (ブロック, 次のブロックとの区切り) を返すジェネレータ
+
+        英字を含まない行 (空行など) を段落の区切りとみなし、block_chars 文字以上たまった
+        時点の区切りでブロックを切る。区切りがないまま nlp.max_length を超えそうな場合は
+        行の境界で切り、1行だけで超える場合はその行を split_long_line で分ける。
+        区切りは通常は行の境界の "\n" で、行を分けた場合はその位置の空白になる。
+        """
+        max_chars = self.nlp.max_length
+        block, size = [], 0
+        for line in lines:
+            cleaned = self._clean_line(line)
+            if cleaned is None:
+                if size >= block_chars:
+                    yield "\n".join(block), "\n"
+                    block, size = [], 0
+                continue
+            if len(cleaned) > max_chars:
+                if block:
+                    yield "\n".join(block), "\n"
+                *pieces, (cleaned, _) = split_long_line(cleaned, max_chars)
+                yield from pieces
+                block, size = [], 0
+            elif block and size + len(cleaned) + 1 > max_chars:
+                yield "\n".join(block), "\n"
+                block, size = [], 0
+            block.append(cleaned)
+            size += len(cleaned) + 1
+        if block:
+            yield "\n".join(block), "\n"
+
+    def analyze_stream(self, lines, block_chars=100_000, batch_size=4):
+        """大きなテキストを段落単位のブロックに分けて解析し、文ごとの結果を順に返すジェネレータ
+
+        lines は行の iterable (開いたファイルなど)。全体を一度に読み込まず、ブロックを
+        nlp.pipe に流すため、メモリ使用量は入力の大きさによらずほぼ一定になる。
+        トークンIDと文字位置は、全体を _clean_text で整形したテキスト上の位置になる。
+        文がブロックの境界 (段落の区切り) をまたぐことはない前提で、その点を除けば
+        analyze_text と同じ結果になる。
+        """
+        offsets = collections.deque()  # nlp.pipe に渡したブロックの (開始文字位置, 区切りのトークン数)
+
+        def block_texts():
+            char_offset = 0
+            for block, separator in self._iter_blocks(lines, block_chars):
+                # 区切りの空白は、1つの半角スペース以外なら (改行など) 1つのトークンになる
+                offsets.append((char_offset, 0 if separator == " " else 1))
+                yield block
+                char_offset += len(block) + len(separator)
+
+        token_offset = 0
+        for doc in self.nlp.pipe(block_texts(), batch_size=batch_size, disable=self._disabled):
+            char_offset, separator_tokens = offsets.popleft()
+            for sent in self._sentences(doc):
+                yield self._shift_sentence(self._analyze_sentence(sent), token_offset, char_offset)
+            token_offset += len(doc) + separator_tokens
+
+    def analyze_file(self, path, encoding="utf-8", **kwargs):
+        """テキストファイルを analyze_stream で解析するジェネレータ"""
+        with open(path, encoding=encoding) as f:
+            yield from self.analyze_stream(f, **kwargs)
+
+    def analyze_many(self, texts, batch_size=64, n_process=1, raise_errors=True):
+        """複数の文書を nlp.pipe でまとめて解析し、入力順に analyze_text と同じ形式の結果を返すジェネレータ
+
+        エラーは AnalysisError として送出され、index が入力中の文書の位置を示す。
+        raise_errors=False の場合は送出せずに AnalysisError を結果の代わりに yield し、
+        残りの文書の解析を続ける。
+        """
+        clean_texts = (self._clean_text(text) for text in texts)
+        # nlp.pipe は入力順を保つため、出力の位置がそのまま入力のインデックスになる
+        docs = self.nlp.pipe(clean_texts, batch_size=batch_size, n_process=n_process, disable=self._disabled)
+
+        index = 0
+        while True:
+            try:
+                doc = next(docs)
+            except StopIteration:
+                return
+            except Exception as e:
+                # パイプライン自体の失敗はバッチ単位で起きるため、未出力の先頭文書を報告する
+                raise AnalysisError(index, e) from e
+
+            try:
+                result = [self._analyze_sentence(sent) for sent in self._sentences(doc)]
+            except Exception as e:
+                if raise_errors:
+                    raise AnalysisError(index, e) from e
+                result = AnalysisError(index, e)
+            yield result
+            index += 1
+
+    def _compute_phrase_masks(self, sent):
+        """文中の全トークンの VP/PP/ADVP を、依存木を一度だけたどって求める
+
+        句を構成するトークン集合は、文頭からの相対位置をビットとする整数 (ビットマスク)
+        で表す。子の結果を親で再利用するため、_get_verb_phrase_tokens などを
+        トークンごとに呼ぶ場合と違って同じ部分木を何度もたどらない。
+        戻り値は (vp_masks, pp_masks, advp_masks) で、それぞれ文中の位置で引くリスト。
+        """
+        base = sent.start
+        size = len(sent)
+        deps = [token.dep_ for token in sent]
+        heads = [token.head.i - base for token in sent]
+        verbal = [token.pos_ in ('VERB', 'AUX') for token in sent]
+
+        # 根から幅優先でたどった順序 (親が必ず子より先に来る)
+        children = [[] for _ in range(size)]
+        order = []
+        for i, head in enumerate(heads):
+            if head == i or not 0 <= head < size:
+                order.append(i)
+            else:
+                children[head].append(i)
+        for i in order:
+            order.extend(children[i])
+
+        subtree_masks = [0] * size  # 部分木 (= 前置詞句)
+        down_masks = [0] * size     # 助動詞/等位接続の子を下向きにたどって得られる動詞句
+        advp_masks = [0] * size
+        for i in reversed(order):
+            subtree = down = advp = 1 << i
+            for j in children[i]:
+                dep = deps[j]
+                subtree |= subtree_masks[j]
+                if dep in VP_SUBTREE_DEPS:
+                    down |= subtree_masks[j]
+                elif dep.startswith('aux') or dep == 'conj':
+                    down |= down_masks[j]
+                if dep == 'advmod':
+                    advp |= advp_masks[j]
+            subtree_masks[i] = subtree
+            down_masks[i] = down
+            advp_masks[i] = advp
+
+        # 動詞/助動詞にかかる助動詞は親の動詞句をそのまま共有する
+        vp_masks = [0] * size
+        for i in order:
+            head = heads[i]
+            if deps[i].startswith('aux') and head != i and 0 <= head < size and verbal[head]:
+                vp_masks[i] = vp_masks[head]
+            else:
+                vp_masks[i] = down_masks[i]
+        return vp_masks, subtree_masks, advp_masks
 
     def _get_verb_phrase_tokens(self, token):
-        """動詞トークンから動詞句全体を構成するトークンを収集する"""
+        """動詞トークンから動詞句全体を構成するトークンを収集する
+
+        _analyze_sentence では _compute_phrase_masks を使う。こちらは単一トークン用の
+        参照実装としてテストやベンチマークで利用している。
+        """
         vp_tokens = set()
         queue = [token] # 主動詞/助動詞から探索を開始
 
@@ -216,89 +725,113 @@ class SentenceAnalyzer:
     def _remove_subsets(self, chunks):
         """包含関係にある句を削除する(大きい方を残す)"""
         # 同じタイプの句で、完全に包含されているものを削除
-        final_chunks = []
         chunks.sort(key=lambda c: (c['start_id'], - (c['end_id'] - c['start_id'])))
-        
-        for i, current in enumerate(chunks):
-            is_subset = False
-            for j, other in enumerate(chunks):
-                if i == j:
-                    continue
-                # currentがotherに完全に包含されている場合
-                if current['type'] == other['type'] and \
-                   current['start_id'] >= other['start_id'] and \
-                   current['end_id'] <= other['end_id'] and \
-                   (current['start_id'] > other['start_id'] or current['end_id'] < other['end_id']):
-                    is_subset = True
-                    break
-            if not is_subset:
-                final_chunks.append(current)
-        return final_chunks
-
-    def _analyze_sentence(self, doc):
-        # 固有表現情報を事前に辞書にまとめる
-        ent_info_map = {}
-        for ent in doc.ents:
-            for token_idx in range(ent.start, ent.end):
-                ent_info_map[token_idx] = {
-                    'entity_text': ent.text,
-                    'entity_type': ent.label_
-                }
-
-        tokens_info = [{
+        hierarchy = build_chunk_hierarchy(chunks)
+        return [chunk for chunk in chunks if not hierarchy[get_chunk_id(chunk)]['is_subset']]
+
+    def _token_info(self, token, ent_info_map):
+        """1トークンの情報を辞書にする (lazy_labels の場合は日本語訳を後から求める)"""
+        token_info = {
             'id': token.i, 'text': token.text, 'lemma': token.lemma_,
             'pos': token.pos_, 'tag': token.tag_, 'dep': token.dep_,
-            'dep_japanese': self.get_dep_japanese(token.dep_),
             'head_id': token.head.i, 'children_ids': [c.i for c in token.children],
-            'is_root': token.dep_ == "ROOT", 'pos_japanese': self.get_pos_japanese(token),
+            'is_root': token.dep_ == "ROOT",
             'start': token.idx,
             'end': token.idx + len(token.text),
             'morph': str(token.morph),
-            'morph_japanese': self.get_morph_japanese(str(token.morph)),
             'ent_type': token.ent_type_,
-            'ent_type_japanese': self.get_ent_type_japanese(token.ent_type_),
             'is_entity_part': bool(token.ent_type_),
             'entity_text': ent_info_map.get(token.i, {}).get('entity_text'),
             'entity_type': ent_info_map.get(token.i, {}).get('entity_type'),
-        } for token in doc]
+        }
+        if self.lazy_labels:
+            for key in self._profile['drop_fields']:
+                token_info.pop(key, None)
+            return LazyTokenInfo(self, token_info)
+        return {key: token_info[key] if key in token_info else self.translate_label(key, token_info)
+                for key in self._token_fields}
 
+    def _analyze_sentence(self, doc, trace=NULL_TRACE):
+        with trace.span("tokens"):
+            # 固有表現情報を事前に辞書にまとめる
+            ent_info_map = {}
+            for ent in doc.ents:
+                for token_idx in range(ent.start, ent.end):
+                    ent_info_map[token_idx] = {
+                        'entity_text': ent.text,
+                        'entity_type': ent.label_
+                    }
+
+            tokens_info = [self._token_info(token, ent_info_map) for token in doc]
+        cleaned_chunks = self._extract_chunks(doc, trace) if self._profile['chunks'] else []
+        chunk_hierarchy = build_chunk_hierarchy(cleaned_chunks)
+
+        return {
+            "original_text": doc.text,
+            "sent_offset": doc.start_char,
+            "tokens": tokens_info,
+            "chunks": cleaned_chunks,
+            "chunk_hierarchy": chunk_hierarchy,
+            "chunk_index": build_chunk_index(cleaned_chunks, chunk_hierarchy),
+            "pos_tagged_text": " ".join(f"{t.text}({self.get_pos_japanese(t)})" for t in doc if t.pos_ != 'SPACE'),
+            # 旧形式のキーは空リストで維持
+            "subjects": [], "verbs": [], "noun_phrases": [], "verb_phrases": [], "prepositional_phrases": [],
+        }
+
+    def _extract_chunks(self, doc, trace=NULL_TRACE):
+        """文から NP/VP/PP/ADVP の句を抽出する"""
+        with trace.span("chunking"):
+            chunks_info = self._collect_chunks(doc)
+
+        with trace.span("dedup"):
+            # 重複を排除
+            unique_chunks = { (c['type'], c['start_id'], c['end_id']): c for c in chunks_info }
+            cleaned_chunks = list(unique_chunks.values())
+
+            # 句の長さに応じてソート
+            cleaned_chunks.sort(key=lambda x: (x['start_id'], x['end_id']), reverse=True)
+        return cleaned_chunks
+
+    def _collect_chunks(self, doc):
+        """重複を含む句の候補をすべて集める"""
+        debug = logger.isEnabledFor(logging.DEBUG)
         chunks_info = []
         # NP (名詞句)
         for chunk in doc.noun_chunks:
             chunks_info.append({'type': 'NP', 'text': chunk.text, 'start_id': chunk.start, 'end_id': chunk.end - 1})
 
         # VP, PP, ADVP
+        base = doc.start
+        vp_masks, pp_masks, advp_masks = self._compute_phrase_masks(doc)
         for token in doc:
-            phrase_tokens = set()
+            phrase_mask = 0
             chunk_type = None
             if token.pos_ in ('VERB', 'AUX'):
-                phrase_tokens = self._get_verb_phrase_tokens(token)
+                phrase_mask = vp_masks[token.i - base]
                 chunk_type = 'VP'
             elif token.pos_ == 'ADP':
-                phrase_tokens = self._get_prepositional_phrase_tokens(token)
+                phrase_mask = pp_masks[token.i - base]
                 chunk_type = 'PP'
             elif token.pos_ == 'ADV':
-                phrase_tokens = self._get_adverb_phrase_tokens(token)
+                phrase_mask = advp_masks[token.i - base]
                 chunk_type = 'ADVP'
 
-            if phrase_tokens:
-                start_id = min(t.i for t in phrase_tokens)
-                end_id = max(t.i for t in phrase_tokens)
-                
+            if phrase_mask:
+                start_id = base + (phrase_mask & -phrase_mask).bit_length() - 1
+                end_id = base + phrase_mask.bit_length() - 1
+                phrase_tokens = [doc.doc[i] for i in range(start_id, end_id + 1) if phrase_mask >> (i - base) & 1]
+
                 # 句のテキストを生成する際に、句読点や空白を除外する
                 # ただし、start_idとend_idは元のトークンの範囲を維持
-                chunk_text_tokens = [
-                    doc.doc[i] for i in range(start_id, end_id + 1) 
-                    if doc.doc[i] in phrase_tokens and not doc.doc[i].is_punct and not doc.doc[i].is_space
-                ]
+                chunk_text_tokens = [t for t in phrase_tokens if not t.is_punct and not t.is_space]
                 
                 # 句のテキストが空でないことを確認
                 if chunk_text_tokens:
                     chunk_text = "".join([t.text_with_ws for t in chunk_text_tokens]).strip()
                     
-                    # デバッグプリント
-                    print(f"DEBUG: Created chunk: Type={chunk_type}, Text='{chunk_text}', Start={start_id}, End={end_id}")
-                    print(f"DEBUG: Phrase tokens for this chunk: {[t.text for t in phrase_tokens]}")
+                    if debug:
+                        logger.debug("Created chunk: type=%s text=%r start=%d end=%d tokens=%s",
+                                     chunk_type, chunk_text, start_id, end_id, [t.text for t in phrase_tokens])
 
                     chunks_info.append({
                         'type': chunk_type,
@@ -306,22 +839,15 @@ class SentenceAnalyzer:
                         'start_id': start_id,
                         'end_id': end_id
                     })
-                else:
-                    print(f"DEBUG: Skipped empty chunk: Type={chunk_type}, Start={start_id}, End={end_id}, Phrase tokens={[t.text for t in phrase_tokens]}")
+                elif debug:
+                    logger.debug("Skipped empty chunk: type=%s start=%d end=%d tokens=%s",
+                                 chunk_type, start_id, end_id, [t.text for t in phrase_tokens])
 
-        # 重複を排除
-        unique_chunks = { (c['type'], c['start_id'], c['end_id']): c for c in chunks_info }
-        cleaned_chunks = list(unique_chunks.values())
-        
-        # 句の長さに応じてソート
-        cleaned_chunks.sort(key=lambda x: (x['start_id'], x['end_id']), reverse=True)
+        return chunks_info
 
-        return {
-            "original_text": doc.text,
-            "sent_offset": doc.start_char,
-            "tokens": tokens_info,
-            "chunks": cleaned_chunks,
-            "pos_tagged_text": " ".join(f"{t.text}({self.get_pos_japanese(t)})" for t in doc if t.pos_ != 'SPACE'),
-            # 旧形式のキーは空リストで維持
-            "subjects": [], "verbs": [], "noun_phrases": [], "verb_phrases": [], "prepositional_phrases": [],
-        }
\ No newline at end of file
+
+if __name__ == "__main__":
+    # python -m analyzer でコーパスを一括解析するコマンドラインツールを起動する
+    import sys
+    from cli import main
+    sys.exit(main())
@@ -1,23 +1,70 @@
+import os
+
 import streamlit as st
-import spacy
-import graphviz
 import streamlit.components.v1 as components
-from analyzer import SentenceAnalyzer # analyzer.pyからSentenceAnalyzerをインポート
+from analyzer import SentenceAnalyzer, get_chunk_id # analyzer.pyからSentenceAnalyzerをインポート
+from cache import AnalysisCache, make_render_key
+from compact import compact_results
+from diagrams import (
+    CHUNK_COLORS, build_chunk_tree_dot, build_chunk_tree_mermaid, build_dependency_dot,
+    build_dependency_mermaid, token_table,
+)
+from instrumentation import Trace
+from store import AnalysisStore, TieredCache
+from warmup import ModelLoader
 
 # --- 1. spaCyモデルのロード ---
-@st.cache_resource # アプリケーション起動時に一度だけロード
-def load_spacy_model():
-    return spacy.load("en_core_web_sm")
-
-nlp = load_spacy_model()
-analyzer = SentenceAnalyzer(nlp) # SentenceAnalyzerのインスタンスを作成
+@st.cache_resource # 起動時にバックグラウンドのスレッドで読み込みを始め、読み込み中も画面を表示する
+def load_model_loader():
+    return ModelLoader("en_core_web_sm").start()
+
+@st.cache_resource # 解析結果のキャッシュは全セッションで共有する
+def load_analysis_cache():
+    cache = AnalysisCache(max_entries=256, max_bytes=64 * 1024 * 1024)
+    # ANALYSIS_STORE_PATH を指定すると解析結果をファイルにも保存し、再起動時に最近の結果を読み込む
+    store_path = os.environ.get("ANALYSIS_STORE_PATH")
+    if not store_path:
+        return cache
+    max_mb = int(os.environ.get("ANALYSIS_STORE_MAX_MB", "256"))
+    return TieredCache(cache, AnalysisStore(store_path, max_bytes=max_mb * 1024 * 1024))
+
+@st.cache_resource # 文単位の差分解析用キャッシュ
+def load_sentence_cache():
+    return AnalysisCache(max_entries=4096, max_bytes=64 * 1024 * 1024)
+
+@st.cache_resource # 図のソース (DOT/Mermaid) のキャッシュ
+def load_render_cache():
+    return AnalysisCache(max_entries=1024, max_bytes=32 * 1024 * 1024)
+
+@st.cache_resource # モデルの準備ができてから一度だけ作成する
+def load_analyzer():
+    nlp = load_model_loader().wait()
+    # 日本語訳は表示時に必要なものだけ求める (lazy_labels=True)
+    return SentenceAnalyzer(nlp, cache=load_analysis_cache(), sentence_cache=load_sentence_cache(), lazy_labels=True)
+
+model_loader = load_model_loader()
+analysis_cache = load_analysis_cache()
 
 # --- 2. 解析関数の定義 (analyzer.pyのSentenceAnalyzerを使用) ---
-def analyze_sentence(text):
-    analyzed_data = analyzer.analyze_text(text)
+def analyze_sentence(text, trace=None):
+    # 長文の一部だけを編集して再解析することが多いため、変更された文だけを解析する
+    analyzed_data = load_analyzer().analyze_text(text, incremental=True, trace=trace)
     return analyzed_data # リスト全体を返す
 
 # --- 3. UI表示関数の定義 (今後のステップで実装) ---
+def cached_render(kind, tokens_info, chunks_info, build):
+    """図のソースを描画キャッシュから取り出す (なければ build() で作って保存する)
+
+    チェックボックスの切り替えなどで再実行されても、内容が変わらない文の図は作り直さない。
+    """
+    render_cache = load_render_cache()
+    key = make_render_key(kind, tokens_info, chunks_info)
+    source = render_cache.get(key)
+    if source is None:
+        source = build()
+        render_cache.put(key, source)
+    return source
+
 pos_colors = {
     'NOUN': 'blue', 'VERB': 'red', 'ADJ': 'green', 'ADP': 'purple', 'DET': 'orange',
     'ADV': 'brown', 'PRON': 'pink', 'AUX': 'magenta', 'PART': 'orange', 'CCONJ': 'lime',
@@ -28,13 +75,6 @@ pos_colors = {
 def get_pos_color(pos_tag):
     return pos_colors.get(pos_tag, 'black')
 
-chunk_colors = {
-    'NP': '#ADD8E6', # LightBlue
-    'VP': '#DDA0DD', # Plum
-    'PP': '#90EE90', # LightGreen
-    'ADVP': '#FFB6C1' # LightPink
-}
-
 chunk_type_japanese_map = {
     'NP': '名詞句 (Noun Phrase)',
     'VP': '動詞句 (Verb Phrase)',
@@ -69,46 +109,7 @@ def display_tokens_detailed(tokens_info):
 
 def display_mermaid_dependency_tree(tokens_info, sentence_id):
     st.subheader("依存関係ツリー (Mermaid版)")
-    mermaid_code = "graph LR\n" # Left-Right direction for dependency tree
-
-    # ノードの追加
-    root_token = None
-    nsubj_token = None
-    other_tokens = []
-
-    for token in tokens_info:
-        if token['is_root']:
-            root_token = token
-        elif token['dep'] == 'nsubj':
-            nsubj_token = token
-        else:
-            other_tokens.append(token)
-
-    # ROOTとnsubjを強調
-    if nsubj_token:
-        mermaid_code += f"    {nsubj_token['id']}[\"{nsubj_token['text']}<br>({nsubj_token['pos_japanese']})\"]:::main_node\n"
-    if root_token:
-        mermaid_code += f"    {root_token['id']}[\"{root_token['text']}<br>({root_token['pos_japanese']})\"]:::main_node\n"
-
-    # その他のノード
-    for token in other_tokens:
-        mermaid_code += f"    {token['id']}[\"{token['text']}<br>({token['pos_japanese']})\"]:::other_node\n"
-
-    # nsubjとROOTの順序を強制
-    if nsubj_token and root_token:
-        mermaid_code += f"    {nsubj_token['id']} --- {root_token['id']}\n"
-
-    # エッジの追加
-    for token in tokens_info:
-        if not token['is_root']:
-            head_token = next((t for t in tokens_info if t['id'] == token['head_id']), None)
-            if head_token:
-                edge_label = token['dep_japanese']
-                mermaid_code += f"    {head_token['id']} -- {edge_label} --> {token['id']}\n"
-
-    # スタイル定義
-    mermaid_code += "    classDef main_node fill:#salmon,stroke:#333,stroke-width:2px;\n"
-    mermaid_code += "    classDef other_node fill:#lightblue,stroke:#333,stroke-width:1px;\n"
+    mermaid_code = cached_render("dependency_mermaid", tokens_info, (), lambda: build_dependency_mermaid(tokens_info))
 
     html_content = f"""
     <script src="https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.min.js"></script>
@@ -152,101 +153,28 @@ def display_mermaid_dependency_tree(tokens_info, sentence_id):
 
 def display_dependency_tree(tokens_info, sentence_id):
     st.subheader("依存関係ツリー")
-    graph = graphviz.Digraph(comment='Dependency Tree', format='svg')
-    graph.attr(rankdir='LR', overlap='false', compound='true')
-
-    # ノードの追加
-    root_token = None
-    nsubj_token = None
-    other_tokens = []
-
-    for token in tokens_info:
-        if token['is_root']:
-            root_token = token
-        elif token['dep'] == 'nsubj':
-            nsubj_token = token
-        else:
-            other_tokens.append(token)
-
-    with graph.subgraph(name='cluster_main_nodes') as c:
-        c.attr(rank='same') # ROOTとnsubjを同じランクに配置
-
-        # nsubjノードを先に配置 (左側)
-        if nsubj_token:
-            node_label = f"{nsubj_token['text']} ({nsubj_token['pos_japanese']})"
-            c.node(str(nsubj_token['id']), node_label, style='filled', fillcolor='salmon', shape='box')
-
-        # ROOTノードを次に配置 (右側)
-        if root_token:
-            node_label = f"{root_token['text']} ({root_token['pos_japanese']})"
-            c.node(str(root_token['id']), node_label, style='filled', fillcolor='salmon', shape='box')
-
-        # nsubjとROOTの間に不可視の順序付けエッジを追加
-        if nsubj_token and root_token:
-            # このエッジが左右の順序を強制する
-            graph.edge(str(nsubj_token['id']), str(root_token['id']), style='invis', constraint='true')
-
-    # その他のノードを追加
-    for token in other_tokens:
-        node_label = f"{token['text']} ({token['pos_japanese']})"
-        node_fillcolor = 'lightblue' # その他のノードはlightblue
-        graph.node(str(token['id']), node_label, style='filled', fillcolor=node_fillcolor, shape='box')
-
-    # エッジの追加
-    for token in tokens_info:
-        if not token['is_root']:
-            head_token = next((t for t in tokens_info if t['id'] == token['head_id']), None)
-            if head_token:
-                edge_color = 'salmon' if token['dep'] == 'nsubj' else ('red' if token['dep'] == 'dobj' else 'black')
-                edge_penwidth = '2' if token['dep'] in ['nsubj', 'dobj'] else '1'
-                # 日本語の依存関係ラベルを使用
-                edge_label = token['dep_japanese']
-                edge_dir = 'forward' # Default direction
-                if token['dep'] == 'nsubj':
-                    edge_dir = 'both'
-                elif token['dep'] in ['det', 'amod'] and head_token and head_token['dep'] == 'nsubj': # head_tokenがnsubjの場合
-                    edge_dir = 'back'
-                graph.edge(str(token['head_id']), str(token['id']), label=edge_label, color=edge_color, penwidth=edge_penwidth, dir=edge_dir)
-    
+    dot_source = cached_render("dependency_dot", tokens_info, (), lambda: build_dependency_dot(tokens_info))
     try:
-        st.graphviz_chart(graph)
+        st.graphviz_chart(dot_source)
     except Exception as e:
         st.error(f"依存関係ツリーの表示中にエラーが発生しました: {e}")
         st.info("Graphvizが正しくインストールされているか確認してください。")
 
-def get_chunk_color(chunk_type):
-    return chunk_colors.get(chunk_type, '#808080') # Default to grey if not found
-
-def display_chunk_tree(tokens_info, chunks_info, sentence_id):
+def display_chunk_tree(tokens_info, chunks_info, chunk_hierarchy, chunk_index, sentence_id):
     st.subheader("句構造ツリー")
-    graph = graphviz.Digraph(comment='Chunk Tree', format='svg')
-    graph.attr(rankdir='TB', overlap='false', compound='true') # 上から下へのレイアウト
-
-    # トークンIDから情報を引けるように辞書を作成
-    token_map = {token['id']: token for token in tokens_info}
-
-    # チャンクをIDでアクセスできるように辞書化
-    chunk_dict = {f"{c['type']}_{c['start_id']}_{c['end_id']}": c for c in chunks_info}
-
-    # 親子関係を構築
-    parent_map = {}
-    sorted_chunks = sorted(chunks_info, key=lambda x: (x['start_id'], - (x['end_id'] - x['start_id'])))
-
-    for i, chunk in enumerate(sorted_chunks):
-        chunk_id = f"{chunk['type']}_{chunk['start_id']}_{chunk['end_id']}"
-        parent_id = None
-        for j, potential_parent in enumerate(sorted_chunks):
-            if i == j: continue
-            if potential_parent['start_id'] <= chunk['start_id'] and potential_parent['end_id'] >= chunk['end_id']:
-                if parent_id is None or (chunk_dict[parent_id]['end_id'] - chunk_dict[parent_id]['start_id'] > potential_parent['end_id'] - potential_parent['start_id']):
-                    parent_id = f"{potential_parent['type']}_{potential_parent['start_id']}_{potential_parent['end_id']}"
-        parent_map[chunk_id] = parent_id
-
-    # --- デバッグ情報: 中間データ構造 ---
-    with st.expander("句構造ツリー生成用中間データ (Graphviz版)"):
+
+    # --- デバッグ情報: 中間データ構造 (表示を選んだ場合のみ作成する) ---
+    if st.toggle("句構造ツリー生成用中間データ (Graphviz版) を表示", key=f"chunk_tree_debug_{sentence_id}"):
+        # トークンIDから情報を引けるように辞書を作成
+        token_map = token_table(tokens_info)
+        # チャンクをIDでアクセスできるように辞書化
+        chunk_dict = {f"{c['type']}_{c['start_id']}_{c['end_id']}": c for c in chunks_info}
+        # 親子関係は解析器が計算済みの階層情報から取り出す
+        parent_map = {chunk_id: info['parent'] for chunk_id, info in chunk_hierarchy.items()}
+
         st.markdown("#### `token_map` (トークンIDからトークン情報へのマッピング)")
         st.markdown("**使用目的**: 単語のIDをキーとして、その単語の全情報（テキスト、品詞、依存関係など）に素早くアクセスするために使用されます。")
-        st.json(token_map)
+        st.json({token_id: dict(token) for token_id, token in token_map.items()})
 
         st.markdown("#### `chunk_dict` (チャンクIDからチャンク情報へのマッピング)")
         st.markdown("**使用目的**: チャンクを一意に識別するID（例: `NP_0_2`）をキーとして、そのチャンクの全情報（種類、テキスト、開始/終了IDなど）に素早くアクセスするために使用されます。")
@@ -256,130 +184,25 @@ def display_chunk_tree(tokens_info, chunks_info, sentence_id):
         st.markdown("**使用目的**: 各チャンクがどのチャンクに包含されているか（ネスト構造）を定義します。`{子チャンクID: 親チャンクID}`の形式で、ツリーの階層構造を構築するために使用されます。`parent_id`が`None`のチャンクはトップレベルのチャンクです。")
         st.json(parent_map)
 
-    # --- レイアウトのための主要な句の特定 ---
-    subject_np_id = None
-    root_vp_id = None
-    root_token_id = None
-
-    # ROOTトークンとnsubjトークンを見つける
-    for token in tokens_info:
-        if token['is_root']:
-            root_token_id = token['id']
-        if token['dep'] == 'nsubj':
-            # nsubjトークンを含むNPを探す
-            for chunk_id, chunk in chunk_dict.items():
-                if chunk['type'] == 'NP' and chunk['start_id'] <= token['id'] <= chunk['end_id']:
-                    subject_np_id = chunk_id
-                    break
-        if root_token_id and subject_np_id: # 両方見つかったらループを抜ける
-            break
-
-    # ROOTトークンを含むVPを探す
-    if root_token_id:
-        for chunk_id, chunk in chunk_dict.items():
-            if chunk['type'] == 'VP' and chunk['start_id'] <= root_token_id <= chunk['end_id']:
-                root_vp_id = chunk_id
-                break
-
-    print(f"DEBUG: subject_np_id: {subject_np_id}")
-    print(f"DEBUG: root_vp_id: {root_vp_id}")
-
-    # ノードを追加
-    for chunk_id, chunk in chunk_dict.items():
-        color = get_chunk_color(chunk['type'])
-        # heightとfixedsize='true'を追加
-        graph.node(chunk_id, f"{chunk['type']}\n({chunk['text']})", style='filled', fillcolor=color, shape='box', height='0.8', width='1.5', fixedsize='true')
-
-    # 単語ノードを追加 (どのチャンクにも属さないもの)
-    token_in_chunk = {t['id']: False for t in tokens_info}
-    for chunk in chunks_info:
-        for i in range(chunk['start_id'], chunk['end_id'] + 1):
-            if i in token_in_chunk:
-                token_in_chunk[i] = True
-    
-    for token_id, is_in_chunk in token_in_chunk.items():
-        if not is_in_chunk:
-             graph.node(str(token_id), token_map[token_id]['text'], shape='plaintext')
-
-    # --- トップレベルのチャンクのグループ化と順序付け ---
-    # Sノードを追加
-    graph.node("S", "S (Sentence)", shape='ellipse', style='filled', fillcolor='lightgoldenrod', rank='min')
-
-    # 主要なNPとVPを同じグループに配置
-    if subject_np_id and root_vp_id:
-        # NPとVPを同じランクに配置するためのサブグラフ
-        with graph.subgraph(name='cluster_np_vp') as c:
-            c.attr(rank='same')
-            c.node(subject_np_id, group='main_np_vp')
-            c.node(root_vp_id, group='main_np_vp')
-            # NPとVPの間に不可視のエッジを追加して順序を強制
-            c.edge(subject_np_id, root_vp_id, style='invis', constraint='true')
-
-        # SからNPへのエッジ (VPはNPに続くため、NPにのみ接続)
-        graph.edge("S", subject_np_id)
-    elif subject_np_id:
-        graph.edge("S", subject_np_id)
-    elif root_vp_id:
-        graph.edge("S", root_vp_id)
-
-    # その他のトップレベルチャンク
-    for chunk_id, parent_id in parent_map.items():
-        if parent_id is None and chunk_id != subject_np_id and chunk_id != root_vp_id:
-            graph.edge("S", chunk_id)
-
-    # エッジを追加 (既存のロジック)
-    for chunk_id, parent_id in parent_map.items():
-        if parent_id:
-            graph.edge(parent_id, chunk_id)
-        # Sノードへの接続は上記で処理済みなので、ここではスキップ
-    
-    # チャンクと単語のエッジを追加 (既存のロジック)
-    for chunk_id, chunk in chunk_dict.items():
-        current_tokens_ids = list(range(chunk['start_id'], chunk['end_id'] + 1))
-        children_chunks = [cid for cid, pid in parent_map.items() if pid == chunk_id]
-        
-        for child_chunk_id in children_chunks:
-            child_chunk = chunk_dict[child_chunk_id]
-            for i in range(child_chunk['start_id'], child_chunk['end_id'] + 1):
-                if i in current_tokens_ids:
-                    current_tokens_ids.remove(i)
-        
-        for token_id in current_tokens_ids:
-            token_data = token_map.get(token_id)
-            if token_data:
-                graph.node(str(token_id), token_data['text'], shape='plaintext')
-                graph.edge(chunk_id, str(token_id))
-
+    dot_source = cached_render("chunk_dot", tokens_info, chunks_info,
+                               lambda: build_chunk_tree_dot(tokens_info, chunks_info, chunk_hierarchy, chunk_index))
     try:
-        st.graphviz_chart(graph)
+        st.graphviz_chart(dot_source)
     except Exception as e:
         st.error(f"句構造ツリーの表示中にエラーが発生しました: {e}")
 
-def display_mermaid_chunk_tree(tokens_info, chunks_info, sentence_id):
+def display_mermaid_chunk_tree(tokens_info, chunks_info, chunk_hierarchy, chunk_index, sentence_id):
     st.subheader("句構造ツリー (Mermaid版)")
-    mermaid_code = "graph TD\n" # Top-Down direction for overall tree
-
-    token_map = {token['id']: token for token in tokens_info}
-    chunk_dict = {f"{c['type']}_{c['start_id']}_{c['end_id']}": c for c in chunks_info}
-
-    parent_map = {}
-    sorted_chunks = sorted(chunks_info, key=lambda x: (x['start_id'], - (x['end_id'] - x['start_id'])))
-
-    for i, chunk in enumerate(sorted_chunks):
-        chunk_id = f"{chunk['type']}_{chunk['start_id']}_{chunk['end_id']}"
-        parent_id = None
-        for j, potential_parent in enumerate(sorted_chunks):
-            if i == j: continue
-            if potential_parent['start_id'] <= chunk['start_id'] and potential_parent['end_id'] >= chunk['end_id']:
-                if parent_id is None or (chunk_dict[parent_id]['end_id'] - chunk_dict[parent_id]['start_id'] > potential_parent['end_id'] - potential_parent['start_id']):
-                    parent_id = f"{potential_parent['type']}_{potential_parent['start_id']}_{potential_parent['end_id']}"
-        parent_map[chunk_id] = parent_id
-
-    # --- デバッグ情報: 中間データ構造 (Mermaid版) ---
-    with st.expander("句構造ツリー生成用中間データ (Mermaid版)"):
+
+    # --- デバッグ情報: 中間データ構造 (Mermaid版、表示を選んだ場合のみ作成する) ---
+    if st.toggle("句構造ツリー生成用中間データ (Mermaid版) を表示", key=f"mermaid_chunk_tree_debug_{sentence_id}"):
+        token_map = token_table(tokens_info)
+        chunk_dict = {f"{c['type']}_{c['start_id']}_{c['end_id']}": c for c in chunks_info}
+        parent_map = {chunk_id: info['parent'] for chunk_id, info in chunk_hierarchy.items()}
+
         st.markdown("#### `token_map` (トークンIDからトークン情報へのマッピング)")
         st.markdown("**使用目的**: 単語のIDをキーとして、その単語の全情報（テキスト、品詞、依存関係など）に素早くアクセスするために使用されます。")
-        st.json(token_map)
+        st.json({token_id: dict(token) for token_id, token in token_map.items()})
 
         st.markdown("#### `chunk_dict` (チャンクIDからチャンク情報へのマッピング)")
         st.markdown("**使用目的**: チャンクを一意に識別するID（例: `NP_0_2`）をキーとして、そのチャンクの全情報（種類、テキスト、開始/終了IDなど）に素早くアクセスするために使用されます。")
@@ -389,77 +212,8 @@ def display_mermaid_chunk_tree(tokens_info, chunks_info, sentence_id):
         st.markdown("**使用目的**: 各チャンクがどのチャンクに包含されているか（ネスト構造）を定義します。`{子チャンクID: 親チャンクID}`の形式で、ツリーの階層構造を構築するために使用されます。`parent_id`が`None`のチャンクはトップレベルのチャンクです。")
         st.json(parent_map)
 
-    # --- レイアウトのための主要な句の特定 (Graphviz版から流用) ---
-    subject_np_id = None
-    root_vp_id = None
-    root_token_id = None
-
-    for token in tokens_info:
-        if token['is_root']:
-            root_token_id = token['id']
-        if token['dep'] == 'nsubj':
-            for chunk_id, chunk in chunk_dict.items():
-                if chunk['type'] == 'NP' and chunk['start_id'] <= token['id'] <= chunk['end_id']:
-                    subject_np_id = chunk_id
-                    break
-        if root_token_id and subject_np_id:
-            break
-
-    if root_token_id:
-        for chunk_id, chunk in chunk_dict.items():
-            if chunk['type'] == 'VP' and chunk['start_id'] <= root_token_id <= chunk['end_id']:
-                root_vp_id = chunk_id
-                break
-
-    # Sノードの定義
-    mermaid_code += "    S((Sentence))\n"
-
-    # NPとVPの水平配置を試みるサブグラフ
-    if subject_np_id and root_vp_id:
-        mermaid_code += "    subgraph MainPhrases\n"
-        mermaid_code += "        direction LR\n" # Left-Right direction for this subgraph
-        mermaid_code += f"        {subject_np_id}[\"{chunk_dict[subject_np_id]['type']}<br>{chunk_dict[subject_np_id]['text']}\"]\n"
-        mermaid_code += f"        {root_vp_id}[\"{chunk_dict[root_vp_id]['type']}<br>{chunk_dict[root_vp_id]['text']}\"]\n"
-        mermaid_code += f"        {subject_np_id} --- {root_vp_id}\n" # NPからVPへの不可視エッジで順序を強制
-        mermaid_code += "    end\n"
-        mermaid_code += f"    S --> MainPhrases\n"
-    elif subject_np_id:
-        mermaid_code += f"    {subject_np_id}[\"{chunk_dict[subject_np_id]['type']}<br>{chunk_dict[subject_np_id]['text']}\"]\n"
-        mermaid_code += f"    S --> {subject_np_id}\n"
-    elif root_vp_id:
-        mermaid_code += f"    {root_vp_id}[\"{chunk_dict[root_vp_id]['type']}<br>{chunk_dict[root_vp_id]['text']}\"]\n"
-        mermaid_code += f"    S --> {root_vp_id}\n"
-
-    # その他のチャンクノードとエッジ
-    for chunk_id, chunk in chunk_dict.items():
-        if chunk_id != subject_np_id and chunk_id != root_vp_id:
-            mermaid_code += f"    {chunk_id}[\"{chunk['type']}<br>{chunk['text']}\"]\n"
-            if parent_map[chunk_id] is None: # Top-level chunk not NP/VP
-                mermaid_code += f"    S --> {chunk_id}\n"
-
-    # 親子関係のエッジ
-    for chunk_id, parent_id in parent_map.items():
-        if parent_id and (chunk_id != subject_np_id and chunk_id != root_vp_id): # Avoid re-adding S->NP/VP edges
-            mermaid_code += f"    {parent_id} --> {chunk_id}\n"
-
-    # チャンクと単語のエッジ
-    for chunk_id, chunk in chunk_dict.items():
-        current_tokens_ids = list(range(chunk['start_id'], chunk['end_id'] + 1))
-        children_chunks = [cid for cid, pid in parent_map.items() if pid == chunk_id]
-
-        for child_chunk_id in children_chunks:
-            child_chunk = chunk_dict[child_chunk_id]
-            for i in range(child_chunk['start_id'], child_chunk['end_id'] + 1):
-                if i in current_tokens_ids:
-                    current_tokens_ids.remove(i)
-
-        for token_id in current_tokens_ids:
-            token_data = token_map.get(token_id)
-            if token_data:
-                # MermaidノードIDは数字から始まることができないため、プレフィックスを追加
-                token_node_id = f"token_{token_id}"
-                mermaid_code += f"    {token_node_id}[{token_data['text']}]\n"
-                mermaid_code += f"    {chunk_id} --> {token_node_id}\n"
+    mermaid_code = cached_render("chunk_mermaid", tokens_info, chunks_info,
+                                 lambda: build_chunk_tree_mermaid(tokens_info, chunks_info, chunk_hierarchy, chunk_index))
 
     html_content = f"""
     <script src="https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.min.js"></script>
@@ -501,23 +255,15 @@ def display_mermaid_chunk_tree(tokens_info, chunks_info, sentence_id):
     """
     components.html(html_content, height=800) # Adjust height as needed
 
-def display_chunks(tokens, chunks, i):
+def display_chunks(tokens, chunks, chunk_hierarchy, chunk_index, i):
     st.subheader("句構造の階層表示")
-    display_chunk_tree(tokens, chunks, i)
+    display_chunk_tree(tokens, chunks, chunk_hierarchy, chunk_index, i)
 
     st.markdown("---")
     st.markdown("#### 検出された句の一覧 (ネスト構造):")
     
-    # 句のネストレベルを計算して表示
-    nested_chunks = []
-    for i, chunk in enumerate(chunks):
-        nesting_level = 0
-        for other_chunk in chunks:
-            if chunk != other_chunk and \
-               other_chunk['start_id'] <= chunk['start_id'] and \
-               chunk['end_id'] <= other_chunk['end_id']:
-                nesting_level += 1
-        nested_chunks.append((chunk, nesting_level))
+    # 句のネストレベルは解析器が計算済みの深さを使う
+    nested_chunks = [(chunk, chunk_hierarchy[get_chunk_id(chunk)]['depth']) for chunk in chunks]
     
     nested_chunks.sort(key=lambda x: (x[0]['start_id'], x[1]))
 
@@ -564,7 +310,7 @@ def display_expected_chunks(expected_data):
             st.markdown(f"- **{japanese_type}**: `{chunk['text']}`")
     st.markdown("---")
 
-def display_color_legend():
+def display_color_legend(analyzer):
     st.sidebar.markdown("### 色分け凡例と解説")
     st.sidebar.markdown("#### 品詞 (POS)")
     for pos_tag, color in pos_colors.items():
@@ -572,41 +318,23 @@ def display_color_legend():
         st.sidebar.markdown(f"<span style='color: {color};'>■</span> **{description} ({pos_tag})**", unsafe_allow_html=True)
     
     st.sidebar.markdown("#### 句構造 (Chunk)")
-    for chunk_type, color in chunk_colors.items():
+    for chunk_type, color in CHUNK_COLORS.items():
         japanese_name = chunk_type_japanese_map.get(chunk_type, chunk_type).split('(')[0].strip()
         st.sidebar.markdown(f"<span style='background-color: {color}; padding: 2px 5px; border-radius: 3px;'>&nbsp;&nbsp;&nbsp;</span> {japanese_name} ({chunk_type})", unsafe_allow_html=True)
 
 
-# --- 4. Streamlitアプリのメイン部分 ---
-st.set_page_config(layout="wide", page_title="英文解析ツール")
-
-# セッション状態の初期化
-if 'analysis_result' not in st.session_state:
-    st.session_state.analysis_result = None
+def display_sentence(i, sentence_analysis):
+    """1文の解析結果 (品詞・依存関係・句構造の図とデバッグ情報) を表示する"""
+    st.markdown(f"## 文 {i+1}: {sentence_analysis['original_text']}")
 
-st.title("英文解析ツール")
+    tokens = sentence_analysis['tokens']
+    chunks = sentence_analysis['chunks']
+    chunk_hierarchy = sentence_analysis['chunk_hierarchy']
+    chunk_index = sentence_analysis['chunk_index']
 
-input_text = st.text_area("解析したい英文を入力してください:", "The quick brown fox jumps over the lazy dog. A young boy is running quickly in the park. My diligent sister has been studying English very hard. All the students will go to the store to buy some groceries. Dr. Smith visited Tokyo on July 23rd, 2025 to attend a conference organized by Google.", height=100)
-
-if st.button("解析実行"):
-    if input_text:
-        with st.spinner('解析中...'):
-            st.session_state.analysis_result = analyze_sentence(input_text)
-    else:
-        st.warning("解析する英文を入力してください。")
-
-# 解析結果がある場合のみ表示
-if st.session_state.analysis_result:
-    # 各文の解析結果をループして表示
-    for i, sentence_analysis in enumerate(st.session_state.analysis_result):
-        st.markdown(f"## 文 {i+1}: {sentence_analysis['original_text']}")
-
-        tokens = sentence_analysis['tokens']
-        chunks = sentence_analysis['chunks']
-
-        with st.expander(f"文 {i+1} のデバッグ情報 (tokens_info & chunks_info)"):
-            st.markdown("#### トークン情報 (tokens_info)")
-            st.markdown('''
+    if st.toggle(f"文 {i+1} のデバッグ情報 (tokens_info & chunks_info) を表示", key=f"sentence_debug_{i}"):
+        st.markdown("#### トークン情報 (tokens_info)")
+        st.markdown('''
 **利用目的**: このデータは、文を構成する個々の単語（トークン）に関する詳細な言語的特徴を保持します。構文解析のすべてのステップで基礎情報として利用されます。
 - **text**: トークンの元々のテキスト。
 - **lemma**: トークンの見出し語（基本形）。
@@ -622,33 +350,33 @@ if st.session_state.analysis_result:
 - **end**: 文全体におけるトークンの終了位置。
 - **is_root**: トークンが依存関係の根（ROOT）であるかどうかの真偽値。
 ''')
-            st.markdown("品詞（POS）、依存関係（どの単語がどの単語を修飾しているか）、見出し語（単語の基本形）などが含まれており、構文解析のすべてのステップで基礎情報として利用されます。")
-            processed_tokens_info = []
-            for token in tokens:
-                processed_tokens_info.append({
-                    "単語 (text)": token['text'],
-                    "見出し語 (lemma)": token['lemma'],
-                    "ID (id)": token['id'],
-                    "品詞 (pos)": f"{token['pos_japanese']} ({token['pos']})",
-                    "詳細品詞 (tag)": token['tag'],
-                    "依存関係 (dep)": f"{token['dep_japanese']} ({token['dep']})",
-                    "親単語ID (head_id)": token['head_id'],
-                    "子単語ID (children_ids)": token['children_ids'],
-                    "文のROOT (is_root)": token['is_root'],
-                    "開始位置 (start)": token['start'],
-                    "終了位置 (end)": token['end'],
-                    "形態素 (morph)": token['morph'],
-                    "形態素_日本語訳 (morph_japanese)": token['morph_japanese'],
-                    "固有表現タイプ (ent_type)": f"{token['ent_type_japanese']} ({token['ent_type']})",
-                    "固有表現タイプ_日本語訳 (ent_type_japanese)": token['ent_type_japanese'],
-                    "固有表現の一部 (is_entity_part)": token['is_entity_part'],
-                    "固有表現テキスト (entity_text)": token['entity_text'],
-                    "固有表現タイプ (entity_type)": token['entity_type']
-                })
-            st.json(processed_tokens_info)
-
-            st.markdown("#### チャンク情報 (chunks_info)")
-            st.markdown('''
+        st.markdown("品詞（POS）、依存関係（どの単語がどの単語を修飾しているか）、見出し語（単語の基本形）などが含まれており、構文解析のすべてのステップで基礎情報として利用されます。")
+        processed_tokens_info = []
+        for token in tokens:
+            processed_tokens_info.append({
+                "単語 (text)": token['text'],
+                "見出し語 (lemma)": token['lemma'],
+                "ID (id)": token['id'],
+                "品詞 (pos)": f"{token['pos_japanese']} ({token['pos']})",
+                "詳細品詞 (tag)": token['tag'],
+                "依存関係 (dep)": f"{token['dep_japanese']} ({token['dep']})",
+                "親単語ID (head_id)": token['head_id'],
+                "子単語ID (children_ids)": token['children_ids'],
+                "文のROOT (is_root)": token['is_root'],
+                "開始位置 (start)": token['start'],
+                "終了位置 (end)": token['end'],
+                "形態素 (morph)": token['morph'],
+                "形態素_日本語訳 (morph_japanese)": token['morph_japanese'],
+                "固有表現タイプ (ent_type)": f"{token['ent_type_japanese']} ({token['ent_type']})",
+                "固有表現タイプ_日本語訳 (ent_type_japanese)": token['ent_type_japanese'],
+                "固有表現の一部 (is_entity_part)": token['is_entity_part'],
+                "固有表現テキスト (entity_text)": token['entity_text'],
+                "固有表現タイプ (entity_type)": token['entity_type']
+            })
+        st.json(processed_tokens_info)
+
+        st.markdown("#### チャンク情報 (chunks_info)")
+        st.markdown('''
 **利用目的**: このデータは、文法的な単位である「句（チャンク）」を定義します。この情報は、句構造ツリーを構築するための直接的なインプットとなります。
 - **type**: チャンクの種類（例: NP, VP, PP）。
 - **text**: チャンクに含まれるテキスト全体。
@@ -657,68 +385,149 @@ if st.session_state.analysis_result:
 - **start**: 文全体におけるチャンクの開始文字位置。
 - **end**: 文全体におけるチャンクの終了文字位置。
 ''')
-            st.markdown("例えば、「The quick brown fox」のような名詞句（NP）や「jumps over the lazy dog」のような動詞句（VP）を特定します。この情報は、句構造ツリーを構築するための直接的なインプットとなります。")
-            processed_chunks_info = []
-            for chunk in chunks:
-                processed_chunks_info.append({
-                    "句の種類": f"{chunk_type_japanese_map.get(chunk['type'], '不明')} ({chunk['type']})",
-                    "テキスト": chunk['text'],
-                    "開始ID": chunk['start_id'],
-                    "終了ID": chunk['end_id']
-                })
-            st.json(processed_chunks_info)
-
-        st.markdown("---")
-        st.header("1. 品詞情報")
-
-        show_detailed_pos = st.checkbox(f"文 {i+1} の詳細な品詞を表示 (クリックで詳細)", value=False, key=f"detailed_pos_{i}")
-        if show_detailed_pos:
-            display_tokens_detailed(tokens)
-        else:
-            display_tokens_default(tokens)
-        
-        st.markdown("---")
-        st.header("2. 依存関係解析")
-        display_dependency_tree(tokens, i)
-        display_mermaid_dependency_tree(tokens, i)
+        st.markdown("例えば、「The quick brown fox」のような名詞句（NP）や「jumps over the lazy dog」のような動詞句（VP）を特定します。この情報は、句構造ツリーを構築するための直接的なインプットとなります。")
+        processed_chunks_info = []
+        for chunk in chunks:
+            processed_chunks_info.append({
+                "句の種類": f"{chunk_type_japanese_map.get(chunk['type'], '不明')} ({chunk['type']})",
+                "テキスト": chunk['text'],
+                "開始ID": chunk['start_id'],
+                "終了ID": chunk['end_id']
+            })
+        st.json(processed_chunks_info)
 
-        st.markdown("---")
-        st.header("3. 句構造解析")
-        display_chunks(tokens, chunks, i)
-        display_mermaid_chunk_tree(tokens, chunks, i)
+    st.markdown("---")
+    st.header("1. 品詞情報")
 
-        # 期待される句構造のデバッグ表示 (該当する文のみ表示)
-        if i < len(expected_chunks_data):
-            display_expected_chunks([expected_chunks_data[i]])
-        st.markdown("---<br>---") # 各文の区切りを明確にする
+    show_detailed_pos = st.checkbox(f"文 {i+1} の詳細な品詞を表示 (クリックで詳細)", value=False, key=f"detailed_pos_{i}")
+    if show_detailed_pos:
+        display_tokens_detailed(tokens)
+    else:
+        display_tokens_default(tokens)
+    
+    st.markdown("---")
+    st.header("2. 依存関係解析")
+    display_dependency_tree(tokens, i)
+    display_mermaid_dependency_tree(tokens, i)
 
+    st.markdown("---")
+    st.header("3. 句構造解析")
+    display_chunks(tokens, chunks, chunk_hierarchy, chunk_index, i)
+    display_mermaid_chunk_tree(tokens, chunks, chunk_hierarchy, chunk_index, i)
 
-st.sidebar.markdown("### アプリケーション情報")
-st.sidebar.info("このツールはSpaCyライブラリを使用して英文の品詞、依存関係、句構造を解析し、視覚的に表示します。")
-st.sidebar.markdown("---")
+    # 期待される句構造のデバッグ表示 (該当する文のみ表示)
+    if i < len(expected_chunks_data):
+        display_expected_chunks([expected_chunks_data[i]])
+
+# --- 4. Streamlitアプリのメイン部分 ---
+st.set_page_config(layout="wide", page_title="英文解析ツール")
+
+# セッション状態の初期化
+if 'analysis_result' not in st.session_state:
+    st.session_state.analysis_result = None
+if 'analysis_trace' not in st.session_state:
+    st.session_state.analysis_trace = None
+if 'sentence_index' not in st.session_state:
+    st.session_state.sentence_index = 0
 
-# 色分け凡例の呼び出し
-display_color_legend()
+st.title("英文解析ツール")
 
+@st.fragment(run_every=1.0)
+def wait_for_model():
+    """モデルの読み込み中だけ表示し、読み込みが終わったらアプリ全体を再実行する"""
+    if model_loader.ready.is_set():
+        st.rerun()
+    st.info("モデルを読み込んでいます... 読み込み中も英文を入力できます。")
 
+if not model_loader.ready.is_set():
+    wait_for_model()
+elif model_loader.error is not None:
+    st.error(f"モデルの読み込みに失敗しました: {model_loader.error}")
 
+input_text = st.text_area("解析したい英文を入力してください:", "The quick brown fox jumps over the lazy dog. A young boy is running quickly in the park. My diligent sister has been studying English very hard. All the students will go to the store to buy some groceries. Dr. Smith visited Tokyo on July 23rd, 2025 to attend a conference organized by Google.", height=100)
+
+if st.button("解析実行"):
+    if input_text:
+        if not model_loader.ready.is_set():
+            with st.spinner('モデルを読み込んでいます...'):
+                model_loader.ready.wait()
+        if model_loader.error is not None:
+            # 読み込みの失敗は cache_resource にキャッシュされないため、解析を始めずにエラーを表示する
+            st.error(f"モデルの読み込みに失敗したため解析できません: {model_loader.error}")
+        else:
+            with st.spinner('解析中...'):
+                trace = Trace()
+                # セッションには列指向のコンパクト形式で保持し、メモリ使用量を抑える
+                st.session_state.analysis_result = compact_results(analyze_sentence(input_text, trace), translator=load_analyzer())
+                st.session_state.analysis_trace = trace.to_dict()
+                st.session_state.sentence_index = 0
+    else:
+        st.warning("解析する英文を入力してください。")
+
+# 解析結果がある場合のみ表示
+if st.session_state.analysis_result:
+    if st.session_state.analysis_trace:
+        with st.expander("解析のデバッグ情報 (処理時間)"):
+            st.markdown("段階ごとの処理時間 (clean → parse → tokens → chunking → dedup) と、キャッシュの利用状況です。")
+            st.json(st.session_state.analysis_trace)
+
+    # 文の選択 (図やデバッグ情報は選択中の文についてだけ作るため、最初の表示は文の数によらない)
+    results = st.session_state.analysis_result
+    st.session_state.sentence_index = min(st.session_state.sentence_index, len(results) - 1)
+
+    def move_sentence(step):
+        st.session_state.sentence_index = max(0, min(len(results) - 1, st.session_state.sentence_index + step))
+
+    col_prev, col_select, col_next = st.columns([1, 8, 1])
+    col_prev.button("◀ 前の文", on_click=move_sentence, args=(-1,), disabled=st.session_state.sentence_index == 0)
+    col_select.selectbox(
+        f"表示する文 (全 {len(results)} 文)", range(len(results)), key="sentence_index",
+        format_func=lambda i: f"文 {i+1}: {results[i]['original_text'][:80]}")
+    col_next.button("次の文 ▶", on_click=move_sentence, args=(1,),
+                    disabled=st.session_state.sentence_index == len(results) - 1)
+
+    display_sentence(st.session_state.sentence_index, results[st.session_state.sentence_index])
+
+
+st.sidebar.markdown("### アプリケーション情報")
+st.sidebar.info("このツールはSpaCyライブラリを使用して英文の品詞、依存関係、句構造を解析し、視覚的に表示します。")
+cache_stats = analysis_cache.stats()
+st.sidebar.caption(f"解析キャッシュ: {cache_stats['entries']}件 / ヒット {cache_stats['hits']} / ミス {cache_stats['misses']}")
+if 'store_entries' in cache_stats:
+    st.sidebar.caption(f"保存済みの解析結果: {cache_stats['store_entries']}件 / 起動時に読み込み {cache_stats['warmed']}件 / ファイルからのヒット {cache_stats['store_hits']}")
+render_stats = load_render_cache().stats()
+st.sidebar.caption(f"図のキャッシュ: {render_stats['entries']}件 / ヒット {render_stats['hits']} / ミス {render_stats['misses']}")
+timings = model_loader.status()["timings_ms"]
+if timings:
+    st.sidebar.caption("起動時の読み込み: " + " / ".join(f"{name} {ms:.0f} ms" for name, ms in timings.items()))
 st.sidebar.markdown("---")
-st.sidebar.markdown("### 形態素情報 (Morphological Features) の解説")
-for morph_tag, description in analyzer.morph_map.items():
-    st.sidebar.markdown(f"- **{description} ({morph_tag})**")
-st.sidebar.markdown("---")
-st.sidebar.markdown("### 句構造の解説")
-st.sidebar.markdown("- **名詞句 (NP)**: 名詞を中心に構成される句。文の主語や目的語になることが多いです。例: `The quick brown fox`")
-st.sidebar.markdown("- **動詞句 (VP)**: 動詞を中心に構成される句。動詞とその目的語、補語、副詞などが含まれます。例: `jumps over the lazy dog`")
-st.sidebar.markdown("- **前置詞句 (PP)**: 前置詞とそれに続く名詞句で構成される句。場所、時間、方法などを表します。例: `over the lazy dog`")
-st.sidebar.markdown("- **副詞句 (ADVP)**: 副詞を中心に構成される句。動詞、形容詞、他の副詞を修飾します。例: `very quickly`")
-st.sidebar.markdown("---")
-st.sidebar.markdown("### 依存関係の解説")
-for dep_tag, description in analyzer.dep_map.items():
-    st.sidebar.markdown(f"- **{description} ({dep_tag})**")
-st.sidebar.markdown("---")
-st.sidebar.markdown("### 固有表現 (Named Entity) の解説")
-for ent_type, description in analyzer.ent_type_map.items():
-    st.sidebar.markdown(f"- **{description} ({ent_type})**")
+
+# 品詞などの解説は SentenceAnalyzer の対応表を使うため、モデルの準備ができてから表示する
+if model_loader.ready.is_set() and model_loader.error is None:
+    analyzer = load_analyzer()
+
+    # 色分け凡例の呼び出し
+    display_color_legend(analyzer)
+
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### 形態素情報 (Morphological Features) の解説")
+    for morph_tag, description in analyzer.morph_map.items():
+        st.sidebar.markdown(f"- **{description} ({morph_tag})**")
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### 句構造の解説")
+    st.sidebar.markdown("- **名詞句 (NP)**: 名詞を中心に構成される句。文の主語や目的語になることが多いです。例: `The quick brown fox`")
+    st.sidebar.markdown("- **動詞句 (VP)**: 動詞を中心に構成される句。動詞とその目的語、補語、副詞などが含まれます。例: `jumps over the lazy dog`")
+    st.sidebar.markdown("- **前置詞句 (PP)**: 前置詞とそれに続く名詞句で構成される句。場所、時間、方法などを表します。例: `over the lazy dog`")
+    st.sidebar.markdown("- **副詞句 (ADVP)**: 副詞を中心に構成される句。動詞、形容詞、他の副詞を修飾します。例: `very quickly`")
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### 依存関係の解説")
+    for dep_tag, description in analyzer.dep_map.items():
+        st.sidebar.markdown(f"- **{description} ({dep_tag})**")
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### 固有表現 (Named Entity) の解説")
+    for ent_type, description in analyzer.ent_type_map.items():
+        st.sidebar.markdown(f"- **{description} ({ent_type})**")
+else:
+    st.sidebar.caption("品詞・依存関係などの解説は、モデルの読み込み後に表示されます。")
 st.sidebar.markdown("---")
 st.sidebar.markdown("© 2025 英文解析プロジェクト")
\ No newline at end of file
@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+
+class AsyncSentenceAnalyzer:
+    """並行して届く解析リクエストを小さなバッチにまとめる asyncio 用のラッパー
+
+    analyze() で受け付けたテキストを最大 max_wait_ms ミリ秒、または max_batch_size 件まで
+    ためてから、SentenceAnalyzer.analyze_many (nlp.pipe) で一度に解析する。解析は
+    executor (省略時はイベントループ既定のスレッドプール) 上で1バッチずつ実行する。
+    """
+
+    def __init__(self, analyzer, max_wait_ms=10, max_batch_size=32, executor=None):
+        self.analyzer = analyzer
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self.executor = executor
+        self._queue = None
+        self._worker = None
+        # 計測値
+        self.requests = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.max_observed_batch_size = 0
+        self._total_wait = 0.0
+        self.max_observed_wait_ms = 0.0
+
+    async def analyze(self, text):
+        """テキストを解析し、analyze_text と同じ形式の結果を返す"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run_batches())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def _collect_batch(self, batch):
+        """最初のリクエストから max_wait_ms 以内に届いたものを max_batch_size 件まで batch にまとめる
+
+        途中で停止されても受け取ったリクエストを失わないよう、呼び出し元のリストに追加していく。
+        """
+        batch.append(await self._queue.get())
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                batch = []
+                await self._collect_batch(batch)
+                await self._process_batch(loop, batch)
+        except asyncio.CancelledError:
+            # 停止された時点で処理中・待機中のリクエストの呼び出し元が待ち続けないようにする
+            self._fail_pending(batch)
+            raise
+
+    async def _process_batch(self, loop, batch):
+        started = time.perf_counter()
+        self._record_batch(batch, started)
+        texts = [text for text, _, _ in batch]
+        try:
+            results = await loop.run_in_executor(self.executor, self._analyze_batch, texts)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue  # 呼び出し元がキャンセル済み
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _fail_pending(self, batch=()):
+        """batch と待ち行列に残っているリクエストを、閉じられたことを表す例外で終わらせる"""
+        pending = list(batch)
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("AsyncSentenceAnalyzer が閉じられたため解析できませんでした"))
+
+    def _analyze_batch(self, texts):
+        return list(self.analyzer.analyze_many(texts, batch_size=len(texts), raise_errors=False))
+
+    def _record_batch(self, batch, started):
+        waits = [started - enqueued_at for _, _, enqueued_at in batch]
+        self.requests += len(batch)
+        self.batches += 1
+        self.last_batch_size = len(batch)
+        self.max_observed_batch_size = max(self.max_observed_batch_size, len(batch))
+        self._total_wait += sum(waits)
+        self.max_observed_wait_ms = max(self.max_observed_wait_ms, max(waits) * 1000)
+
+    def metrics(self):
+        """待ち行列の長さ、バッチサイズ、待ち時間の計測値を返す"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "requests": self.requests,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_observed_batch_size,
+            "avg_wait_ms": self._total_wait / self.requests * 1000 if self.requests else 0.0,
+            "max_wait_ms": self.max_observed_wait_ms,
+        }
+
+    async def close(self):
+        """バッチ処理用のタスクを停止する
+
+        処理中や待機中のリクエストは RuntimeError で終わらせる (呼び出し元が待ち続けない)。
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._fail_pending()
+
@@ -0,0 +1,104 @@
+"""句構造ツリーの表示で使う「トークンを含むチャンク」「チャンクの子」の求め方の比較
+
+表示側でチャンクの一覧を毎回走査する従来の方法と、解析器が作る区間の索引
+(build_chunk_index) を引く方法を、500トークン・300チャンクの合成データで比べる。
+学習済みモデルは不要。
+
+    python benchmarks/bench_chunk_index.py [--tokens 500] [--chunks 300]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analyzer import build_chunk_hierarchy, build_chunk_index, get_chunk_id  # noqa: E402
+
+
+def make_chunks(n_tokens, n_chunks, seed=0):
+    """入れ子になった区間を n_chunks 個作る (大きな区間を再帰的に分割する)"""
+    rng = random.Random(seed)
+    chunks, spans = [], [(0, n_tokens - 1)]
+    seen = set()
+    while spans and len(chunks) < n_chunks:
+        start, end = spans.pop(0)
+        chunk = {'type': rng.choice(['NP', 'VP', 'PP', 'ADVP']), 'text': "", 'start_id': start, 'end_id': end}
+        if get_chunk_id(chunk) not in seen:
+            seen.add(get_chunk_id(chunk))
+            chunks.append(chunk)
+        if end - start >= 2 and rng.random() < 0.5:
+            left = rng.randint(start, end - 1)
+            spans.extend([(start, left), (left + 1, end)])
+        elif end > start:
+            # 1トークン短い句を内側に入れ子にする (VP の中の VP など)
+            spans.append((start + 1, end) if rng.random() < 0.5 else (start, end - 1))
+    return chunks
+
+
+def legacy_lookups(tokens, chunks, parent_map):
+    """従来の表示処理: トークンごとにチャンクを走査し、チャンクごとに子を走査する"""
+    chunk_dict = {get_chunk_id(c): c for c in chunks}
+    containing = {}
+    for token in tokens:
+        for chunk_id, chunk in chunk_dict.items():
+            if chunk['type'] == 'NP' and chunk['start_id'] <= token['id'] <= chunk['end_id']:
+                containing[token['id']] = chunk_id
+                break
+    token_in_chunk = {t['id']: False for t in tokens}
+    for chunk in chunks:
+        for i in range(chunk['start_id'], chunk['end_id'] + 1):
+            if i in token_in_chunk:
+                token_in_chunk[i] = True
+    edges = []
+    for chunk_id, chunk in chunk_dict.items():
+        current_tokens_ids = list(range(chunk['start_id'], chunk['end_id'] + 1))
+        children_chunks = [cid for cid, pid in parent_map.items() if pid == chunk_id]
+        for child_chunk_id in children_chunks:
+            child_chunk = chunk_dict[child_chunk_id]
+            for i in range(child_chunk['start_id'], child_chunk['end_id'] + 1):
+                if i in current_tokens_ids:
+                    current_tokens_ids.remove(i)
+        edges.extend((chunk_id, token_id) for token_id in current_tokens_ids)
+    return edges
+
+
+def indexed_lookups(tokens, chunks, hierarchy):
+    """索引を使う表示処理: 最も内側のチャンクから親へたどり、トークンをチャンクごとにまとめる"""
+    chunk_dict = {get_chunk_id(c): c for c in chunks}
+    index = build_chunk_index(chunks, hierarchy)
+    innermost = index['innermost']
+    containing = {}
+    for token in tokens:
+        chunk_id = innermost.get(token['id'])
+        while chunk_id is not None and chunk_dict[chunk_id]['type'] != 'NP':
+            chunk_id = hierarchy[chunk_id]['parent']
+        containing[token['id']] = chunk_id
+    own_tokens = {}
+    for token in tokens:
+        if token['id'] in innermost:
+            own_tokens.setdefault(innermost[token['id']], []).append(token['id'])
+    return [(chunk_id, token_id) for chunk_id in chunk_dict for token_id in own_tokens.get(chunk_id, ())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--chunks", type=int, default=300)
+    args = parser.parse_args()
+
+    tokens = [{'id': i} for i in range(args.tokens)]
+    chunks = make_chunks(args.tokens, args.chunks)
+    hierarchy = build_chunk_hierarchy(chunks)
+    parent_map = {chunk_id: info['parent'] for chunk_id, info in hierarchy.items()}
+    assert sorted(legacy_lookups(tokens, chunks, parent_map)) == sorted(indexed_lookups(tokens, chunks, hierarchy))
+
+    print(f"{len(tokens)} tokens, {len(chunks)} chunks")
+    for name, fn in (("scan", lambda: legacy_lookups(tokens, chunks, parent_map)),
+                     ("index", lambda: indexed_lookups(tokens, chunks, hierarchy))):
+        elapsed = min(timeit.repeat(fn, number=5, repeat=5)) / 5
+        print(f"{name:>6} {elapsed * 1000:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""入力テキストの整形 (行頭の番号と英字を含まない行の除去) の処理速度の比較
+
+行ごとに re.search / re.sub を呼ぶ従来の方法と、コンパイル済みの正規表現で
+テキスト全体を一度に走査する cleaning.clean_text (位置の対応表つき) を比べる。
+学習済みモデルは不要。
+
+    python benchmarks/bench_clean.py [--megabytes 1 4 16]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from cleaning import _legacy_clean_text, clean_text  # noqa: E402
+
+LINES = [
+    "1. The quick brown fox jumps over the lazy dog.",
+    "2. A young boy is running quickly in the park.",
+    "My diligent sister has been studying English very hard.",
+    "",
+    "---",
+    "   3.  All the students will go to the store to buy some groceries.   ",
+    "日本語の訳: 生徒たちは食料品を買いに店へ行く。",
+]
+
+
+def make_text(megabytes, seed=0):
+    rng = random.Random(seed)
+    lines, size = [], 0
+    while size < megabytes * 2**20:
+        line = rng.choice(LINES)
+        lines.append(line)
+        size += len(line.encode("utf-8")) + 1
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    print(f"{'MB':>4} {'legacy MB/s':>12} {'compiled MB/s':>14}")
+    for megabytes in args.megabytes:
+        text = make_text(megabytes)
+        assert clean_text(text).text == _legacy_clean_text(text)
+        legacy = min(timeit.repeat(lambda: _legacy_clean_text(text), number=1, repeat=3))
+        compiled = min(timeit.repeat(lambda: clean_text(text), number=1, repeat=3))
+        print(f"{megabytes:>4} {megabytes / legacy:>12.1f} {megabytes / compiled:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""JSONL の出力形式ごとのサイズの比較
+
+同じ文章を analyze_many に通し、従来の JSONL (トークンごとに文字列を持つ) と
+--format compact の JSONL (バッチごとの語彙表 + IDの列)、write_results_file の
+バイナリ形式のバイト数、および辞書のリストと語彙表を共有する CompactSentence の
+メモリ使用量を比べる。バイナリ形式については、ファイルを開いて無作為に選んだ
+100文を取り出す時間と、compact の JSONL を全行読み込む時間も比べる。
+
+    python benchmarks/bench_compact_jsonl.py [--docs 500] [--batch-size 64]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analyzer import SentenceAnalyzer, load_pipeline  # noqa: E402
+from cli import to_records  # noqa: E402
+from compact import (  # noqa: E402
+    LabelTable, ResultsFile, batch_records, compact_results, iter_compact_records, memory_report,
+    write_results_file,
+)
+
+SAMPLE_TEXT = (
+    "The quick brown fox jumps over the lazy dog. A young boy is running quickly in the park. "
+    "My diligent sister has been studying English very hard. All the students will go to the store "
+    "to buy some groceries. Dr. Smith visited Tokyo on July 23rd, 2025 to attend a conference organized by Google."
+)
+
+
+def jsonl_bytes(records):
+    return sum(len((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")) for record in records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--model", default="en_core_web_sm")
+    args = parser.parse_args()
+
+    analyzer = SentenceAnalyzer(load_pipeline(args.model))
+    texts = [f"{SAMPLE_TEXT} Item {i}." for i in range(args.docs)]
+    results = list(analyzer.analyze_many(texts, batch_size=args.batch_size))
+
+    plain = compact = 0
+    compact_lines = []
+    for start in range(0, len(results), args.batch_size):
+        batch = [(f"doc{i}", result, None) for i, result in enumerate(results[start:start + args.batch_size], start)]
+        plain += jsonl_bytes(record for doc_id, result, error in batch
+                             for record in to_records(doc_id, result, error, "sentence"))
+        records = batch_records(batch)
+        compact += jsonl_bytes(records)
+        compact_lines.extend(json.dumps(record, ensure_ascii=False) for record in records)
+    print(f"JSONL      plain {plain / 2**20:8.2f} MiB  compact {compact / 2**20:8.2f} MiB  ({compact / plain:.0%})")
+
+    sentences = [sentence for result in results for sentence in result]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "results.bin")
+        with open(path, "wb") as f:
+            write_results_file(f, sentences)
+        binary = os.path.getsize(path)
+        picks = random.Random(0).sample(range(len(sentences)), min(100, len(sentences)))
+        started = time.perf_counter()
+        with ResultsFile.open(path) as stored:
+            for i in picks:
+                stored[i]["tokens"][0]["text"]
+        random_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    for _ in iter_compact_records(compact_lines):
+        pass
+    jsonl_ms = (time.perf_counter() - started) * 1000
+    print(f"binary     file  {binary / 2**20:8.2f} MiB  ({binary / plain:.0%} of plain)  "
+          f"{len(picks)} random sentences {random_ms:.1f} ms  (compact JSONL full read {jsonl_ms:.1f} ms)")
+
+    report = memory_report(sentences, compact_results(sentences, labels=LabelTable()))
+    print(f"in-memory  dicts {report['dict_bytes'] / 2**20:8.2f} MiB  compact {report['compact_bytes'] / 2**20:8.2f} MiB  "
+          f"({report['ratio']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""依存関係ツリーの図のソース生成の比較
+
+トークンごとに tokens_info を先頭から探して親トークンを求める従来の方法 (文の長さの2乗) と、
+IDで引く表を一度作ってから1回の走査でエッジを作る diagrams.build_dependency_dot /
+build_dependency_mermaid を、長さを変えた合成文で比べる。学習済みモデルは不要。
+
+    python benchmarks/bench_diagrams.py [--tokens 50 200 800]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from diagrams import build_dependency_dot, build_dependency_mermaid  # noqa: E402
+
+
+def make_tokens(n, seed=0):
+    """ランダムな依存関係の木を持つトークン列を作る (トークン0がROOT)"""
+    rng = random.Random(seed)
+    tokens = []
+    for i in range(n):
+        head = i if i == 0 else rng.randrange(i)
+        dep = "ROOT" if i == 0 else rng.choice(["nsubj", "dobj", "det", "amod", "prep", "pobj", "advmod"])
+        tokens.append({'id': i, 'text': f"w{i}", 'pos': "NOUN", 'pos_japanese': "名詞",
+                       'dep': dep, 'dep_japanese': dep, 'head_id': head, 'is_root': i == 0})
+    return tokens
+
+
+def legacy_dependency_edges(tokens_info):
+    """従来の方法: 親トークンを毎回線形探索する (エッジのソースだけを作る)"""
+    edges = ""
+    for token in tokens_info:
+        if not token['is_root']:
+            head_token = next((t for t in tokens_info if t['id'] == token['head_id']), None)
+            if head_token:
+                edges += f"    {head_token['id']} -- {token['dep_japanese']} --> {token['id']}\n"
+    return edges
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, nargs="+", default=[50, 200, 800])
+    args = parser.parse_args()
+
+    print(f"{'tokens':>7} {'legacy edges ms':>16} {'mermaid ms':>11} {'dot ms':>8}")
+    for n in args.tokens:
+        tokens = make_tokens(n)
+        timings = [
+            min(timeit.repeat(lambda: fn(tokens), number=3, repeat=3)) / 3 * 1000
+            for fn in (legacy_dependency_edges, build_dependency_mermaid, build_dependency_dot)
+        ]
+        print(f"{n:>7} {timings[0]:>16.2f} {timings[1]:>11.2f} {timings[2]:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""ResultFormatter の HTML 生成の処理速度の比較
+
+文字位置ごとにイベントのリストを作る従来の方法と、span の開始・終了位置を
+一度だけ並べ替えて走査する現在の方法を、文の長さと span の数を変えて比べる。
+学習済みモデルは不要。
+
+    python benchmarks/bench_formatter.py [--chars 200 2000 20000] [--sentences 200]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from formatter import LEGACY_KEYS, SPAN_KINDS, ResultFormatter  # noqa: E402
+
+WORDS = ["the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "in", "park", "runs"]
+
+
+def legacy_format_single_html(analyzed_data):
+    """変更前の _format_single_html (文字位置ごとのイベントのリスト)"""
+    original_text = analyzed_data["original_text"]
+    text_len = len(original_text)
+    events_at_pos = [[] for _ in range(text_len + 1)]
+    offset = analyzed_data["sent_offset"]
+    for key, kind in LEGACY_KEYS.items():
+        prefix, style, suffix = SPAN_KINDS[kind]
+        for item in analyzed_data[key]:
+            start_pos = max(0, item["start"] - offset)
+            end_pos = min(text_len, item["end"] - offset)
+            if start_pos <= end_pos:
+                events_at_pos[start_pos].append((prefix + f'<span style="{style}">', True))
+                events_at_pos[end_pos].append(("</span>" + suffix, False))
+    formatted_html = []
+    for i, char in enumerate(original_text):
+        events_at_pos[i].sort(key=lambda x: not x[1])
+        for tag_string, is_opening_tag in events_at_pos[i]:
+            formatted_html.append(tag_string)
+        formatted_html.append(char)
+    events_at_pos[text_len].sort(key=lambda x: not x[1])
+    for tag_string, is_opening_tag in events_at_pos[text_len]:
+        formatted_html.append(tag_string)
+    return "".join(formatted_html)
+
+
+def make_sentence(chars, rng):
+    """約 chars 文字の文と、単語ごとの主語・動詞、入れ子になった句を持つ旧形式の解析結果"""
+    words, starts, pos = [], [], 0
+    while pos < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        starts.append(pos)
+        pos += len(word) + 1
+    ends = [start + len(word) for start, word in zip(starts, words)]
+    data = {key: [] for key in LEGACY_KEYS}
+    data.update(original_text=" ".join(words) + ".", sent_offset=0)
+    for i in range(0, len(words), 4):
+        data["subjects" if i % 8 == 0 else "verbs"].append({"start": starts[i], "end": ends[i]})
+        last = min(i + 3, len(words) - 1)
+        data["verb_phrases"].append({"start": starts[i], "end": ends[last]})
+        data["prepositional_phrases"].append({"start": starts[min(i + 1, last)], "end": ends[last]})
+        data["noun_phrases"].append({"start": starts[min(i + 2, last)], "end": ends[last]})
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chars", type=int, nargs="+", default=[200, 2000, 20000])
+    parser.add_argument("--sentences", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'chars':>6} {'legacy ms':>10} {'sweep ms':>9} {'speedup':>8}")
+    for chars in args.chars:
+        sentences = [make_sentence(chars, rng) for _ in range(max(1, args.sentences * 200 // chars))]
+        formatter = ResultFormatter(sentences)
+        legacy = min(timeit.repeat(lambda: [legacy_format_single_html(s) for s in sentences], number=1, repeat=3))
+        sweep = min(timeit.repeat(formatter.format_html_all, number=1, repeat=3))
+        print(f"{chars:>6} {legacy * 1000:>10.1f} {sweep * 1000:>9.1f} {legacy / sweep:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""日本語ラベルを一括で付ける場合と、参照時に求める場合 (lazy_labels) の比較
+
+トークン情報の組み立て (_token_info) の処理時間と、解析結果をJSONにした場合の
+サイズを測る。
+合成文を使うため学習済みモデルは不要。
+
+    python benchmarks/bench_labels.py
+"""
+import json
+import os
+import sys
+import timeit
+
+import spacy
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analyzer import SentenceAnalyzer  # noqa: E402
+from bench_phrases import make_sentence  # noqa: E402
+
+
+def main():
+    nlp = spacy.blank("en")
+    sentences = [make_sentence(nlp.vocab, 50, seed)[:] for seed in range(20)]
+    print(f"{'mode':>6} {'ms/sentence':>12} {'JSON bytes':>11}")
+    for lazy in (False, True):
+        analyzer = SentenceAnalyzer(nlp, lazy_labels=lazy)
+        elapsed = min(timeit.repeat(
+            lambda: [[analyzer._token_info(token, {}) for token in sent] for sent in sentences], number=5, repeat=5))
+        results = [analyzer._analyze_sentence(sent) for sent in sentences]
+        size = len(json.dumps(results, ensure_ascii=False).encode("utf-8"))
+        print(f"{'lazy' if lazy else 'eager':>6} {elapsed / (5 * len(sentences)) * 1000:>12.3f} {size:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""句抽出 (VP/PP/ADVP) のベンチマーク
+
+トークンごとに _get_*_phrase_tokens を呼ぶ従来の方法と、依存木を一度だけたどる
+_compute_phrase_masks を、10/50/200 トークンの合成文で比較する。
+合成文は spaCy の Doc を直接組み立てるため、学習済みモデルは不要。
+
+    python benchmarks/bench_phrases.py
+"""
+import os
+import random
+import sys
+import timeit
+
+import spacy
+from spacy.tokens import Doc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analyzer import SentenceAnalyzer  # noqa: E402
+
+DEPS = ['aux', 'auxpass', 'conj', 'advmod', 'prep', 'pobj', 'dobj', 'det', 'amod', 'nsubj', 'xcomp', 'advcl', 'cc', 'punct']
+POS_FOR_DEP = {
+    'aux': 'AUX', 'auxpass': 'AUX', 'conj': 'VERB', 'advmod': 'ADV', 'prep': 'ADP', 'pobj': 'NOUN',
+    'dobj': 'NOUN', 'det': 'DET', 'amod': 'ADJ', 'nsubj': 'PRON', 'xcomp': 'VERB', 'advcl': 'VERB',
+    'cc': 'CCONJ', 'punct': 'PUNCT',
+}
+
+
+def make_sentence(vocab, n_tokens, seed=0):
+    """ランダムな射影的依存木を持つ n_tokens 語の文を作る"""
+    rng = random.Random(seed)
+    heads = [0] * n_tokens
+    deps = [''] * n_tokens
+
+    def build(lo, hi, head):
+        # [lo, hi) の範囲に head を親とする部分木を作る
+        if lo >= hi:
+            return
+        root = rng.randrange(lo, hi)
+        heads[root] = head
+        deps[root] = rng.choice(DEPS)
+        build(lo, root, root)
+        build(root + 1, hi, root)
+
+    root = rng.randrange(n_tokens)
+    heads[root], deps[root] = root, 'ROOT'
+    build(0, root, root)
+    build(root + 1, n_tokens, root)
+    pos = ['VERB' if d == 'ROOT' else POS_FOR_DEP[d] for d in deps]
+    words = [f"w{i}" for i in range(n_tokens)]
+    return Doc(vocab, words=words, heads=heads, deps=deps, pos=pos)
+
+
+def legacy_phrases(analyzer, sent):
+    """従来の実装: トークンごとに句を展開する"""
+    phrases = []
+    for token in sent:
+        if token.pos_ in ('VERB', 'AUX'):
+            phrases.append(analyzer._get_verb_phrase_tokens(token))
+        elif token.pos_ == 'ADP':
+            phrases.append(analyzer._get_prepositional_phrase_tokens(token))
+        elif token.pos_ == 'ADV':
+            phrases.append(analyzer._get_adverb_phrase_tokens(token))
+    return phrases
+
+
+def main():
+    nlp = spacy.blank("en")
+    analyzer = SentenceAnalyzer(nlp)
+    print(f"{'tokens':>6} {'legacy (ms)':>12} {'single pass (ms)':>17} {'speedup':>8}")
+    for n_tokens in (10, 50, 200):
+        sent = make_sentence(nlp.vocab, n_tokens)[:]
+        number = max(1, 2000 // n_tokens)
+        legacy = min(timeit.repeat(lambda: legacy_phrases(analyzer, sent), number=number, repeat=5)) / number
+        single = min(timeit.repeat(lambda: analyzer._compute_phrase_masks(sent), number=number, repeat=5)) / number
+        print(f"{n_tokens:>6} {legacy * 1000:>12.3f} {single * 1000:>17.3f} {legacy / single:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
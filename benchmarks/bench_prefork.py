@@ -0,0 +1,67 @@
+"""ワーカーごとにモデルを読み込む場合と pre-fork モードのメモリ使用量の比較
+
+それぞれのモードで server.create_service を作り、ワーカーの起動直後 (before) と、
+同じ文章を解析したあと (after) のワーカーごとの USS / PSS (instrumentation.process_memory)
+を表示する。USS はそのワーカーだけが使っているメモリで、pre-fork モードでは
+親プロセスと共有されたモデルのページは含まれない。Linux でのみ計測できる。
+
+    python benchmarks/bench_prefork.py [--workers 4] [--requests 200]
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import server  # noqa: E402
+
+SAMPLE_TEXT = (
+    "The quick brown fox jumps over the lazy dog. A young boy is running quickly in the park. "
+    "My diligent sister has been studying English very hard. All the students will go to the store "
+    "to buy some groceries. Dr. Smith visited Tokyo on July 23rd, 2025 to attend a conference organized by Google."
+)
+
+
+def summarize(memory):
+    uss = [worker["uss_kib"] / 1024 for worker in memory]
+    pss = [worker["pss_kib"] / 1024 for worker in memory]
+    return f"USS {statistics.mean(uss):7.1f} MiB/worker (計 {sum(uss):7.1f})  PSS 計 {sum(pss):7.1f} MiB"
+
+
+def measure(prefork, args):
+    service = server.create_service(args.model, workers=args.workers, prefork=prefork)
+    try:
+        for future in service.warmup:
+            future.result()
+        before = service.worker_memory()
+        texts = [f"{SAMPLE_TEXT} ({i})" for i in range(args.requests)]  # キャッシュに当たらないよう毎回変える
+        for start in range(0, len(texts), args.batch_size):
+            service.analyze_batch(texts[start:start + args.batch_size])
+        after = service.worker_memory()
+    finally:
+        service.shutdown()
+        if prefork:
+            gc.unfreeze()
+    return before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--model", default="en_core_web_sm")
+    args = parser.parse_args()
+
+    for prefork in (False, True):
+        before, after = measure(prefork, args)
+        if not before or "uss_kib" not in before[0]:
+            sys.exit("ワーカーのメモリ使用量を読めません (/proc/<pid>/smaps_rollup が必要です)")
+        label = "pre-fork" if prefork else "per-worker"
+        print(f"{label:>10} before: {summarize(before)}")
+        print(f"{label:>10}  after: {summarize(after)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""解析プロファイルごとのスループットの比較
+
+en_core_web_sm を使い、各プロファイル (full / chunks-only / pos-only) で同じ文章を
+analyze_many に通したときの文書数/秒とトークン数/秒を表示する。
+
+    python benchmarks/bench_profiles.py [--docs 200] [--batch-size 64]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analyzer import ANALYSIS_PROFILES, SentenceAnalyzer, load_pipeline  # noqa: E402
+
+SAMPLE_TEXT = (
+    "The quick brown fox jumps over the lazy dog. A young boy is running quickly in the park. "
+    "My diligent sister has been studying English very hard. All the students will go to the store "
+    "to buy some groceries. Dr. Smith visited Tokyo on July 23rd, 2025 to attend a conference organized by Google."
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--model", default="en_core_web_sm")
+    args = parser.parse_args()
+
+    texts = [SAMPLE_TEXT] * args.docs
+    print(f"{'profile':>12} {'docs/s':>9} {'tokens/s':>10}")
+    for profile in ANALYSIS_PROFILES:
+        analyzer = SentenceAnalyzer(load_pipeline(args.model, profile), profile=profile)
+        list(analyzer.analyze_many(texts[:args.batch_size], batch_size=args.batch_size))  # ウォームアップ
+        started = time.perf_counter()
+        results = list(analyzer.analyze_many(texts, batch_size=args.batch_size))
+        elapsed = time.perf_counter() - started
+        n_tokens = sum(len(sentence["tokens"]) for result in results for sentence in result)
+        print(f"{profile:>12} {len(texts) / elapsed:>9.1f} {n_tokens / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
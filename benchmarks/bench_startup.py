@@ -0,0 +1,66 @@
+"""起動時間 (コールドスタート) の内訳の計測
+
+新しい Python プロセスを起動するたびに、次の段階の時間を計る。
+
+    modules          アプリのモジュール (analyzer / diagrams / formatter など) の import
+                     (spaCy と graphviz は使うときまで import しないため、これで画面を表示できる)
+    import           spaCy の import
+    load             モデルの読み込み
+    first_inference  最初の解析 (語彙の表の読み込みなど、初回だけの初期化を含む)
+    graphviz         最初の DOT の図を作るときの graphviz の import
+
+段階ごとの中央値と、画面を表示できるまで (modules) と解析できるまで (合計) の時間を表示する。
+
+    python benchmarks/bench_startup.py [--runs 5] [--model en_core_web_sm]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import analyzer, cache, compact, diagrams, formatter, instrumentation, store, warmup
+timings = {{"modules": time.perf_counter() - started}}
+loader = warmup.ModelLoader({model!r})
+loader.wait()
+timings.update(loader.timings)
+started = time.perf_counter()
+diagrams.build_dependency_dot([])
+timings["graphviz"] = time.perf_counter() - started
+print(json.dumps(timings))
+"""
+
+STAGES = ("modules", "import", "load", "first_inference", "graphviz")
+
+
+def measure_once(model_name):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD.format(root=ROOT, model=model_name)],
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--model", default="en_core_web_sm")
+    args = parser.parse_args()
+
+    runs = [measure_once(args.model) for _ in range(args.runs)]
+    medians = {stage: statistics.median(run[stage] for run in runs) * 1000 for stage in STAGES}
+    for stage in STAGES:
+        print(f"{stage:>16} {medians[stage]:>9.1f} ms")
+    print(f"{'shell ready':>16} {medians['modules']:>9.1f} ms")
+    model_ready = sum(medians[stage] for stage in ("modules", "import", "load", "first_inference"))
+    print(f"{'model ready':>16} {model_ready:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
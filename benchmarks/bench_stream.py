@@ -0,0 +1,50 @@
+"""analyze_stream のメモリ使用量の確認
+
+en_core_web_sm を使い、段落数を変えた文章を analyze_stream で解析したときの
+ピークメモリ (tracemalloc) を表示する。結果は件数を数えるだけで保持しないため、
+入力が大きくなってもピークはほぼ一定になる。
+
+    python benchmarks/bench_stream.py [--paragraphs 100 1000 5000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analyzer import SentenceAnalyzer, load_pipeline  # noqa: E402
+
+PARAGRAPH = (
+    "1. The quick brown fox jumps over the lazy dog. A young boy is running quickly in the park.\n"
+    "My diligent sister has been studying English very hard.\n"
+    "\n"
+)
+
+
+def paragraphs(n):
+    for _ in range(n):
+        yield from PARAGRAPH.splitlines(keepends=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paragraphs", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--block-chars", type=int, default=20_000)
+    parser.add_argument("--model", default="en_core_web_sm")
+    args = parser.parse_args()
+
+    analyzer = SentenceAnalyzer(load_pipeline(args.model))
+    print(f"{'paragraphs':>10} {'sentences':>10} {'peak MiB':>9} {'seconds':>8}")
+    for n in args.paragraphs:
+        tracemalloc.start()
+        started = time.perf_counter()
+        n_sentences = sum(1 for _ in analyzer.analyze_stream(paragraphs(n), block_chars=args.block_chars))
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{n:>10} {n_sentences:>10} {peak / 2**20:>9.1f} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""解析サーバー (server.py) の簡易負荷試験
+
+指定した並列数で /analyze にリクエストを送り、レイテンシの p50/p99 と
+スループットを表示する。
+
+    python server.py --port 8000 --workers 4 &
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --requests 500 --concurrency 16
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "A young boy is running quickly in the park. My diligent sister has been studying English very hard.",
+    "All the students will go to the store to buy some groceries.",
+    "Dr. Smith visited Tokyo on July 23rd, 2025 to attend a conference organized by Google.",
+]
+
+
+def percentile(values, ratio):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(ratio * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    latencies = []
+    status_counts = {}
+    lock = threading.Lock()
+
+    def send(i):
+        body = json.dumps({"text": SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]}).encode("utf-8")
+        request = urllib.request.Request(f"{args.url}/analyze", data=body, headers={"Content-Type": "application/json"})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, ConnectionError):
+            status = "connection error"  # 接続の拒否やリセットも失敗したリクエストとして数える
+        elapsed = time.perf_counter() - started
+        with lock:
+            status_counts[status] = status_counts.get(status, 0) + 1
+            if status == 200:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(send, range(args.requests)))
+    total = time.perf_counter() - started
+
+    print(f"requests: {args.requests}  concurrency: {args.concurrency}  status: {status_counts}")
+    print(f"throughput: {args.requests / total:.1f} req/s")
+    if latencies:
+        print(f"latency p50: {percentile(latencies, 0.50) * 1000:.1f} ms  "
+              f"p99: {percentile(latencies, 0.99) * 1000:.1f} ms  "
+              f"mean: {statistics.mean(latencies) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""解析・HTML 整形・図の生成をまとめて計測し、ベースラインと比較するベンチマーク
+
+固定のコーパス (短い文、入れ子の多い長い文、番号付きの練習問題、大きな文書) ごとに、
+次の3つを計測する。
+
+    analyze   SentenceAnalyzer.analyze_text (段階ごとの時間は instrumentation.Trace から)
+    format    ResultFormatter.format_html_all
+    diagrams  依存関係図とチャンクツリー (DOT / Mermaid) のソース生成
+
+各計測は処理時間の中央値 (ms)、スループット (文字数/秒、トークン数/秒)、
+ピークメモリ (KiB, tracemalloc で別に1回計測) を記録する。
+
+    python benchmarks/suite.py --save benchmarks/baseline.json      # ベースラインを記録
+    python benchmarks/suite.py --baseline benchmarks/baseline.json  # 比較 (悪化があれば終了コード 1)
+
+処理時間はマシンに依存するため、ベースラインは比較に使うマシンで記録する。
+コーパスやモデルが記録時と異なる場合は比較しない。
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from analyzer import SentenceAnalyzer, load_pipeline  # noqa: E402
+from diagrams import (build_chunk_tree_dot, build_chunk_tree_mermaid,  # noqa: E402
+                      build_dependency_dot, build_dependency_mermaid)
+from formatter import ResultFormatter  # noqa: E402
+from instrumentation import Trace  # noqa: E402
+
+SHORT_SENTENCES = [
+    "I love programming.",
+    "The cat sits on the mat.",
+    "She reads books every night.",
+    "We went to the park yesterday.",
+    "He can swim very fast.",
+    "They are playing soccer now.",
+    "My brother bought a new car.",
+    "The sun rises in the east.",
+]
+
+NESTED_SENTENCES = [
+    "The teacher who had been working at the school that my father attended when he was young "
+    "told the students that they should read the book which the author had written after he "
+    "returned from the country where he had spent most of his childhood.",
+    "Although the committee, which consisted of experts from several universities in Europe and Asia, "
+    "had carefully reviewed the proposal that the young researchers submitted last spring, it decided "
+    "to postpone the final decision until the members could discuss the budget with the sponsors.",
+    "If you had told me that the train to the city where my grandmother lives would be delayed "
+    "because of the heavy snow that fell during the night, I would have left the house much earlier "
+    "and taken the bus that stops in front of the station.",
+]
+
+EXERCISE_LINES = [
+    "1. The quick brown fox jumps over the lazy dog.",
+    "日本語訳: 素早い茶色の狐がのろまな犬を飛び越える。",
+    "2. A young boy is running quickly in the park.",
+    "",
+    "3.  My diligent sister has been studying English very hard.",
+    "---",
+    "4. 1. All the students will go to the store to buy some groceries.",
+    "5. Dr. Smith visited Tokyo on July 23rd, 2025 to attend a conference organized by Google.",
+]
+
+
+def build_corpora(large_kb=100):
+    """名前 -> テキストの辞書 (乱数を使わず、毎回同じ内容になる)"""
+    corpora = {
+        "short": " ".join(SHORT_SENTENCES),
+        "nested": " ".join(NESTED_SENTENCES),
+        "exercises": "\n".join(EXERCISE_LINES),
+    }
+    paragraph = " ".join(SHORT_SENTENCES + NESTED_SENTENCES)
+    paragraphs = []
+    size = 0
+    while size < large_kb * 1024:
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    corpora["large"] = "\n\n".join(paragraphs)
+    return corpora
+
+
+def corpus_signature(corpora):
+    digest = hashlib.sha256()
+    for name in sorted(corpora):
+        digest.update(name.encode("utf-8") + b"\0" + corpora[name].encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+# --- 計測 ---
+def run_diagrams(sentences):
+    for sentence in sentences:
+        tokens, chunks = sentence["tokens"], sentence["chunks"]
+        build_dependency_dot(tokens)
+        build_dependency_mermaid(tokens)
+        build_chunk_tree_dot(tokens, chunks, sentence["chunk_hierarchy"], sentence["chunk_index"])
+        build_chunk_tree_mermaid(tokens, chunks, sentence["chunk_hierarchy"], sentence["chunk_index"])
+
+
+def peak_memory_kib(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def measure(fn, repeat, chars, tokens, stage_traces=None):
+    """fn を repeat 回実行した処理時間の中央値などの計測結果を返す
+
+    stage_traces を渡すと、fn が実行ごとに追加する Trace から段階ごとの時間の中央値も記録する。
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    seconds = statistics.median(times)
+    result = {
+        "median_ms": seconds * 1000,
+        "chars_per_s": chars / seconds if seconds else 0.0,
+        "tokens_per_s": tokens / seconds if seconds else 0.0,
+        "peak_kib": peak_memory_kib(fn),
+    }
+    if stage_traces:
+        stages = {}
+        for trace in stage_traces[:repeat]:
+            for name, (stage_seconds, _) in trace.stages.items():
+                stages.setdefault(name, []).append(stage_seconds * 1000)
+        result["stages_ms"] = {name: statistics.median(values) for name, values in stages.items()}
+    return result
+
+
+def run_suite(analyzer, corpora, repeat=5):
+    """コーパスごとに analyze / format / diagrams を計測し、"段階/コーパス" -> 計測結果 の辞書を返す"""
+    results = {}
+    for name, text in corpora.items():
+        traces = []
+
+        def analyze():
+            trace = Trace()
+            traces.append(trace)
+            return analyzer.analyze_text(text, trace=trace)
+
+        sentences = analyze()
+        traces.clear()
+        n_tokens = sum(len(sentence["tokens"]) for sentence in sentences)
+        formatter = ResultFormatter(sentences)
+        results[f"analyze/{name}"] = measure(analyze, repeat, len(text), n_tokens, traces)
+        results[f"format/{name}"] = measure(formatter.format_html_all, repeat, len(text), n_tokens)
+        results[f"diagrams/{name}"] = measure(lambda: run_diagrams(sentences), repeat, len(text), n_tokens)
+    return results
+
+
+# --- ベースラインとの比較 ---
+def compare(current, baseline, threshold=0.2, min_ms=1.0):
+    """ベースラインより threshold (割合) を超えて悪化した指標を (計測名, 指標, ベースライン, 今回) のリストで返す
+
+    比べるのは処理時間 (全体と段階ごと) とピークメモリ (スループットは処理時間から決まるので比べない)。
+    ベースラインで min_ms 未満の処理時間は誤差が大きいため比較から除く。
+    """
+    regressions = []
+    for case, base in baseline.items():
+        now = current.get(case)
+        if now is None:
+            continue
+        pairs = [("median_ms", base["median_ms"], now["median_ms"])]
+        pairs += [
+            (f"stages_ms.{stage}", before, now.get("stages_ms", {}).get(stage))
+            for stage, before in base.get("stages_ms", {}).items()
+        ]
+        for metric, before, after in pairs:
+            if after is not None and before >= min_ms and after > before * (1 + threshold):
+                regressions.append((case, metric, before, after))
+        if now["peak_kib"] > base["peak_kib"] * (1 + threshold):
+            regressions.append((case, "peak_kib", base["peak_kib"], now["peak_kib"]))
+    return regressions
+
+
+def make_report(results, model_name, corpora, repeat):
+    return {
+        "model": model_name,
+        "corpus_signature": corpus_signature(corpora),
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def format_results(results):
+    lines = [f"{'case':<20} {'median ms':>10} {'chars/s':>11} {'tokens/s':>10} {'peak KiB':>9}  stages (ms)"]
+    for case, result in results.items():
+        stages = " ".join(f"{name}={ms:.1f}" for name, ms in result.get("stages_ms", {}).items())
+        lines.append(f"{case:<20} {result['median_ms']:>10.2f} {result['chars_per_s']:>11.0f} "
+                     f"{result['tokens_per_s']:>10.0f} {result['peak_kib']:>9.0f}  {stages}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="en_core_web_sm")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--large-kb", type=int, default=100, help="大きな文書のコーパスのサイズ (KiB)")
+    parser.add_argument("--save", help="計測結果をベースラインとして書き出す JSON ファイル")
+    parser.add_argument("--baseline", help="比較するベースラインの JSON ファイル")
+    parser.add_argument("--threshold", type=float, default=0.2, help="悪化とみなす割合 (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    corpora = build_corpora(args.large_kb)
+    analyzer = SentenceAnalyzer(load_pipeline(args.model))
+    results = run_suite(analyzer, corpora, repeat=args.repeat)
+    report = make_report(results, args.model, corpora, args.repeat)
+    print(format_results(results))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"ベースラインを書き出しました: {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline["model"], baseline["corpus_signature"]) != (report["model"], report["corpus_signature"]):
+            print("ベースラインとモデルまたはコーパスが異なるため比較できません", file=sys.stderr)
+            return 2
+        regressions = compare(results, baseline["results"], args.threshold)
+        for case, metric, before, after in regressions:
+            print(f"悪化: {case} {metric}: {before:.2f} -> {after:.2f}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"ベースラインからの悪化はありません (しきい値 {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def make_cache_key(clean_text, model_name, model_version, *extra):
+    """整形済みテキストとモデル名/バージョンから内容ベースのキャッシュキーを作成する"""
+    hasher = hashlib.sha256()
+    for part in (model_name, model_version, *extra, clean_text):
+        hasher.update(str(part).encode("utf-8"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+# 図の内容を決めるトークンのフィールド (日本語ラベルはこれらから決まるため含めない)
+RENDER_TOKEN_FIELDS = ('id', 'text', 'pos', 'dep', 'head_id')
+RENDER_CHUNK_FIELDS = ('type', 'text', 'start_id', 'end_id')
+
+
+def make_render_key(kind, tokens, chunks=()):
+    """図の種類と、図の内容を決めるトークン/チャンクのフィールドから描画キャッシュのキーを作成する"""
+    hasher = hashlib.sha256(str(kind).encode("utf-8"))
+    for token in tokens:
+        hasher.update(repr(tuple(token[field] for field in RENDER_TOKEN_FIELDS)).encode("utf-8"))
+    hasher.update(b"\0")
+    for chunk in chunks:
+        hasher.update(repr(tuple(chunk[field] for field in RENDER_CHUNK_FIELDS)).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def estimate_size(value):
+    """キャッシュ値のおおよそのバイト数 (JSONにした場合のサイズ) を返す"""
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class AnalysisCache:
+    """解析結果を保持するLRUキャッシュ
+
+    エントリ数 (max_entries) とバイト数 (max_bytes) の上限を持ち、超えた場合は
+    最も長く使われていないエントリから削除する。Streamlit の st.cache_resource で
+    セッション間共有されることを想定し、操作はロックで保護している。
+    保持している結果は呼び出し元と共有されるため、読み取り専用として扱うこと。
+    """
+
+    def __init__(self, max_entries=256, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = estimate_size(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # 単体で上限を超える結果はキャッシュしない
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self.current_bytes > self.max_bytes)
+        ):
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """ヒット/ミス数などの統計情報を返す"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,73 @@
+import re
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+# 英字を含む1行を「行頭の番号 (例: "1. ") と前後の空白」と「本文」に分ける
+# (\s の代わりに [^\S\n] を使い、行をまたいで一致しないようにする)
+# 英字を含まない行は先読みで一度の走査で読み飛ばし、本文は空白以外の文字から始めることで、
+# 空白や番号だけの長い行で番号・空白・本文の間の分け方を試し直さない (後戻りが行の長さの2乗にならない)
+TEXT_LINE_PATTERN = re.compile(
+    r"^(?=[^\n]*[a-zA-Z])(?:\d+\.[^\S\n]*)*[^\S\n]*(\S(?:[^\n]*\S)?)[^\S\n]*$", re.MULTILINE)
+
+
+class CleanedText:
+    """整形後のテキストと、その文字位置を元のテキストの位置に戻すための対応表
+
+    整形後の各行は元のテキストの連続した部分文字列なので、行ごとに
+    (整形後の開始位置, 元の開始位置) を持てば位置を変換できる。
+    """
+
+    __slots__ = ('text', 'clean_starts', 'raw_starts')
+
+    def __init__(self, text, clean_starts, raw_starts):
+        self.text = text
+        self.clean_starts = clean_starts
+        self.raw_starts = raw_starts
+
+    def to_raw(self, offset):
+        """整形後のテキストの文字位置を元のテキストの文字位置に変換する
+
+        行の間に挟んだ改行の位置は、その前の行の本文の末尾に対応させる。
+        """
+        if not self.clean_starts:
+            return offset
+        line = max(bisect_right(self.clean_starts, offset) - 1, 0)
+        return self.raw_starts[line] + offset - self.clean_starts[line]
+
+    def span_to_raw(self, start, end):
+        """整形後のテキストの範囲 [start, end) を元のテキストの範囲に変換する"""
+        if end <= start:
+            raw_start = self.to_raw(start)
+            return raw_start, raw_start
+        return self.to_raw(start), self.to_raw(end - 1) + 1
+
+
+def clean_line(line):
+    """1行から行頭の番号と前後の空白を取り除く (英字を含まない行は None)"""
+    match = TEXT_LINE_PATTERN.match(line.rstrip("\n"))
+    return match.group(1) if match else None
+
+
+def clean_text(text):
+    """英字を含まない行と行頭の番号を取り除いた CleanedText を返す
+
+    英字を含む行の本文だけを一度の finditer で取り出し (英字を含まない行の読み飛ばしも
+    正規表現エンジン内で行う)、各本文の元のテキスト上の位置を記録する。
+    """
+    matches = list(TEXT_LINE_PATTERN.finditer(text))
+    parts = [match.group(1) for match in matches]
+    raw_starts = array('q', [match.start(1) for match in matches])
+    clean_starts = array('q', accumulate((len(part) + 1 for part in parts[:-1]), initial=0) if parts else ())
+    return CleanedText("\n".join(parts), clean_starts, raw_starts)
+
+
+def _legacy_clean_text(text):
+    """行ごとに re.search / re.sub を呼ぶ従来の整形 (clean_text と結果が同じことを確かめるための基準)"""
+    cleaned_lines = [
+        re.sub(r"^(?:\d+\.\s*)+", "", line).strip()
+        for line in text.split("\n")
+        if re.search(r"[a-zA-Z]", line)
+    ]
+    clean = "\n".join(cleaned_lines)
+    return clean if clean.strip() else ""
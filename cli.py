@@ -0,0 +1,245 @@
+"""コーパスを一括で解析して JSONL に書き出すコマンドラインツール
+
+    python -m analyzer corpus/ other.txt -o out.jsonl --workers 4
+    cat text.txt | python -m analyzer --granularity document
+
+入力はファイル、ディレクトリ (配下の *.txt を名前順に読む)、または標準入力 ("-")。
+各ファイル (--lines の場合は空でない各行) を1つの文書として解析し、入力順に
+1文 (または1文書) 1行の JSON を書き出す。--checkpoint を指定すると書き出し済みの
+文書数を記録し、同じ入力で再実行したときに続きから再開する。
+--format compact では、バッチ内の単語やラベルをバッチごとに一度だけ {"vocab": [...]} の
+行に書き出し、文はそのIDの列で表す (compact.iter_compact_records で読み戻せる)。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from analyzer import ANALYSIS_PROFILES, AnalysisError, SentenceAnalyzer, load_pipeline
+from compact import batch_records
+
+# --- ワーカープロセス側 ---
+_worker_analyzer = None
+
+
+def _init_worker(model_name, profile):
+    """ワーカープロセスの起動時に一度だけモデルを読み込む"""
+    global _worker_analyzer
+    _worker_analyzer = SentenceAnalyzer(load_pipeline(model_name, profile), profile=profile)
+
+
+def _analyze_batch(texts, batch_size):
+    """文書のリストを解析し、文書ごとに (結果, エラー文字列) を返す"""
+    return [
+        (None, str(result.error)) if isinstance(result, AnalysisError) else (result, None)
+        for result in _worker_analyzer.analyze_many(texts, batch_size=batch_size, raise_errors=False)
+    ]
+
+
+# --- 入力 ---
+def iter_paths(inputs):
+    """入力の指定をファイルパス ("-" は標準入力) の列に展開する"""
+    for name in inputs or ["-"]:
+        if os.path.isdir(name):
+            for root, dirs, files in os.walk(name):
+                dirs.sort()
+                for filename in sorted(files):
+                    if filename.endswith(".txt"):
+                        yield os.path.join(root, filename)
+        else:
+            yield name
+
+
+def iter_documents(inputs, lines=False, encoding="utf-8"):
+    """(文書ID, テキスト) を入力順に返すジェネレータ"""
+    for path in iter_paths(inputs):
+        doc_id = "<stdin>" if path == "-" else path
+        f = sys.stdin if path == "-" else open(path, encoding=encoding)
+        try:
+            if lines:
+                for lineno, line in enumerate(f, 1):
+                    if line.strip():
+                        yield f"{doc_id}:{lineno}", line
+            else:
+                yield doc_id, f.read()
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+def iter_batches(documents, batch_size, skip=0):
+    """先頭の skip 件を読み飛ばし、batch_size 件ずつのリストにまとめる"""
+    batch = []
+    for index, document in enumerate(documents):
+        if index < skip:
+            continue
+        batch.append(document)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- チェックポイント ---
+def read_checkpoint(path):
+    """書き出し済みの文書数と出力ファイルのバイト数を返す (チェックポイントがなければ 0)"""
+    if not path or not os.path.exists(path):
+        return {"documents": 0, "output_bytes": 0}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_checkpoint(path, documents, output_bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"documents": documents, "output_bytes": output_bytes}, f)
+    os.replace(tmp_path, path)  # 書き込み途中で中断しても壊れないように置き換える
+
+
+def output_matches_checkpoint(path, checkpoint):
+    """出力ファイルがチェックポイントの位置まで書かれているか (削除されたり書き込み前に中断したりしていないか)"""
+    if not path or not checkpoint["documents"]:
+        return True
+    return os.path.exists(path) and os.path.getsize(path) >= checkpoint["output_bytes"]
+
+
+def open_output(path, checkpoint):
+    """出力ファイルを開く (再開時はチェックポイント以降に書かれた途中の行を切り捨てて追記する)"""
+    if not checkpoint["documents"]:
+        return open(path, "w", encoding="utf-8")
+    out = open(path, "r+", encoding="utf-8")
+    out.truncate(checkpoint["output_bytes"])
+    out.seek(checkpoint["output_bytes"])
+    return out
+
+
+# --- 出力 ---
+def to_records(doc_id, result, error, granularity):
+    """1文書の解析結果を JSONL の行となる辞書の列にする"""
+    if error is not None:
+        return [{"doc_id": doc_id, "error": error}]
+    if granularity == "document":
+        return [{"doc_id": doc_id, "sentences": result}]
+    return [{"doc_id": doc_id, "sentence_index": i, **sentence} for i, sentence in enumerate(result)]
+
+
+def run(batches, analyze, out, granularity, on_batch=None, output_format="json"):
+    """バッチごとに解析して out に書き出し、件数の集計を返す
+
+    analyze はバッチの列を受け取り、(バッチ, 文書ごとの (結果, エラー)) を入力順に返す関数。
+    output_format が "compact" の場合は、バッチごとの語彙表と列指向の文を書き出す
+    (compact.batch_records)。
+    """
+    stats = {"documents": 0, "sentences": 0, "tokens": 0, "errors": 0}
+    for batch, results in analyze(batches):
+        if output_format == "compact":
+            records = batch_records(
+                ((doc_id, result, error) for (doc_id, _), (result, error) in zip(batch, results)), granularity)
+        else:
+            records = [
+                record
+                for (doc_id, _), (result, error) in zip(batch, results)
+                for record in to_records(doc_id, result, error, granularity)
+            ]
+        out.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        for result, error in results:
+            if error is not None:
+                stats["errors"] += 1
+            else:
+                stats["sentences"] += len(result)
+                stats["tokens"] += sum(len(sentence["tokens"]) for sentence in result)
+        stats["documents"] += len(batch)
+        if on_batch is not None:
+            out.flush()
+            on_batch(stats["documents"])
+    return stats
+
+
+def analyze_in_process(batch_size):
+    def analyze(batches):
+        for batch in batches:
+            yield batch, _analyze_batch([text for _, text in batch], batch_size)
+    return analyze
+
+
+def analyze_in_pool(executor, batch_size, max_in_flight):
+    """バッチをプロセスプールに投入し、入力順に結果を返す (投入中のバッチ数は max_in_flight まで)"""
+    def analyze(batches):
+        in_flight = deque()
+        for batch in batches:
+            in_flight.append((batch, executor.submit(_analyze_batch, [text for _, text in batch], batch_size)))
+            if len(in_flight) >= max_in_flight:
+                batch, future = in_flight.popleft()
+                yield batch, future.result()
+        while in_flight:
+            batch, future = in_flight.popleft()
+            yield batch, future.result()
+    return analyze
+
+
+def format_summary(stats, elapsed):
+    elapsed = max(elapsed, 1e-9)
+    return (f"{stats['documents']} documents, {stats['sentences']} sentences, {stats['tokens']} tokens, "
+            f"{stats['errors']} errors in {elapsed:.1f}s "
+            f"({stats['documents'] / elapsed:.1f} docs/s, {stats['tokens'] / elapsed:.0f} tokens/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m analyzer", description="英文のコーパスを解析して JSONL に書き出す")
+    parser.add_argument("inputs", nargs="*", help="ファイル、ディレクトリ、または - (標準入力)。省略時は標準入力")
+    parser.add_argument("-o", "--output", help="出力先の JSONL ファイル (省略時は標準出力)")
+    parser.add_argument("--granularity", choices=["sentence", "document"], default="sentence",
+                        help="1行に書き出す単位")
+    parser.add_argument("--format", choices=["json", "compact"], default="json",
+                        help="compact: バッチごとに語彙表を一度だけ書き出し、文は語彙表のIDの列で表す")
+    parser.add_argument("--lines", action="store_true", help="入力の空でない各行を1つの文書として扱う")
+    parser.add_argument("--workers", type=int, default=1, help="ワーカープロセス数 (各プロセスがモデルを1つ読み込む)")
+    parser.add_argument("--batch-size", type=int, default=64, help="1回にワーカーへ渡す文書数")
+    parser.add_argument("--checkpoint", help="書き出し済みの文書数を記録するファイル (再実行時に続きから再開する)")
+    parser.add_argument("--model", default="en_core_web_sm")
+    parser.add_argument("--profile", default="full", choices=list(ANALYSIS_PROFILES))
+    parser.add_argument("--encoding", default="utf-8")
+    args = parser.parse_args(argv)
+
+    checkpoint = read_checkpoint(args.checkpoint)
+    if not output_matches_checkpoint(args.output, checkpoint):
+        print(f"出力ファイル {args.output} がチェックポイント {args.checkpoint} の位置まで書かれていないため、"
+              "最初から解析します", file=sys.stderr)
+        checkpoint = {"documents": 0, "output_bytes": 0}
+    skip = checkpoint["documents"]
+    if skip:
+        print(f"チェックポイントから再開します ({skip} 文書を読み飛ばします)", file=sys.stderr)
+    batches = iter_batches(iter_documents(args.inputs, args.lines, args.encoding), args.batch_size, skip)
+
+    out = open_output(args.output, checkpoint) if args.output else sys.stdout
+    on_batch = None
+    if args.checkpoint:
+        def on_batch(done):
+            write_checkpoint(args.checkpoint, skip + done, out.tell() if out is not sys.stdout else 0)
+    executor = None
+    try:
+        if args.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                           initargs=(args.model, args.profile))
+            analyze = analyze_in_pool(executor, args.batch_size, max_in_flight=args.workers * 2)
+        else:
+            _init_worker(args.model, args.profile)
+            analyze = analyze_in_process(args.batch_size)
+
+        started = time.perf_counter()
+        stats = run(batches, analyze, out, args.granularity, on_batch, args.format)
+        print(format_summary(stats, time.perf_counter() - started), file=sys.stderr)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if out is not sys.stdout:
+            out.close()
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,593 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+
+from analyzer import JAPANESE_FIELDS, build_chunk_hierarchy, build_chunk_index
+
+# 整数として列に保持するトークンのフィールド
+TOKEN_INT_FIELDS = ('id', 'head_id', 'start', 'end')
+# 他のフィールドから導出できるため保持しないフィールド
+TOKEN_DERIVED_FIELDS = ('children_ids', 'is_root', 'is_entity_part')
+
+# バイナリ形式 (to_bytes / write_results_file)。数値はすべてリトルエンディアン。
+# 文: magic, flags, (予備), フィールド数, トークン数, チャンク数
+SENTENCE_HEADER = struct.Struct('<4sBxHII')
+SENTENCE_MAGIC = b'CSB1'
+HAS_LABELS = 0x01  # 文の中にラベル表を含む (to_bytes 単体で読める)
+# ファイルの末尾: ラベル表の位置, 索引の位置, 文の数, magic
+FILE_FOOTER = struct.Struct('<QQI4s')
+FILE_MAGIC = b'CSF1'
+NATIVE_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+class LabelTable:
+    """文字列を一度だけ保持し、整数IDで参照するための表 (None は -1)"""
+
+    def __init__(self, strings=()):
+        self.strings = []
+        self._ids = {}
+        for value in strings:
+            self.add(value)
+
+    def __len__(self):
+        return len(self.strings)
+
+    def add(self, value):
+        if value is None:
+            return -1
+        label_id = self._ids.get(value)
+        if label_id is None:
+            label_id = len(self.strings)
+            self._ids[value] = label_id
+            self.strings.append(value)
+        return label_id
+
+    def get(self, label_id):
+        return None if label_id < 0 else self.strings[label_id]
+
+    def nbytes(self):
+        return (sys.getsizeof(self.strings) + sys.getsizeof(self._ids)
+                + sum(sys.getsizeof(value) for value in self.strings))
+
+
+class TokenView(Mapping):
+    """CompactSentence 内の1トークンを、従来のトークン辞書と同じキーで参照するビュー"""
+
+    __slots__ = ('_sentence', '_index')
+
+    def __init__(self, sentence, index):
+        self._sentence = sentence
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._sentence._token_value(self._index, key)
+
+    def __iter__(self):
+        return iter(self._sentence.view_fields)
+
+    def __len__(self):
+        return len(self._sentence.view_fields)
+
+    def __repr__(self):
+        return f"TokenView({dict(self)!r})"
+
+
+class TokenColumns(Sequence):
+    """トークン列をトークン辞書のリストのように扱うためのシーケンス"""
+
+    __slots__ = ('_sentence',)
+
+    def __init__(self, sentence):
+        self._sentence = sentence
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return TokenView(self._sentence, index)
+
+    def __len__(self):
+        return len(self._sentence.int_columns['id'])
+
+
+class CompactSentence(Mapping):
+    """1文の解析結果を列指向で保持するコンパクトな形式
+
+    ラベルや単語などの文字列は LabelTable に一度だけ格納し、トークンごとには
+    そのIDと先頭/親トークンIDや文字位置を array の列として持つ。従来の辞書と同じ
+    キーで参照でき、result['tokens'][i]['pos'] のようなアクセスはその場で値を組み立てる。
+    translator (SentenceAnalyzer) を渡すと、生のラベルだけの結果 (lazy_labels) でも
+    dep_japanese などの日本語訳を参照時に求める。
+    """
+
+    def __init__(self, labels, token_fields, label_columns, int_columns,
+                 chunk_columns, extra, translator=None):
+        self.labels = labels
+        self.token_fields = token_fields
+        self.translator = translator
+        self.view_fields = token_fields
+        if translator is not None and token_fields:
+            self.view_fields += tuple(key for key, source in JAPANESE_FIELDS.items()
+                                      if key not in token_fields and source in token_fields)
+        self.label_columns = label_columns
+        self.int_columns = int_columns
+        self.chunk_columns = chunk_columns
+        self.extra = extra
+        self._chunk_hierarchy = None
+        self._chunk_index = None
+        self._children = None
+
+    @classmethod
+    def from_dict(cls, sentence, labels=None, translator=None):
+        """_analyze_sentence が返す辞書から CompactSentence を作る"""
+        labels = labels if labels is not None else LabelTable()
+        tokens = sentence['tokens']
+        token_fields = tuple(tokens[0].keys()) if tokens else ()
+
+        int_columns = {
+            field: array('i', (token[field] for token in tokens))
+            for field in TOKEN_INT_FIELDS if field in token_fields or not tokens
+        }
+        label_columns = {
+            field: array('i', (labels.add(token[field]) for token in tokens))
+            for field in token_fields
+            if field not in TOKEN_INT_FIELDS and field not in TOKEN_DERIVED_FIELDS
+        }
+
+        chunks = sentence['chunks']
+        chunk_columns = {
+            'type': array('i', (labels.add(chunk['type']) for chunk in chunks)),
+            'text': array('i', (labels.add(chunk['text']) for chunk in chunks)),
+            'start_id': array('i', (chunk['start_id'] for chunk in chunks)),
+            'end_id': array('i', (chunk['end_id'] for chunk in chunks)),
+        }
+        extra = {key: value for key, value in sentence.items()
+                 if key not in ('tokens', 'chunks', 'chunk_hierarchy', 'chunk_index')}
+        return cls(labels, token_fields, label_columns, int_columns, chunk_columns, extra, translator)
+
+    def to_record(self):
+        """JSONL に書き出すための列指向の辞書 (文字列はラベル表のIDで表し、ラベル表は別に書き出す)"""
+        record = dict(self.extra)
+        record['tokens'] = {
+            'fields': list(self.token_fields),
+            **{field: column.tolist() for field, column in self.int_columns.items()},
+            **{field: column.tolist() for field, column in self.label_columns.items()},
+        }
+        record['chunks'] = {field: column.tolist() for field, column in self.chunk_columns.items()}
+        return record
+
+    @classmethod
+    def from_record(cls, record, labels, translator=None):
+        """to_record の辞書と、書き出したときのラベル表から CompactSentence を作る"""
+        tokens = record['tokens']
+        token_fields = tuple(tokens['fields'])
+        int_columns = {field: array('i', tokens[field]) for field in TOKEN_INT_FIELDS if field in tokens}
+        label_columns = {
+            field: array('i', tokens[field])
+            for field in token_fields
+            if field not in TOKEN_INT_FIELDS and field not in TOKEN_DERIVED_FIELDS
+        }
+        chunk_columns = {field: array('i', values) for field, values in record['chunks'].items()}
+        extra = {key: value for key, value in record.items() if key not in ('tokens', 'chunks')}
+        return cls(labels, token_fields, label_columns, int_columns, chunk_columns, extra, translator)
+
+    def with_labels(self, labels):
+        """ラベルIDを labels の表のIDに付け替えた CompactSentence を返す (同じ表ならそのまま)"""
+        if labels is self.labels:
+            return self
+
+        def remap(column):
+            return array('i', (labels.add(self.labels.get(label_id)) for label_id in column))
+
+        label_columns = {field: remap(column) for field, column in self.label_columns.items()}
+        chunk_columns = dict(self.chunk_columns,
+                             type=remap(self.chunk_columns['type']), text=remap(self.chunk_columns['text']))
+        return CompactSentence(labels, self.token_fields, label_columns, self.int_columns,
+                               chunk_columns, self.extra, self.translator)
+
+    def to_bytes(self, include_labels=True):
+        """バイナリ形式に変換する
+
+        include_labels=True の場合は、この文が使う文字列だけのラベル表を含めるため単体で
+        from_bytes に渡せる。False の場合はラベル表を含めず、IDは self.labels のものになる
+        (write_results_file のように表を別に書き出すとき用)。
+
+        レイアウト (4バイト境界に揃え、整数はリトルエンディアンの int32):
+        ヘッダー, [ラベル表], トークンのフィールド名, extra (JSON),
+        整数の列 (TOKEN_INT_FIELDS の順), ラベルの列 (フィールドの順),
+        チャンクの (type, start_id, end_id) の3つ組, チャンクの text
+        """
+        sentence = self.with_labels(LabelTable()) if include_labels else self
+        n_tokens = len(sentence.int_columns['id'])
+        n_chunks = len(sentence.chunk_columns['type'])
+        parts = [SENTENCE_HEADER.pack(SENTENCE_MAGIC, HAS_LABELS if include_labels else 0,
+                                      len(sentence.token_fields), n_tokens, n_chunks)]
+        if include_labels:
+            parts.append(_pack_strings(sentence.labels.strings))
+        parts.append(_pack_strings(sentence.token_fields))
+        parts.append(_pack_strings([json.dumps(sentence.extra, ensure_ascii=False)]))
+        for field in TOKEN_INT_FIELDS:
+            if field in sentence.int_columns:
+                parts.append(_int32_bytes(sentence.int_columns[field]))
+        for field in sentence.token_fields:
+            if field in sentence.label_columns:
+                parts.append(_int32_bytes(sentence.label_columns[field]))
+        chunks = sentence.chunk_columns
+        triples = array('i', bytes(12 * n_chunks))
+        triples[0::3] = array('i', chunks['type'])
+        triples[1::3] = array('i', chunks['start_id'])
+        triples[2::3] = array('i', chunks['end_id'])
+        parts.append(_int32_bytes(triples))
+        parts.append(_int32_bytes(chunks['text']))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data, labels=None, translator=None):
+        """to_bytes のバイト列 (bytes / memoryview / mmap など) から CompactSentence を作る
+
+        列はコピーせず、data を指す memoryview のまま保持する (ビッグエンディアンの環境では
+        コピーして変換する)。data はこの文を使い終わるまで変更・解放しないこと。
+        ラベル表を含まないバイト列には、書き出したときの labels を渡す。
+        """
+        buffer = data if isinstance(data, memoryview) else memoryview(data)
+        buffer = buffer.cast('B') if buffer.format != 'B' else buffer
+        magic, flags, n_fields, n_tokens, n_chunks = SENTENCE_HEADER.unpack_from(buffer)
+        if magic != SENTENCE_MAGIC:
+            raise ValueError(f"CompactSentence のバイト列ではありません (magic={bytes(magic)!r})")
+        offset = SENTENCE_HEADER.size
+        if flags & HAS_LABELS:
+            strings, offset = _unpack_strings(buffer, offset)
+            labels = LabelTable(strings)
+        elif labels is None:
+            raise ValueError("ラベル表を含まないバイト列には labels を渡してください")
+        token_fields, offset = _unpack_strings(buffer, offset)
+        token_fields = tuple(token_fields)
+        (extra,), offset = _unpack_strings(buffer, offset)
+
+        def take(count):
+            nonlocal offset
+            column = _int32_view(buffer[offset:offset + 4 * count])
+            offset += 4 * count
+            return column
+
+        int_columns = {field: take(n_tokens) for field in TOKEN_INT_FIELDS if field in token_fields or not n_tokens}
+        label_columns = {
+            field: take(n_tokens)
+            for field in token_fields
+            if field not in TOKEN_INT_FIELDS and field not in TOKEN_DERIVED_FIELDS
+        }
+        triples = take(3 * n_chunks)
+        chunk_columns = {
+            'type': triples[0::3],
+            'start_id': triples[1::3],
+            'end_id': triples[2::3],
+            'text': take(n_chunks),
+        }
+        return cls(labels, token_fields, label_columns, int_columns, chunk_columns, json.loads(extra), translator)
+
+    def _token_value(self, index, key):
+        if key in self.int_columns:
+            return self.int_columns[key][index]
+        if key in self.label_columns:
+            return self.labels.get(self.label_columns[key][index])
+        if key not in self.token_fields:
+            if self.translator is not None and key in JAPANESE_FIELDS:
+                return self.translator.translate_label(key, TokenView(self, index))
+            raise KeyError(key)
+        if key == 'children_ids':
+            if self._children is None:
+                self._children = {}
+                for child_id, head_id in zip(self.int_columns['id'], self.int_columns['head_id']):
+                    if child_id != head_id:
+                        self._children.setdefault(head_id, []).append(child_id)
+            return list(self._children.get(self.int_columns['id'][index], []))
+        if key == 'is_root':
+            return self._token_value(index, 'dep') == "ROOT"
+        if key == 'is_entity_part':
+            return bool(self._token_value(index, 'ent_type'))
+        raise KeyError(key)
+
+    def _chunks(self):
+        columns = self.chunk_columns
+        return [
+            {
+                'type': self.labels.get(columns['type'][i]),
+                'text': self.labels.get(columns['text'][i]),
+                'start_id': columns['start_id'][i],
+                'end_id': columns['end_id'][i],
+            }
+            for i in range(len(columns['type']))
+        ]
+
+    def __getitem__(self, key):
+        if key == 'tokens':
+            return TokenColumns(self)
+        if key == 'chunks':
+            return self._chunks()
+        if key == 'chunk_hierarchy':
+            if self._chunk_hierarchy is None:
+                self._chunk_hierarchy = build_chunk_hierarchy(self._chunks())
+            return self._chunk_hierarchy
+        if key == 'chunk_index':
+            if self._chunk_index is None:
+                self._chunk_index = build_chunk_index(self._chunks(), self['chunk_hierarchy'])
+            return self._chunk_index
+        return self.extra[key]
+
+    def __iter__(self):
+        yield from self.extra
+        yield from ('tokens', 'chunks', 'chunk_hierarchy', 'chunk_index')
+
+    def __len__(self):
+        return len(self.extra) + 4
+
+    def to_dict(self):
+        """従来と同じ辞書形式 (JSONに変換可能) に戻す"""
+        result = dict(self.extra)
+        result['tokens'] = [dict(token) for token in self['tokens']]
+        result['chunks'] = self._chunks()
+        result['chunk_hierarchy'] = build_chunk_hierarchy(result['chunks'])
+        result['chunk_index'] = build_chunk_index(result['chunks'], result['chunk_hierarchy'])
+        return result
+
+    def nbytes(self, include_labels=True):
+        """この文が使用するおおよそのメモリ量 (バイト)"""
+        columns = [*self.int_columns.values(), *self.label_columns.values(), *self.chunk_columns.values()]
+        size = sys.getsizeof(self) + sum(sys.getsizeof(column) for column in columns)
+        size += deep_sizeof(self.extra)
+        if include_labels:
+            size += self.labels.nbytes()
+        return size
+
+
+def compact_results(results, labels=None, translator=None):
+    """文ごとの解析結果のリストを、ラベル表を共有する CompactSentence のリストに変換する"""
+    labels = labels if labels is not None else LabelTable()
+    return [CompactSentence.from_dict(sentence, labels, translator) for sentence in results]
+
+
+def batch_records(documents, granularity="sentence"):
+    """(文書ID, 解析結果, エラー) の列を、JSONL に書き出すレコードのリストにする
+
+    バッチ内の単語やラベルなどの文字列は1つのラベル表にまとめ、先頭のレコード
+    {"vocab": [...]} としてバッチごとに一度だけ書き出す。続くレコードの文は
+    CompactSentence.to_record の形式 (文字列はラベル表のID)。
+    """
+    labels = LabelTable()
+    records = []
+    for doc_id, result, error in documents:
+        if error is not None:
+            records.append({"doc_id": doc_id, "error": error})
+            continue
+        sentences = [CompactSentence.from_dict(sentence, labels).to_record() for sentence in result]
+        if granularity == "document":
+            records.append({"doc_id": doc_id, "sentences": sentences})
+        else:
+            records.extend({"doc_id": doc_id, "sentence_index": i, **sentence} for i, sentence in enumerate(sentences))
+    return [{"vocab": labels.strings}, *records]
+
+
+def iter_compact_records(lines, translator=None):
+    """batch_records で書き出した JSONL の行を読み、文を CompactSentence にして返すジェネレータ
+
+    文単位のレコードは CompactSentence (doc_id と sentence_index も参照できる)、文書単位の
+    レコードは sentences を CompactSentence のリストにした辞書、エラーのレコードはそのまま返す。
+    同じバッチの文は直前の {"vocab": [...]} のラベル表を共有する。
+    """
+    labels = None
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if "vocab" in record:
+            labels = LabelTable(record["vocab"])
+        elif "error" in record:
+            yield record
+        elif "sentences" in record:
+            yield dict(record, sentences=[
+                CompactSentence.from_record(sentence, labels, translator) for sentence in record["sentences"]])
+        else:
+            yield CompactSentence.from_record(record, labels, translator)
+
+
+def _pad(size):
+    return b'\0' * (-size % 4)
+
+
+def _pack_strings(strings):
+    """文字列のリストを、件数・各文字列のバイト数 (uint32) と UTF-8 の本体にする (4バイト境界まで埋める)"""
+    encoded = [value.encode('utf-8') for value in strings]
+    body = b''.join(encoded)
+    packed = struct.pack(f'<{len(encoded) + 1}I', len(encoded), *map(len, encoded)) + body
+    return packed + _pad(len(packed))
+
+
+def _unpack_strings(buffer, offset):
+    """_pack_strings の文字列のリストと、その次の位置を返す"""
+    (count,) = struct.unpack_from('<I', buffer, offset)
+    offset += 4
+    lengths = struct.unpack_from(f'<{count}I', buffer, offset)
+    offset += 4 * count
+    strings = []
+    for length in lengths:
+        strings.append(str(buffer[offset:offset + length], 'utf-8'))
+        offset += length
+    return strings, offset + (-offset % 4)
+
+
+def _int32_bytes(column):
+    if NATIVE_LITTLE_ENDIAN:
+        return column.tobytes() if isinstance(column, (array, memoryview)) else array('i', column).tobytes()
+    column = array('i', column)
+    column.byteswap()
+    return column.tobytes()
+
+
+def _int32_view(buffer):
+    """リトルエンディアンの int32 の並びを、コピーせずに整数のシーケンスとして参照する"""
+    if NATIVE_LITTLE_ENDIAN:
+        return buffer.cast('i')
+    column = array('i', bytes(buffer))
+    column.byteswap()
+    return column
+
+
+def write_results_file(fp, sentences):
+    """文の解析結果 (辞書または CompactSentence) をバイナリ形式でファイルに書き出し、文の数を返す
+
+    fp はバイナリモードで開いたファイル。文は先頭から順に to_bytes(include_labels=False) の
+    形式で並べ、そのあとに全体で共有するラベル表、各文の開始位置の索引 (uint64)、
+    FILE_FOOTER を書く。索引とラベル表が末尾にあるため、文は生成しながら書き出せる。
+    """
+    labels = LabelTable()
+    offsets = []
+    position = 0
+    for sentence in sentences:
+        if isinstance(sentence, CompactSentence):
+            sentence = sentence.with_labels(labels)
+        else:
+            sentence = CompactSentence.from_dict(sentence, labels)
+        blob = sentence.to_bytes(include_labels=False)
+        offsets.append(position)
+        fp.write(blob)  # to_bytes の長さは常に4の倍数
+        position += len(blob)
+    labels_offset = position
+    table = _pack_strings(labels.strings)
+    fp.write(table)
+    index_offset = labels_offset + len(table)
+    fp.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+    fp.write(FILE_FOOTER.pack(labels_offset, index_offset, len(offsets), FILE_MAGIC))
+    return len(offsets)
+
+
+def _read_footer(buffer):
+    """ファイルの末尾の FILE_FOOTER から (ラベル表の位置, 索引の位置, 文の数) を読む"""
+    if len(buffer) < FILE_FOOTER.size:
+        raise ValueError("解析結果のファイルではありません (短すぎます)")
+    labels_offset, index_offset, count, magic = FILE_FOOTER.unpack_from(buffer, len(buffer) - FILE_FOOTER.size)
+    if magic != FILE_MAGIC:
+        raise ValueError(f"解析結果のファイルではありません (magic={magic!r})")
+    return labels_offset, index_offset, count
+
+
+class ResultsFile(Sequence):
+    """write_results_file で書き出したファイルを、必要な文だけ復元しながら読む
+
+    バッファ (bytes / mmap など) を memoryview で参照し、results[i] はその文だけを
+    CompactSentence にする。列はバッファを直接指すため、open で mmap したファイルは
+    大きくても読み込んだ文のページしかメモリに載らない。close したあとも、それまでに
+    取り出した CompactSentence は使える (mmap はそれらがすべて解放されたときに解放される)。
+
+        with ResultsFile.open("results.bin") as results:
+            sentence = results[12345]
+        print(sentence['tokens'][0]['text'])
+    """
+
+    def __init__(self, buffer, translator=None):
+        self.translator = translator
+        self._mmap = None
+        self._buffer = memoryview(buffer).cast('B')
+        try:
+            labels_offset, index_offset, count = _read_footer(self._buffer)
+        except ValueError:
+            self._buffer.release()  # 呼び出し側が mmap を閉じられるように
+            raise
+        self._labels_offset = labels_offset
+        self._offsets = self._buffer[index_offset:index_offset + 8 * count]
+        self._count = count
+        self._labels = None
+
+    @classmethod
+    def open(cls, path, translator=None):
+        """ファイルを読み取り専用で mmap して開く"""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            results = cls(mapped, translator)
+        except Exception:
+            mapped.close()
+            raise
+        results._mmap = mapped
+        return results
+
+    @property
+    def labels(self):
+        """ファイル全体のラベル表 (最初に文を取り出すときに一度だけ読む)"""
+        if self._labels is None:
+            strings, _ = _unpack_strings(self._buffer, self._labels_offset)
+            self._labels = LabelTable(strings)
+        return self._labels
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        if self._buffer is None:
+            raise ValueError("閉じたファイルからは読めません")
+        (offset,) = struct.unpack_from('<Q', self._offsets, 8 * index)
+        return CompactSentence.from_bytes(self._buffer[offset:self._labels_offset], self.labels, self.translator)
+
+    def close(self):
+        """ファイルを閉じる
+
+        取り出した CompactSentence がまだ mmap を参照している場合は、その場では閉じず、
+        最後の文が解放されたときに mmap が解放される。
+        """
+        if self._buffer is None:
+            return
+        self._offsets.release()
+        self._buffer.release()
+        self._offsets = self._buffer = None
+        mapped, self._mmap = self._mmap, None
+        if mapped is not None:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # 文の列が mmap を参照している。参照がなくなれば mmap ごと解放される
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def deep_sizeof(obj, seen=None):
+    """辞書/リストをたどって、含まれるオブジェクトを含めたメモリ量を求める"""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def memory_report(results, compact=None):
+    """辞書のリストとコンパクト形式のメモリ使用量を比較する"""
+    compact = compact if compact is not None else compact_results(results)
+    dict_bytes = deep_sizeof(results)
+    labels = {id(sentence.labels): sentence.labels for sentence in compact}
+    compact_bytes = (sys.getsizeof(compact)
+                     + sum(sentence.nbytes(include_labels=False) for sentence in compact)
+                     + sum(table.nbytes() for table in labels.values()))
+    return {
+        'dict_bytes': dict_bytes,
+        'compact_bytes': compact_bytes,
+        'ratio': compact_bytes / dict_bytes if dict_bytes else 0.0,
+    }
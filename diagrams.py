@@ -0,0 +1,289 @@
+"""解析結果から依存関係ツリー・句構造ツリーの図のソース (Graphviz の DOT / Mermaid) を作る
+
+Streamlit に依存しないため、アプリ以外 (テストやベンチマーク) からも呼び出せる。
+tokens_info / chunks_info は SentenceAnalyzer.analyze_text が返す文ごとの結果の
+'tokens' / 'chunks' (CompactSentence の列でもよい)。
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_COLORS = {
+    'NP': '#ADD8E6', # LightBlue
+    'VP': '#DDA0DD', # Plum
+    'PP': '#90EE90', # LightGreen
+    'ADVP': '#FFB6C1' # LightPink
+}
+
+
+def get_chunk_color(chunk_type):
+    return CHUNK_COLORS.get(chunk_type, '#808080') # Default to grey if not found
+
+
+def token_table(tokens_info):
+    """トークンIDからトークンを引く辞書を作る"""
+    return {token['id']: token for token in tokens_info}
+
+
+# --- 依存関係ツリー ---
+def build_dependency_dot(tokens_info):
+    """依存関係ツリーのGraphviz (DOT) のソースを作る"""
+    import graphviz  # DOT の図を作るときまで import しない (起動を速くするため)
+    graph = graphviz.Digraph(comment='Dependency Tree', format='svg')
+    graph.attr(rankdir='LR', overlap='false', compound='true')
+
+    # ノードの追加
+    root_token = None
+    nsubj_token = None
+    other_tokens = []
+
+    for token in tokens_info:
+        if token['is_root']:
+            root_token = token
+        elif token['dep'] == 'nsubj':
+            nsubj_token = token
+        else:
+            other_tokens.append(token)
+
+    with graph.subgraph(name='cluster_main_nodes') as c:
+        c.attr(rank='same') # ROOTとnsubjを同じランクに配置
+
+        # nsubjノードを先に配置 (左側)
+        if nsubj_token:
+            node_label = f"{nsubj_token['text']} ({nsubj_token['pos_japanese']})"
+            c.node(str(nsubj_token['id']), node_label, style='filled', fillcolor='salmon', shape='box')
+
+        # ROOTノードを次に配置 (右側)
+        if root_token:
+            node_label = f"{root_token['text']} ({root_token['pos_japanese']})"
+            c.node(str(root_token['id']), node_label, style='filled', fillcolor='salmon', shape='box')
+
+        # nsubjとROOTの間に不可視の順序付けエッジを追加
+        if nsubj_token and root_token:
+            # このエッジが左右の順序を強制する
+            graph.edge(str(nsubj_token['id']), str(root_token['id']), style='invis', constraint='true')
+
+    # その他のノードを追加
+    for token in other_tokens:
+        node_label = f"{token['text']} ({token['pos_japanese']})"
+        node_fillcolor = 'lightblue' # その他のノードはlightblue
+        graph.node(str(token['id']), node_label, style='filled', fillcolor=node_fillcolor, shape='box')
+
+    # エッジの追加 (親トークンはIDで引く)
+    tokens_by_id = token_table(tokens_info)
+    for token in tokens_info:
+        if not token['is_root']:
+            head_token = tokens_by_id.get(token['head_id'])
+            if head_token:
+                edge_color = 'salmon' if token['dep'] == 'nsubj' else ('red' if token['dep'] == 'dobj' else 'black')
+                edge_penwidth = '2' if token['dep'] in ['nsubj', 'dobj'] else '1'
+                # 日本語の依存関係ラベルを使用
+                edge_label = token['dep_japanese']
+                edge_dir = 'forward' # Default direction
+                if token['dep'] == 'nsubj':
+                    edge_dir = 'both'
+                elif token['dep'] in ['det', 'amod'] and head_token and head_token['dep'] == 'nsubj': # head_tokenがnsubjの場合
+                    edge_dir = 'back'
+                graph.edge(str(token['head_id']), str(token['id']), label=edge_label, color=edge_color, penwidth=edge_penwidth, dir=edge_dir)
+    return graph.source
+
+
+def build_dependency_mermaid(tokens_info):
+    """依存関係ツリーのMermaidのソースを作る"""
+    mermaid_code = "graph LR\n" # Left-Right direction for dependency tree
+
+    # ノードの追加
+    root_token = None
+    nsubj_token = None
+    other_tokens = []
+
+    for token in tokens_info:
+        if token['is_root']:
+            root_token = token
+        elif token['dep'] == 'nsubj':
+            nsubj_token = token
+        else:
+            other_tokens.append(token)
+
+    # ROOTとnsubjを強調
+    if nsubj_token:
+        mermaid_code += f"    {nsubj_token['id']}[\"{nsubj_token['text']}<br>({nsubj_token['pos_japanese']})\"]:::main_node\n"
+    if root_token:
+        mermaid_code += f"    {root_token['id']}[\"{root_token['text']}<br>({root_token['pos_japanese']})\"]:::main_node\n"
+
+    # その他のノード
+    for token in other_tokens:
+        mermaid_code += f"    {token['id']}[\"{token['text']}<br>({token['pos_japanese']})\"]:::other_node\n"
+
+    # nsubjとROOTの順序を強制
+    if nsubj_token and root_token:
+        mermaid_code += f"    {nsubj_token['id']} --- {root_token['id']}\n"
+
+    # エッジの追加 (親トークンはIDで引く)
+    tokens_by_id = token_table(tokens_info)
+    for token in tokens_info:
+        if not token['is_root']:
+            head_token = tokens_by_id.get(token['head_id'])
+            if head_token:
+                edge_label = token['dep_japanese']
+                mermaid_code += f"    {head_token['id']} -- {edge_label} --> {token['id']}\n"
+
+    # スタイル定義
+    mermaid_code += "    classDef main_node fill:#salmon,stroke:#333,stroke-width:2px;\n"
+    mermaid_code += "    classDef other_node fill:#lightblue,stroke:#333,stroke-width:1px;\n"
+    return mermaid_code
+
+
+# --- 句構造ツリー ---
+def find_enclosing_chunk(token_id, chunk_type, chunk_dict, parent_map, innermost):
+    """トークンを含む指定の種類のチャンクを、最も内側のチャンクから親へたどって探す"""
+    chunk_id = innermost.get(token_id)
+    while chunk_id is not None and chunk_dict[chunk_id]['type'] != chunk_type:
+        chunk_id = parent_map[chunk_id]
+    return chunk_id
+
+
+def find_main_phrases(tokens_info, chunk_dict, parent_map, innermost):
+    """主語のNPと、ROOTトークンを含むVPのチャンクIDを返す"""
+    subject_np_id = None
+    root_token_id = None
+    for token in tokens_info:
+        if token['is_root'] and root_token_id is None:
+            root_token_id = token['id']
+        if token['dep'] == 'nsubj' and subject_np_id is None:
+            subject_np_id = find_enclosing_chunk(token['id'], 'NP', chunk_dict, parent_map, innermost)
+        if root_token_id is not None and subject_np_id:
+            break
+    root_vp_id = None
+    if root_token_id is not None:
+        root_vp_id = find_enclosing_chunk(root_token_id, 'VP', chunk_dict, parent_map, innermost)
+    return subject_np_id, root_vp_id
+
+
+def group_tokens_by_chunk(tokens_info, innermost):
+    """チャンクID -> 子チャンクに含まれない (そのチャンクが最も内側となる) トークンのリスト"""
+    own_tokens = {}
+    for token in tokens_info:
+        chunk_id = innermost.get(token['id'])
+        if chunk_id is not None:
+            own_tokens.setdefault(chunk_id, []).append(token)
+    return own_tokens
+
+
+def build_chunk_tree_dot(tokens_info, chunks_info, chunk_hierarchy, chunk_index):
+    """句構造ツリーのGraphviz (DOT) のソースを作る"""
+    import graphviz
+    graph = graphviz.Digraph(comment='Chunk Tree', format='svg')
+    graph.attr(rankdir='TB', overlap='false', compound='true') # 上から下へのレイアウト
+    chunk_dict = {f"{c['type']}_{c['start_id']}_{c['end_id']}": c for c in chunks_info}
+    parent_map = {chunk_id: info['parent'] for chunk_id, info in chunk_hierarchy.items()}
+
+    # --- レイアウトのための主要な句の特定 ---
+    # トークンを含むチャンクは解析器が作成した索引 (トークン -> 最も内側のチャンク) から親へたどる
+    innermost = chunk_index['innermost']
+    subject_np_id, root_vp_id = find_main_phrases(tokens_info, chunk_dict, parent_map, innermost)
+
+    logger.debug("subject_np_id: %s, root_vp_id: %s", subject_np_id, root_vp_id)
+
+    # ノードを追加
+    for chunk_id, chunk in chunk_dict.items():
+        color = get_chunk_color(chunk['type'])
+        # heightとfixedsize='true'を追加
+        graph.node(chunk_id, f"{chunk['type']}\n({chunk['text']})", style='filled', fillcolor=color, shape='box', height='0.8', width='1.5', fixedsize='true')
+
+    # 単語ノードを追加 (どのチャンクにも属さないもの)
+    for token in tokens_info:
+        if token['id'] not in innermost:
+            graph.node(str(token['id']), token['text'], shape='plaintext')
+
+    # --- トップレベルのチャンクのグループ化と順序付け ---
+    # Sノードを追加
+    graph.node("S", "S (Sentence)", shape='ellipse', style='filled', fillcolor='lightgoldenrod', rank='min')
+
+    # 主要なNPとVPを同じグループに配置
+    if subject_np_id and root_vp_id:
+        # NPとVPを同じランクに配置するためのサブグラフ
+        with graph.subgraph(name='cluster_np_vp') as c:
+            c.attr(rank='same')
+            c.node(subject_np_id, group='main_np_vp')
+            c.node(root_vp_id, group='main_np_vp')
+            # NPとVPの間に不可視のエッジを追加して順序を強制
+            c.edge(subject_np_id, root_vp_id, style='invis', constraint='true')
+
+        # SからNPへのエッジ (VPはNPに続くため、NPにのみ接続)
+        graph.edge("S", subject_np_id)
+    elif subject_np_id:
+        graph.edge("S", subject_np_id)
+    elif root_vp_id:
+        graph.edge("S", root_vp_id)
+
+    # その他のトップレベルチャンク
+    for chunk_id, parent_id in parent_map.items():
+        if parent_id is None and chunk_id != subject_np_id and chunk_id != root_vp_id:
+            graph.edge("S", chunk_id)
+
+    # エッジを追加 (既存のロジック)
+    for chunk_id, parent_id in parent_map.items():
+        if parent_id:
+            graph.edge(parent_id, chunk_id)
+        # Sノードへの接続は上記で処理済みなので、ここではスキップ
+    
+    # チャンクと単語のエッジを追加 (子チャンクに含まれない単語だけを直接つなぐ)
+    own_tokens = group_tokens_by_chunk(tokens_info, innermost)
+    for chunk_id in chunk_dict:
+        for token in own_tokens.get(chunk_id, ()):
+            graph.node(str(token['id']), token['text'], shape='plaintext')
+            graph.edge(chunk_id, str(token['id']))
+    return graph.source
+
+
+def build_chunk_tree_mermaid(tokens_info, chunks_info, chunk_hierarchy, chunk_index):
+    """句構造ツリーのMermaidのソースを作る"""
+    mermaid_code = "graph TD\n" # Top-Down direction for overall tree
+    chunk_dict = {f"{c['type']}_{c['start_id']}_{c['end_id']}": c for c in chunks_info}
+    parent_map = {chunk_id: info['parent'] for chunk_id, info in chunk_hierarchy.items()}
+
+    # --- レイアウトのための主要な句の特定 (Graphviz版と共通) ---
+    innermost = chunk_index['innermost']
+    subject_np_id, root_vp_id = find_main_phrases(tokens_info, chunk_dict, parent_map, innermost)
+
+    # Sノードの定義
+    mermaid_code += "    S((Sentence))\n"
+
+    # NPとVPの水平配置を試みるサブグラフ
+    if subject_np_id and root_vp_id:
+        mermaid_code += "    subgraph MainPhrases\n"
+        mermaid_code += "        direction LR\n" # Left-Right direction for this subgraph
+        mermaid_code += f"        {subject_np_id}[\"{chunk_dict[subject_np_id]['type']}<br>{chunk_dict[subject_np_id]['text']}\"]\n"
+        mermaid_code += f"        {root_vp_id}[\"{chunk_dict[root_vp_id]['type']}<br>{chunk_dict[root_vp_id]['text']}\"]\n"
+        mermaid_code += f"        {subject_np_id} --- {root_vp_id}\n" # NPからVPへの不可視エッジで順序を強制
+        mermaid_code += "    end\n"
+        mermaid_code += f"    S --> MainPhrases\n"
+    elif subject_np_id:
+        mermaid_code += f"    {subject_np_id}[\"{chunk_dict[subject_np_id]['type']}<br>{chunk_dict[subject_np_id]['text']}\"]\n"
+        mermaid_code += f"    S --> {subject_np_id}\n"
+    elif root_vp_id:
+        mermaid_code += f"    {root_vp_id}[\"{chunk_dict[root_vp_id]['type']}<br>{chunk_dict[root_vp_id]['text']}\"]\n"
+        mermaid_code += f"    S --> {root_vp_id}\n"
+
+    # その他のチャンクノードとエッジ
+    for chunk_id, chunk in chunk_dict.items():
+        if chunk_id != subject_np_id and chunk_id != root_vp_id:
+            mermaid_code += f"    {chunk_id}[\"{chunk['type']}<br>{chunk['text']}\"]\n"
+            if parent_map[chunk_id] is None: # Top-level chunk not NP/VP
+                mermaid_code += f"    S --> {chunk_id}\n"
+
+    # 親子関係のエッジ
+    for chunk_id, parent_id in parent_map.items():
+        if parent_id and (chunk_id != subject_np_id and chunk_id != root_vp_id): # Avoid re-adding S->NP/VP edges
+            mermaid_code += f"    {parent_id} --> {chunk_id}\n"
+
+    # チャンクと単語のエッジ
+    own_tokens = group_tokens_by_chunk(tokens_info, innermost)
+    for chunk_id in chunk_dict:
+        for token in own_tokens.get(chunk_id, ()):
+            # MermaidノードIDは数字から始まることができないため、プレフィックスを追加
+            token_node_id = f"token_{token['id']}"
+            mermaid_code += f"    {token_node_id}[{token['text']}]\n"
+            mermaid_code += f"    {chunk_id} --> {token_node_id}\n"
+    return mermaid_code
@@ -1,74 +1,152 @@
+"""解析結果を主語・動詞・句ごとに色分けした HTML にする
+
+文ごとの解析結果 (SentenceAnalyzer.analyze_text の戻り値) の chunks と tokens から
+強調する範囲 (span) を集め、開始・終了位置を一度だけ並べ替えて走査する。処理量は
+文字数ではなく span の数に比例し、span の間の文字列はまとめて書き出す。
+subjects / noun_phrases などの旧形式のキーに値がある結果もそのまま表示できる。
+"""
+from html import escape
+
+SUBJECT_STYLE = "color:red; font-weight:bold;"
+VERB_STYLE = "color:blue; font-weight:bold;"
+NP_STYLE = "background-color:#ADD8E6; border:1px solid #00CED1; border-radius:3px; padding:0 2px;"
+VP_STYLE = "background-color:#E0FFE0; border:1px solid #32CD32; border-radius:3px; padding:0 2px;"
+PP_STYLE = "background-color:#FFFFE0; border:1px solid #FFD700; border-radius:3px; padding:0 2px;"
+ADVP_STYLE = "background-color:#FFE4E1; border:1px solid #FFB6C1; border-radius:3px; padding:0 2px;"
+
+# 種類 -> (開始タグの前に付ける文字列, span のスタイル, 終了タグの後に付ける文字列)
+# 同じ範囲の span が重なる場合は、この順に外側になる
+SPAN_KINDS = {
+    'NP': ("[名詞句: ", NP_STYLE, "]"),
+    'VP': ("(動詞句: ", VP_STYLE, ")"),
+    'PP': ("{前置詞句: ", PP_STYLE, "}"),
+    'ADVP': ("〈副詞句: ", ADVP_STYLE, "〉"),
+    'subject': ("", SUBJECT_STYLE, ""),
+    'verb': ("", VERB_STYLE, ""),
+}
+SPAN_KIND_ORDER = {kind: i for i, kind in enumerate(SPAN_KINDS)}
+# 種類 -> 開始タグ (前置きつき)、終了タグ (後置きつき)、途中で閉じて開き直すときのタグ
+OPEN_TAGS = {kind: f'{prefix}<span style="{style}">' for kind, (prefix, style, _) in SPAN_KINDS.items()}
+CLOSE_TAGS = {kind: "</span>" + suffix for kind, (_, _, suffix) in SPAN_KINDS.items()}
+REOPEN_TAGS = {kind: f'<span style="{style}">' for kind, (_, style, _) in SPAN_KINDS.items()}
+
+# 旧形式のキー -> span の種類
+LEGACY_KEYS = {
+    'subjects': 'subject',
+    'verbs': 'verb',
+    'noun_phrases': 'NP',
+    'verb_phrases': 'VP',
+    'prepositional_phrases': 'PP',
+}
+SUBJECT_DEPS = frozenset(('nsubj', 'nsubjpass'))
+VERB_POS = frozenset(('VERB', 'AUX'))
+
+
+def _escape_text(text):
+    return escape(text, quote=False)
+
+
+def collect_spans(analyzed_data):
+    """1文の解析結果から (種類, 開始文字位置, 終了文字位置) のリストを作る (位置は文の先頭から)
+
+    旧形式のキーに値があればそれを使い、なければ chunks と tokens から作る。
+    主語は nsubj / nsubjpass のトークン、動詞は文の根となる動詞・助動詞のトークン。
+    """
+    offset = analyzed_data["sent_offset"]
+    if any(analyzed_data.get(key) for key in LEGACY_KEYS):
+        return [
+            (kind, item["start"] - offset, item["end"] - offset)
+            for key, kind in LEGACY_KEYS.items()
+            for item in analyzed_data.get(key) or ()
+        ]
+
+    tokens = analyzed_data.get("tokens") or ()
+    by_id = {token['id']: token for token in tokens}
+    spans = []
+    for chunk in analyzed_data.get("chunks") or ():
+        first, last = by_id.get(chunk['start_id']), by_id.get(chunk['end_id'])
+        if chunk['type'] in SPAN_KINDS and first is not None and last is not None:
+            spans.append((chunk['type'], first['start'] - offset, last['end'] - offset))
+    for token in tokens:
+        if token.get('dep') in SUBJECT_DEPS:
+            spans.append(('subject', token['start'] - offset, token['end'] - offset))
+        elif token.get('is_root') and token.get('pos') in VERB_POS:
+            spans.append(('verb', token['start'] - offset, token['end'] - offset))
+    return spans
+
+
+def format_sentence_html(analyzed_data):
+    """1文の HTML (<p> は含まない) を返す
+
+    span を (開始位置, 長さの降順, 種類) で並べ、外側の span から順に開く。終了位置に
+    達した span はスタックから閉じ、交差する span (入れ子になっていない span) の場合は
+    内側の span をいったん閉じて開き直すので、出力されるタグは常に正しく入れ子になる。
+    """
+    text = analyzed_data["original_text"]
+    text_len = len(text)
+    spans = []
+    for kind, start, end in collect_spans(analyzed_data):
+        start, end = max(0, start), min(text_len, end)
+        if start <= end:
+            spans.append((start, -end, SPAN_KIND_ORDER[kind], kind))
+    spans.sort()
+    spans.append((text_len, 0, 0, None))  # 文末までの文字列と残りの span を閉じるための番兵
+
+    # 特殊文字を含まない文 (ほとんどの英文) は部分文字列ごとのエスケープを省く
+    quote = _escape_text if ('&' in text or '<' in text or '>' in text) else str
+    parts = []
+    stack = []  # 開いている span の (終了位置, 種類)。入れ子になっていれば終了位置は末尾ほど小さい
+    crossing = False  # 入れ子になっていない span を開いたか (開いていなければ次に閉じるのは末尾の span)
+    pos = 0
+    for start, neg_end, _, kind in spans:
+        while stack:
+            close_at = min(stack)[0] if crossing else stack[-1][0]
+            if close_at > start:
+                break
+            if close_at > pos:
+                parts.append(quote(text[pos:close_at]))
+                pos = close_at
+            reopen = []
+            while True:
+                end, open_kind = stack.pop()
+                if end <= close_at:
+                    parts.append(CLOSE_TAGS[open_kind])
+                    break
+                parts.append("</span>")
+                reopen.append((end, open_kind))
+            for end, open_kind in reversed(reopen):
+                parts.append(REOPEN_TAGS[open_kind])
+                stack.append((end, open_kind))
+        if start > pos:
+            parts.append(quote(text[pos:start]))
+            pos = start
+        if kind is not None:
+            parts.append(OPEN_TAGS[kind])
+            if stack and -neg_end > stack[-1][0]:
+                crossing = True
+            stack.append((-neg_end, kind))
+    return "".join(parts)
+
+
 class ResultFormatter:
     def __init__(self, list_of_analyzed_data):
         self.list_of_analyzed_data = list_of_analyzed_data
 
-    def format_html_all(self):
-        full_html = []
+    def iter_html(self):
+        """文ごとに <p> で囲んだ HTML を1文ずつ返すジェネレータ (長い文書を少しずつ書き出す場合に使う)"""
         for analyzed_data in self.list_of_analyzed_data:
-            full_html.append(self._format_single_html(analyzed_data))
+            yield f"<p>{format_sentence_html(analyzed_data)}</p>"
+
+    def write_html(self, fp):
+        """HTML をファイルなどのテキストストリーム fp に書き出し、書き出した文字数を返す"""
+        written = 0
+        for fragment in self.iter_html():
+            written += fp.write(fragment)
+        return written
+
+    def format_html_all(self):
         # Use <p> tags for better separation between sentences
-        return "".join([f"<p>{html}</p>" for html in full_html])
+        return "".join(self.iter_html())
 
     def _format_single_html(self, analyzed_data):
-        original_text = analyzed_data["original_text"]
-        text_len = len(original_text)
-        events_at_pos = [[] for _ in range(text_len + 1)]
-
-        # 文の開始位置をオフセットとして取得
-        offset = analyzed_data["sent_offset"]
-
-        subject_style = "color:red; font-weight:bold;"
-        verb_style = "color:blue; font-weight:bold;"
-        np_style = "background-color:#ADD8E6; border:1px solid #00CED1; border-radius:3px; padding:0 2px;"
-        vp_style = "background-color:#E0FFE0; border:1px solid #32CD32; border-radius:3px; padding:0 2px;"
-        pp_style = "background-color:#FFFFE0; border:1px solid #FFD700; border-radius:3px; padding:0 2px;"
-
-        def add_events(items, open_tag, close_tag, prefix="", suffix=""):
-            for item in items:
-                start_pos = max(0, item["start"] - offset)
-                end_pos = min(text_len, item["end"] - offset)
-                if start_pos <= end_pos:
-                    events_at_pos[start_pos].append((prefix + open_tag, True))
-                    events_at_pos[end_pos].append((close_tag + suffix, False))
-
-        # Add tags for all element types
-        add_events(
-            analyzed_data["subjects"], f"""<span style="{subject_style}">""", "</span>",
-            prefix="", suffix=""
-        )
-        add_events(
-            analyzed_data["verbs"], f"""<span style="{verb_style}">""", "</span>",
-            prefix="", suffix=""
-        )
-        add_events(
-            analyzed_data["noun_phrases"],
-            f"""<span style="{np_style}">""",
-            "</span>",
-            prefix="[名詞句: ", suffix="]"
-        )
-        add_events(
-            analyzed_data["verb_phrases"],
-            f"""<span style="{vp_style}">""",
-            "</span>",
-            prefix="(動詞句: ", suffix=")"
-        )
-        add_events(
-            analyzed_data["prepositional_phrases"],
-            f"""<span style="{pp_style}">""",
-            "</span>",
-            prefix="{前置詞句: ", suffix="}"
-        )
-
-        # Build the formatted HTML string
-        formatted_html = []
-        for i, char in enumerate(original_text):
-            events_at_pos[i].sort(key=lambda x: not x[1])
-            for tag_string, is_opening_tag in events_at_pos[i]:
-                formatted_html.append(tag_string)
-            formatted_html.append(char)
-
-        events_at_pos[text_len].sort(key=lambda x: not x[1])
-        for tag_string, is_opening_tag in events_at_pos[text_len]:
-            formatted_html.append(tag_string)
-
-        return "".join(formatted_html)
\ No newline at end of file
+        return format_sentence_html(analyzed_data)
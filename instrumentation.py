@@ -0,0 +1,107 @@
+import time
+
+
+class _Span:
+    __slots__ = ('_trace', '_name', '_started')
+
+    def __init__(self, trace, name):
+        self._trace = trace
+        self._name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._trace.record(self._name, time.perf_counter() - self._started)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """1回の解析リクエストについて、段階ごとの処理時間を記録する
+
+    with trace.span("parse"): のように計測したい処理を囲む。同じ名前の段階が
+    複数回 (文ごとなど) 実行された場合は合計時間と回数をまとめる。
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.stages = {}  # 段階名 -> [合計秒数, 回数] (最初に記録された順)
+        self.info = {}
+        self._started = time.perf_counter()
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        stage = self.stages.setdefault(name, [0.0, 0])
+        stage[0] += seconds
+        stage[1] += 1
+
+    def annotate(self, key, value):
+        """キャッシュのヒットなど、計測時間以外の情報を記録する"""
+        self.info[key] = value
+
+    def to_dict(self):
+        return {
+            "total_ms": (time.perf_counter() - self._started) * 1000,
+            "stages": {
+                name: {"ms": seconds * 1000, "count": count}
+                for name, (seconds, count) in self.stages.items()
+            },
+            **self.info,
+        }
+
+
+class NullTrace:
+    """計測しない場合に使う何もしない Trace (span は共有の空のコンテキストを返す)"""
+
+    enabled = False
+
+    def span(self, name):
+        return _NULL_SPAN
+
+    def record(self, name, seconds):
+        pass
+
+    def annotate(self, key, value):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+def process_memory(pid="self"):
+    """プロセスのメモリ使用量 (KiB) を /proc/<pid>/smaps_rollup から読む
+
+    uss はそのプロセスだけが使っているページ (Private_Clean + Private_Dirty)、pss は共有ページを
+    共有しているプロセス数で割って足したもの。Linux 以外などで読めない場合は None を返す。
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        return None
+    return {
+        "rss_kib": fields.get("Rss", 0),
+        "pss_kib": fields.get("Pss", 0),
+        "uss_kib": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
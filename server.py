@@ -0,0 +1,336 @@
+"""SentenceAnalyzer を JSON API として提供するHTTPサーバー
+
+    python server.py --port 8000 --workers 4
+
+エンドポイント:
+    POST /analyze        {"text": "...", "trace": false} -> {"sentences": [...], "trace": {...}}
+    POST /analyze/batch  {"texts": ["...", ...]}    -> {"results": [[...], ...], "errors": [...]}
+    GET  /health                                    -> {"status": "ok", "ready": true, ...}
+
+sentences の各要素は SentenceAnalyzer.analyze_text が返す文ごとの辞書と同じ形式。
+trace に true を指定すると、段階ごとの処理時間 (instrumentation.Trace) も返す。
+モデルはワーカープロセスごとに一度だけ読み込み、処理待ちのリクエスト数が
+max_pending を超えた場合は 503 を返す。timeout 秒以内に解析が終わらない場合は 504 を返す。
+まだワーカーに渡っていない解析は取り消すが、実行中の解析は最後まで続き、終わるまでは
+処理待ちの1件として数える (max_pending は実際にワーカーに残っている仕事の数を制限する)。
+サーバーは起動するとすぐに応答を始め、ワーカーはバックグラウンドでモデルを読み込む。読み込みが終わるまで /health は
+503 と {"status": "loading"} を返す (解析のリクエストは読み込みの完了を待って処理する)。
+
+--prefork を指定すると、親プロセスでモデルを一度だけ読み込んで解析を1回通し、
+gc.freeze() してからワーカーを fork する。モデルのページはコピーオンライトで
+全ワーカーに共有されるため、ワーカー数を増やしてもメモリ使用量がほとんど増えない
+(fork が使える OS のみ)。/health はワーカーごとのメモリ使用量 (USS/PSS) も返す。
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from analyzer import ANALYSIS_PROFILES, AnalysisError, SentenceAnalyzer
+from cache import AnalysisCache
+from instrumentation import Trace, process_memory
+from store import AnalysisStore, TieredCache
+from warmup import WARMUP_TEXT, ModelLoader
+
+MAX_BODY_BYTES = 1024 * 1024
+
+# --- ワーカープロセス側 ---
+_worker_analyzer = None
+_worker_timings = {}
+_worker_barrier = None
+
+
+def _init_worker(model_name, profile, store_path=None, store_max_bytes=256 * 1024 * 1024, barrier=None):
+    """ワーカープロセスの起動時に一度だけモデルを読み込む
+
+    store_path を指定すると、解析結果をワーカー間で共有するファイル (store.AnalysisStore) にも
+    保存し、再起動後も再利用する。barrier は _warm_up で全ワーカーの起動を待ち合わせるために使う。
+    """
+    global _worker_analyzer, _worker_timings, _worker_barrier
+    loader = ModelLoader(model_name, profile)
+    _worker_analyzer = SentenceAnalyzer(loader.wait(), cache=AnalysisCache(max_entries=256), profile=profile)
+    _worker_timings = dict(loader.timings)
+    _worker_barrier = barrier
+    _attach_store(store_path, store_max_bytes)
+
+
+def _init_forked_worker(store_path=None, store_max_bytes=256 * 1024 * 1024, barrier=None):
+    """pre-fork モードのワーカーの初期化 (モデルと解析器は親プロセスから引き継いでいる)
+
+    SQLite の接続は fork をまたいで使えないため、ストアはワーカーごとに開く。
+    """
+    global _worker_barrier
+    _worker_barrier = barrier
+    _attach_store(store_path, store_max_bytes)
+
+
+def _attach_store(store_path, store_max_bytes):
+    if store_path:
+        _worker_analyzer.cache = TieredCache(
+            _worker_analyzer.cache, AnalysisStore(store_path, max_bytes=store_max_bytes))
+
+
+def preload(model_name, profile, warmup_text=WARMUP_TEXT):
+    """pre-fork モード: ワーカーを fork する前に、親プロセスでモデルを読み込んでおく
+
+    analyze_text を1回通して初回だけの初期化を済ませたあと、gc.freeze() で読み込み済みの
+    オブジェクトを GC の対象から外す。ワーカーで GC が走ってもそれらのページに書き込まない
+    ため、fork 後も親プロセスと共有されたままになる。
+    """
+    _init_worker(model_name, profile)
+    started = time.perf_counter()
+    _worker_analyzer.analyze_text(warmup_text)
+    _worker_timings["analyzer_warmup"] = time.perf_counter() - started
+    gc.collect()
+    gc.freeze()
+
+
+def _warm_up():
+    """ワーカーの起動 (モデルの読み込みと最初の解析) を済ませ、段階ごとの時間とメモリ使用量を返す
+
+    先に起動したワーカーが複数の _warm_up をまとめて処理しないよう、全ワーカーが
+    _warm_up に入るまでバリアで待つ。これにより1つの _warm_up は1つのワーカーで実行される。
+    """
+    if _worker_barrier is not None:
+        _worker_barrier.wait()
+    return {
+        "pid": os.getpid(),
+        "timings_ms": {name: seconds * 1000 for name, seconds in _worker_timings.items()},
+        "memory": process_memory(),
+    }
+
+
+def _analyze_text(text, with_trace=False):
+    trace = Trace() if with_trace else None
+    result = _worker_analyzer.analyze_text(text, trace=trace)
+    return result, trace.to_dict() if trace is not None else None
+
+
+def _analyze_batch(texts, batch_size):
+    results, errors = [], []
+    for result in _worker_analyzer.analyze_many(texts, batch_size=batch_size, raise_errors=False):
+        if isinstance(result, AnalysisError):
+            errors.append({"index": result.index, "error": str(result.error)})
+            result = None
+        results.append(result)
+    return results, errors
+
+
+# --- サーバー側 ---
+class ServiceBusy(Exception):
+    """処理待ちのリクエストが上限に達している"""
+
+
+class ServiceTimeout(Exception):
+    """解析が timeout 秒以内に終わらなかった"""
+
+
+class AnalysisService:
+    """ワーカープールへの投入と、処理待ちリクエスト数の上限を管理する"""
+
+    def __init__(self, executor, max_pending=64, batch_size=64, timeout=60):
+        self.executor = executor
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.pending = 0
+        self.warmup = []  # ワーカーの起動を待つ Future
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise ServiceBusy()
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # タイムアウトしても仕事はワーカーに残るため、枠は解析が終わった (または取り消した) ときに返す
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()  # まだワーカーに渡っていなければ取り消す
+            raise ServiceTimeout() from None
+
+    def _release(self, future=None):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def warm_up(self, workers):
+        """ワーカーの起動を要求する (完了を待たずに戻る。状況は readiness で確認する)
+
+        ワーカーの初期化に同じ数 (workers) の multiprocessing.Barrier を渡していない場合は、
+        先に起動したワーカーがすべての _warm_up を処理しうるため、readiness は
+        全ワーカーの起動を保証しない。
+        """
+        self.warmup = [self.executor.submit(_warm_up) for _ in range(workers)]
+
+    def readiness(self):
+        """warm_up の要求がすべて終わったかどうかと、起動したワーカーごとの時間を返す
+
+        create_service で作ったサービスでは、ready はすべてのワーカーがモデルの読み込みを
+        終えたことを表す。
+        """
+        done = [future for future in self.warmup if future.done()]
+        workers = [future.result() for future in done if future.exception() is None]
+        errors = [str(future.exception()) for future in done if future.exception() is not None]
+        return {"ready": len(done) == len(self.warmup) and not errors, "workers": workers, "errors": errors}
+
+    def worker_memory(self):
+        """ワーカープロセスごとの現在のメモリ使用量 (instrumentation.process_memory) を返す"""
+        processes = getattr(self.executor, "_processes", None) or {}
+        return [{"pid": pid, **(process_memory(pid) or {})} for pid in sorted(processes)]
+
+    def analyze(self, text, with_trace=False):
+        return self._run(_analyze_text, text, with_trace)
+
+    def analyze_batch(self, texts):
+        return self._run(_analyze_batch, texts, self.batch_size)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    server_version = "SentenceAnalyzer/1.0"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f"リクエストが大きすぎます (上限 {MAX_BODY_BYTES} バイト)")
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": "見つかりません"})
+            return
+        service = self.server.service
+        readiness = service.readiness()
+        if readiness["ready"]:
+            status = "ok"
+        else:
+            status = "error" if readiness["errors"] else "loading"
+        self._send_json(200 if readiness["ready"] else 503, {
+            "status": status, "pending": service.pending, "max_pending": service.max_pending, **readiness,
+            "memory": service.worker_memory()})
+
+    def do_POST(self):
+        service = self.server.service
+        try:
+            payload = self._read_json()
+            if not isinstance(payload, dict):
+                raise ValueError("リクエストの本文は JSON のオブジェクトにしてください")
+            if self.path == "/analyze":
+                text = payload.get("text")
+                if not isinstance(text, str):
+                    raise ValueError("text (文字列) を指定してください")
+                sentences, trace = service.analyze(text, bool(payload.get("trace")))
+                response = {"sentences": sentences}
+                if trace is not None:
+                    response["trace"] = trace
+                self._send_json(200, response)
+            elif self.path == "/analyze/batch":
+                texts = payload.get("texts")
+                if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                    raise ValueError("texts (文字列のリスト) を指定してください")
+                results, errors = service.analyze_batch(texts)
+                self._send_json(200, {"results": results, "errors": errors})
+            else:
+                self._send_json(404, {"error": "見つかりません"})
+        except ServiceBusy:
+            self._send_json(503, {"error": "混雑しています。しばらくしてから再試行してください"})
+        except ServiceTimeout:
+            self._send_json(504, {"error": f"解析が {service.timeout} 秒以内に終わりませんでした"})
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": f"解析中にエラーが発生しました: {e}"})
+
+    def log_message(self, format, *args):
+        pass  # アクセスログは出力しない
+
+
+class AnalysisHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        super().__init__(address, AnalysisRequestHandler)
+        self.service = service
+
+
+def create_service(model_name="en_core_web_sm", profile="full", workers=2, max_pending=64, batch_size=64,
+                   store_path=None, store_max_bytes=256 * 1024 * 1024, prefork=False):
+    """モデルを読み込んだワーカープロセスのプールを持つ AnalysisService を作る
+
+    prefork=True の場合は、この関数の中で親プロセスがモデルを読み込み (preload)、
+    読み込んだモデルを共有するワーカーを fork する。
+    """
+    if prefork:
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise ValueError("pre-fork モードは fork が使える OS でのみ利用できます")
+        preload(model_name, profile)
+        context = multiprocessing.get_context("fork")
+        barrier = context.Barrier(workers)
+        # fork では最初の投入時に全ワーカーがまとめて作られる (下の warm_up で作る)
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_forked_worker,
+                                       initargs=(store_path, store_max_bytes, barrier))
+    else:
+        context = multiprocessing.get_context()
+        barrier = context.Barrier(workers)
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                       initargs=(model_name, profile, store_path, store_max_bytes, barrier))
+    service = AnalysisService(executor, max_pending=max_pending, batch_size=batch_size)
+    service.warm_up(workers)  # 最初のリクエストを待たずにワーカーを起動してモデルを読み込む
+    return service
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SentenceAnalyzer の JSON API サーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2,
+                        help="ワーカープロセス数 (--prefork を指定しない場合は各プロセスがモデルを1つ読み込む)")
+    parser.add_argument("--max-pending", type=int, default=64, help="処理待ちリクエスト数の上限")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--model", default="en_core_web_sm")
+    parser.add_argument("--profile", default="full", choices=list(ANALYSIS_PROFILES))
+    parser.add_argument("--store", help="解析結果を保存する SQLite ファイル (再起動後も再利用する)")
+    parser.add_argument("--store-max-mb", type=int, default=256, help="保存する解析結果の合計サイズの上限 (MB)")
+    parser.add_argument("--prefork", action="store_true",
+                        help="親プロセスでモデルを読み込み、ワーカーを fork してモデルを共有する")
+    args = parser.parse_args(argv)
+
+    service = create_service(args.model, args.profile, args.workers, args.max_pending, args.batch_size,
+                             args.store, args.store_max_mb * 1024 * 1024, args.prefork)
+    server = AnalysisHTTPServer((args.host, args.port), service)
+    print(f"Listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
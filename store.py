@@ -0,0 +1,232 @@
+"""再起動後も解析結果を再利用するための、SQLite を使った永続ストア
+
+AnalysisStore は make_cache_key のキー (整形済みテキストのハッシュとモデル名/バージョンから
+作られる) ごとに解析結果を1行として保存し、合計サイズが max_bytes を超えると最も長く
+使われていない結果から削除する。TieredCache はメモリ上の AnalysisCache の後ろに
+AnalysisStore を置き、起動時に最近使われた結果をメモリに読み込んでおく。どちらも
+get/put を持つので、SentenceAnalyzer の cache にそのまま渡せる。
+
+    cache = TieredCache(AnalysisCache(max_entries=256), AnalysisStore("analysis.sqlite3"))
+    analyzer = SentenceAnalyzer(nlp, cache=cache)
+
+結果は pickle で保存するため、ストアのファイルはこのアプリケーションが作ったもの
+(信頼できるもの) だけを使うこと。
+"""
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+from analyzer import JAPANESE_FIELDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_last_used ON analyses (last_used);
+"""
+
+
+def _plain_token(token):
+    """日本語訳を参照時に求めるトークン (LazyTokenInfo) を、訳を含む通常の辞書にする
+
+    LazyTokenInfo は pickle すると生のラベルだけの辞書になるため、保存前に訳を求めておく。
+    """
+    if type(token) is dict:
+        return token
+    plain = dict(token)
+    for key, source in JAPANESE_FIELDS.items():
+        if key not in plain and source in plain:
+            plain[key] = token[key]
+    return plain
+
+
+def _plain_result(result):
+    if not isinstance(result, list):
+        return result
+    return [
+        dict(sentence, tokens=[_plain_token(token) for token in sentence["tokens"]])
+        if isinstance(sentence, dict) and "tokens" in sentence else sentence
+        for sentence in result
+    ]
+
+
+def encode_value(value):
+    return zlib.compress(pickle.dumps(_plain_result(value), protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+
+def decode_value(blob):
+    return pickle.loads(zlib.decompress(blob))
+
+
+class AnalysisStore:
+    """解析結果をキーごとに SQLite のファイルへ保存する、サイズ上限つきのストア
+
+    複数のスレッドから使えるよう操作はロックで保護し、複数のプロセス (サーバーの
+    ワーカーなど) から同じファイルを開いても良いように WAL モードで開く。合計サイズは
+    書き込みのトランザクションの中で SUM(size) で数え直すため、他のプロセスが書き込んだ
+    分も含めて max_bytes を守る。
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, timeout=5.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._bytes = self._total_bytes()
+
+    def _total_bytes(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM analyses").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM analyses WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM analyses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            with self._conn:
+                self._conn.execute("UPDATE analyses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return decode_value(row[0])
+
+    def put(self, key, value):
+        blob = encode_value(value)
+        if len(blob) > self.max_bytes:
+            return  # 単体で上限を超える結果は保存しない
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO analyses (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, blob, len(blob), time.time()))
+                # INSERT で書き込みロックを取ったまま、他のプロセスが書き込んだ分も含めて数える
+                self._bytes = self._total_bytes()
+                if self._bytes > self.max_bytes:
+                    self._evict()
+
+    def _evict(self):
+        """合計サイズが上限を下回るまで、最も長く使われていない結果から削除する (put のトランザクション内で呼ぶ)"""
+        excess = self._bytes - self.max_bytes
+        victims = []
+        cursor = self._conn.execute("SELECT key, size FROM analyses ORDER BY last_used")
+        for key, size in cursor:
+            victims.append((key,))
+            excess -= size
+            self._bytes -= size
+            if excess <= 0:
+                break
+        cursor.close()
+        self._conn.executemany("DELETE FROM analyses WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def recent(self, limit):
+        """最近使われた順に最大 limit 件の (キー, 解析結果) を返すジェネレータ"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM analyses ORDER BY last_used DESC LIMIT ?", (limit,)).fetchall()
+        for key, blob in rows:
+            yield key, decode_value(blob)
+
+    def clear(self):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM analyses")
+            self._bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self):
+        with self._lock:
+            self._bytes = self._total_bytes()  # 他のプロセスの書き込みも反映する
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class TieredCache:
+    """メモリ上のキャッシュ (memory) と永続ストア (store) を重ねたキャッシュ
+
+    get はメモリから探し、なければストアから読んでメモリにも入れる。put は両方に書く。
+    warm=True の場合は、作成時にストアの最近使われた結果をメモリの上限まで読み込む。
+    """
+
+    def __init__(self, memory, store, warm=True):
+        self.memory = memory
+        self.store = store
+        self.warmed = 0
+        if warm:
+            self.warm()
+
+    def warm(self):
+        """ストアの最近使われた結果をメモリに読み込み、読み込んだ件数を返す"""
+        entries = list(self.store.recent(self.memory.max_entries))
+        for key, value in reversed(entries):  # 最近使われたものほど後に入れ、LRU の末尾に置く
+            self.memory.put(key, value)
+        self.warmed = len(entries)
+        return self.warmed
+
+    def __len__(self):
+        return len(self.memory)
+
+    def __contains__(self, key):
+        return key in self.memory or key in self.store
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        value = self.store.get(key)
+        if value is None:
+            return default
+        self.memory.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        self.store.put(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        self.store.clear()
+
+    def stats(self):
+        """メモリ側の統計に、ストアのヒット数・件数・バイト数と起動時に読み込んだ件数を加える"""
+        stats = self.memory.stats()
+        store_stats = self.store.stats()
+        hits = stats["hits"] + store_stats["hits"]
+        total = stats["hits"] + stats["misses"]
+        stats.update(
+            hits=hits,
+            misses=store_stats["misses"],
+            hit_rate=hits / total if total else 0.0,
+            store_hits=store_stats["hits"],
+            store_entries=store_stats["entries"],
+            store_bytes=store_stats["bytes"],
+            warmed=self.warmed,
+        )
+        return stats
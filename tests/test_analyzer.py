@@ -1,6 +1,9 @@
+import io
+
 import pytest
 import spacy
-from analyzer import SentenceAnalyzer
+from spacy.tokens import Doc
+from analyzer import AnalysisError, SentenceAnalyzer, build_chunk_hierarchy, build_chunk_index, split_long_line
 
 # spaCyモデルをテスト用にロード
 @pytest.fixture(scope="module")
@@ -53,6 +56,32 @@ def test_analyze_multiple_sentences(analyzer):
     assert result[0]["original_text"] == "Hello world."
     assert result[1]["original_text"] == "How are you?"
 
+# --- バッチ解析のテスト ---
+
+def test_analyze_many_matches_analyze_text(analyzer):
+    texts = ["The cat sat on the mat.", "", "1. Hello world. How are you?", "これはテストです。"]
+    results = list(analyzer.analyze_many(texts, batch_size=2))
+    assert results == [analyzer.analyze_text(text) for text in texts]
+
+def test_analyze_many_reports_failing_document(analyzer, monkeypatch):
+    original = analyzer._analyze_sentence
+
+    def failing(sent):
+        if "boom" in sent.text:
+            raise ValueError("boom")
+        return original(sent)
+
+    monkeypatch.setattr(analyzer, "_analyze_sentence", failing)
+    texts = ["The cat sat.", "It went boom.", "She works hard."]
+
+    with pytest.raises(AnalysisError) as excinfo:
+        list(analyzer.analyze_many(texts))
+    assert excinfo.value.index == 1
+
+    results = list(analyzer.analyze_many(texts, raise_errors=False))
+    assert isinstance(results[1], AnalysisError) and results[1].index == 1
+    assert results[2][0]["original_text"] == "She works hard."
+
 # --- 句抽出ロジックのテスト ---
 
 def test_vp_extraction_with_auxiliaries_and_adverb(analyzer):
@@ -77,6 +106,37 @@ def test_pp_extraction_complex_nesting(analyzer):
     assert find_chunk(chunks, 'PP', 'on the table in the corner'), "Largest PP not found."
     assert find_chunk(chunks, 'PP', 'in the corner'), "Subset PP was not removed."
 
+def _legacy_phrase_mask(analyzer, token):
+    if token.pos_ in ('VERB', 'AUX'):
+        tokens = analyzer._get_verb_phrase_tokens(token)
+    elif token.pos_ == 'ADP':
+        tokens = analyzer._get_prepositional_phrase_tokens(token)
+    else:
+        tokens = analyzer._get_adverb_phrase_tokens(token)
+    return sum(1 << (t.i - token.sent.start) for t in tokens)
+
+def test_phrase_masks_match_per_token_expansion(analyzer, nlp_model):
+    doc = nlp_model("I will have been running quickly. He said that she sings and dances very well in the park.")
+    for sent in doc.sents:
+        vp_masks, pp_masks, advp_masks = analyzer._compute_phrase_masks(sent)
+        for token in sent:
+            masks = {'VERB': vp_masks, 'AUX': vp_masks, 'ADP': pp_masks, 'ADV': advp_masks}.get(token.pos_)
+            if masks is not None:
+                assert masks[token.i - sent.start] == _legacy_phrase_mask(analyzer, token), token.text
+
+def test_phrase_masks_share_auxiliary_chain(analyzer):
+    # "I will have been running quickly and jumping ." を依存木ごと組み立てる
+    words = ["I", "will", "have", "been", "running", "quickly", "and", "jumping", "."]
+    heads = [4, 4, 4, 4, 4, 4, 4, 4, 4]
+    deps = ["nsubj", "aux", "aux", "aux", "ROOT", "advmod", "cc", "conj", "punct"]
+    pos = ["PRON", "AUX", "AUX", "AUX", "VERB", "ADV", "CCONJ", "VERB", "PUNCT"]
+    sent = Doc(analyzer.nlp.vocab, words=words, heads=heads, deps=deps, pos=pos)[:]
+    vp_masks, _, _ = analyzer._compute_phrase_masks(sent)
+    expected = sum(1 << i for i in (1, 2, 3, 4, 5, 7))
+    assert vp_masks[1] == vp_masks[4] == expected
+    for i in (1, 4, 7):
+        assert vp_masks[i] == _legacy_phrase_mask(analyzer, sent[i])
+
 def test_vp_with_direct_object(analyzer):
     text = "She is singing a song."
     chunks = analyzer.analyze_text(text)[0]['chunks']
@@ -92,6 +152,100 @@ def test_no_duplicate_chunks(analyzer):
         assert key not in unique_keys, f"Duplicate chunk found: {key}"
         unique_keys.add(key)
 
+def test_chunk_hierarchy_in_result(analyzer):
+    result = analyzer.analyze_text("The book on the table in the corner is mine.")[0]
+    hierarchy = result["chunk_hierarchy"]
+    assert set(hierarchy) == {f"{c['type']}_{c['start_id']}_{c['end_id']}" for c in result["chunks"]}
+    for info in hierarchy.values():
+        parent = info["parent"]
+        assert info["depth"] == (hierarchy[parent]["depth"] + 1 if parent else 0)
+
+# --- 句の包含関係のテスト ---
+
+def _chunk(chunk_type, start_id, end_id):
+    return {"type": chunk_type, "text": "", "start_id": start_id, "end_id": end_id}
+
+def test_build_chunk_hierarchy_nesting():
+    chunks = [_chunk("VP", 1, 8), _chunk("PP", 2, 8), _chunk("NP", 3, 4), _chunk("PP", 5, 8), _chunk("NP", 0, 0)]
+    hierarchy = build_chunk_hierarchy(chunks)
+    assert hierarchy["VP_1_8"] == {"parent": None, "depth": 0, "is_subset": False}
+    assert hierarchy["PP_2_8"] == {"parent": "VP_1_8", "depth": 1, "is_subset": False}
+    assert hierarchy["NP_3_4"] == {"parent": "PP_2_8", "depth": 2, "is_subset": False}
+    assert hierarchy["PP_5_8"] == {"parent": "PP_2_8", "depth": 2, "is_subset": True}
+    assert hierarchy["NP_0_0"]["parent"] is None
+
+def test_build_chunk_index():
+    chunks = [_chunk("NP", 0, 0), _chunk("VP", 1, 8), _chunk("PP", 2, 8), _chunk("NP", 3, 4), _chunk("PP", 5, 8)]
+    index = build_chunk_index(chunks)
+    assert index["children"]["VP_1_8"] == ["PP_2_8"]
+    assert index["children"]["PP_2_8"] == ["NP_3_4", "PP_5_8"]
+    assert index["innermost"] == {
+        0: "NP_0_0", 1: "VP_1_8", 2: "PP_2_8", 3: "NP_3_4", 4: "NP_3_4",
+        5: "PP_5_8", 6: "PP_5_8", 7: "PP_5_8", 8: "PP_5_8",
+    }
+
+def test_build_chunk_index_leaves_uncovered_tokens_out():
+    index = build_chunk_index([_chunk("NP", 0, 1), _chunk("NP", 4, 4)])
+    assert sorted(index["innermost"]) == [0, 1, 4]
+
+def test_build_chunk_hierarchy_crossing_chunks():
+    hierarchy = build_chunk_hierarchy([_chunk("VP", 0, 9), _chunk("VP", 2, 5), _chunk("PP", 4, 7), _chunk("NP", 6, 7)])
+    assert hierarchy["PP_4_7"]["parent"] == "VP_0_9"
+    assert hierarchy["NP_6_7"]["parent"] == "PP_4_7"
+    assert hierarchy["VP_2_5"]["is_subset"] and not hierarchy["PP_4_7"]["is_subset"]
+
+def test_build_chunk_hierarchy_crossing_picks_smallest_container():
+    # NP_3_9 は交差する VP_0_9 と PP_2_12 の両方に含まれる。後に始まる PP_2_12 ではなく短い VP_0_9 が親
+    hierarchy = build_chunk_hierarchy([_chunk("VP", 0, 9), _chunk("PP", 2, 12), _chunk("NP", 3, 9)])
+    assert hierarchy["NP_3_9"] == {"parent": "VP_0_9", "depth": 1, "is_subset": False}
+    assert hierarchy["PP_2_12"]["parent"] is None
+
+def test_remove_subsets_keeps_largest_of_same_type(analyzer):
+    chunks = [_chunk("PP", 2, 8), _chunk("PP", 5, 8), _chunk("NP", 3, 4), _chunk("NP", 3, 4)]
+    kept = analyzer._remove_subsets(chunks)
+    assert [(c["type"], c["start_id"], c["end_id"]) for c in kept] == [("PP", 2, 8), ("NP", 3, 4), ("NP", 3, 4)]
+
+# --- 日本語ラベルの遅延評価のテスト ---
+
+def test_lazy_labels_translate_on_access(nlp_model, analyzer):
+    import json
+    lazy_analyzer = SentenceAnalyzer(nlp_model, lazy_labels=True)
+    text = "Dr. Smith visited Tokyo."
+    lazy_token = lazy_analyzer.analyze_text(text)[0]["tokens"][0]
+    eager_token = analyzer.analyze_text(text)[0]["tokens"][0]
+
+    assert "dep_japanese" not in lazy_token and "dep_japanese" not in json.loads(json.dumps(lazy_token))
+    for key in ("dep_japanese", "pos_japanese", "morph_japanese", "ent_type_japanese"):
+        assert lazy_token[key] == eager_token[key]
+    assert lazy_token.get("dep_japanese") == eager_token["dep_japanese"]
+    assert lazy_token.get("missing", "default") == "default"
+
+def test_morph_translation_is_memoized(analyzer):
+    first = analyzer.get_morph_japanese("Number=Sing|Person=3")
+    assert first == "単数, 三人称"
+    assert analyzer.get_morph_japanese("Number=Sing|Person=3") is first
+
+# --- 解析プロファイルのテスト ---
+
+def test_unknown_profile_is_rejected(nlp_model):
+    with pytest.raises(ValueError):
+        SentenceAnalyzer(nlp_model, profile="everything")
+
+def test_chunks_only_profile_drops_entity_and_lemma_fields(nlp_model):
+    result = SentenceAnalyzer(nlp_model, profile="chunks-only").analyze_text("Dr. Smith visited Tokyo.")[0]
+    token = result["tokens"][0]
+    assert "lemma" not in token and "ent_type" not in token and "entity_text" not in token
+    assert "dep" in token and "head_id" in token
+    assert result["chunks"]
+
+def test_pos_only_profile_skips_parser(nlp_model):
+    result = SentenceAnalyzer(nlp_model, profile="pos-only").analyze_text("Hello world. How are you?")
+    assert [s["original_text"] for s in result] == ["Hello world.", "How are you?"]
+    token = result[0]["tokens"][0]
+    assert "pos" in token and "pos_japanese" in token
+    assert "dep" not in token and "head_id" not in token
+    assert result[0]["chunks"] == []
+
 # --- ヘルパー関数のテスト ---
 
 def test_get_pos_japanese(analyzer):
@@ -103,3 +257,107 @@ def test_get_dep_japanese(analyzer):
     assert analyzer.get_dep_japanese("nsubj") == "名詞主語"
     assert analyzer.get_dep_japanese("dobj") == "直接目的語"
     assert analyzer.get_dep_japanese("UNKNOWN") == "UNKNOWN"
+
+# --- キャッシュのテスト ---
+
+def test_analyze_text_uses_cache(nlp_model, monkeypatch):
+    from cache import AnalysisCache
+    cache = AnalysisCache(max_entries=8)
+    cached_analyzer = SentenceAnalyzer(nlp_model, cache=cache)
+    first = cached_analyzer.analyze_text("The cat sat on the mat.")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("model should not be called on a cache hit")
+
+    monkeypatch.setattr(cached_analyzer, "nlp", fail)
+    assert cached_analyzer.analyze_text("1. The cat sat on the mat.") == first
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+# --- 差分解析のテスト ---
+
+def test_incremental_matches_full_analysis(nlp_model):
+    incremental_analyzer = SentenceAnalyzer(nlp_model)
+    text = "The cat sat on the mat.\n2. He is running quickly in the park. She works very hard."
+    full = incremental_analyzer.analyze_text(text)
+    incremental = incremental_analyzer.analyze_text(text, incremental=True)
+    assert [s["original_text"] for s in incremental] == [s["original_text"] for s in full]
+    for inc_sent, full_sent in zip(incremental, full):
+        assert inc_sent["sent_offset"] == full_sent["sent_offset"]
+        assert [(t["id"], t["start"], t["end"]) for t in inc_sent["tokens"]] == \
+               [(t["id"], t["start"], t["end"]) for t in full_sent["tokens"]]
+
+def test_incremental_reparses_only_edited_sentences(nlp_model):
+    incremental_analyzer = SentenceAnalyzer(nlp_model)
+    incremental_analyzer.analyze_text("The cat sat on the mat. She works very hard.", incremental=True)
+    misses = incremental_analyzer.sentence_cache.stats()["misses"]
+    result = incremental_analyzer.analyze_text("The cat sat on the mat. She works hard.", incremental=True)
+    assert incremental_analyzer.sentence_cache.stats()["misses"] == misses + 1
+    second = result[1]
+    assert second["sent_offset"] == len("The cat sat on the mat. ")
+    assert second["tokens"][0]["id"] == len(result[0]["tokens"])
+
+# --- 計測のテスト ---
+
+def test_analyze_text_records_stage_timings(analyzer, capsys):
+    from instrumentation import Trace
+    trace = Trace()
+    analyzer.analyze_text("The cat sat on the mat. She works very hard.", trace=trace)
+    stages = trace.to_dict()["stages"]
+    assert list(stages) == ["clean", "parse", "tokens", "chunking", "dedup"]
+    assert stages["tokens"]["count"] == 2
+    assert capsys.readouterr().out == ""
+
+# --- ストリーミング解析のテスト ---
+
+def test_analyze_stream_matches_global_offsets(analyzer):
+    text = ("1. The cat sat on the mat.\nShe works very hard.\n\n"
+            "2. He is running quickly in the park.\n\n---\nThe dog barked at the mailman.")
+    full = analyzer.analyze_text(text)
+    # block_chars=1 なので段落ごとに別のブロックとして nlp.pipe に渡される
+    streamed = list(analyzer.analyze_stream(io.StringIO(text), block_chars=1, batch_size=2))
+
+    def positions(sentences):
+        return [(t["id"], t["start"], t["end"], t["text"])
+                for s in sentences for t in s["tokens"] if t["text"].strip()]
+
+    assert [s["original_text"].strip() for s in streamed] == [s["original_text"].strip() for s in full]
+    # ブロック境界の改行トークンを除いた、文の先頭文字の位置で比べる
+    def sent_starts(sentences):
+        return [s["sent_offset"] + len(s["original_text"]) - len(s["original_text"].lstrip())
+                for s in sentences]
+
+    assert sent_starts(streamed) == sent_starts(full)
+    assert positions(streamed) == positions(full)
+    for sent in streamed:
+        ids = {t["id"] for t in sent["tokens"]}
+        assert all(c["start_id"] in ids and c["end_id"] in ids for c in sent["chunks"])
+
+def test_analyze_stream_splits_oversized_paragraph(analyzer, monkeypatch):
+    monkeypatch.setattr(analyzer.nlp, "max_length", 40)
+    lines = ["The cat sat on the mat.", "She works very hard.", "The dog barked loudly."]
+    assert list(analyzer._iter_blocks(lines, block_chars=1000)) == [
+        ("The cat sat on the mat.", "\n"), ("She works very hard.", "\n"), ("The dog barked loudly.", "\n")]
+    monkeypatch.setattr(analyzer.nlp, "max_length", 1000)
+    assert list(analyzer._iter_blocks(lines, block_chars=1)) == [("\n".join(lines), "\n")]
+
+def test_analyze_stream_splits_line_longer_than_max_length(analyzer, monkeypatch):
+    text = "The cat sat on the mat. She works very hard.\nThe dog barked at the mailman loudly."
+    full = analyzer.analyze_text(text)
+    monkeypatch.setattr(analyzer.nlp, "max_length", 30)
+    blocks = list(analyzer._iter_blocks(io.StringIO(text), block_chars=1000))
+    assert all(len(block) <= 30 for block, _ in blocks)
+    assert blocks[:2] == [("The cat sat on the mat.", " "), ("She works very hard.", "\n")]
+    streamed = list(analyzer.analyze_stream(io.StringIO(text), block_chars=1000))
+
+    def positions(sentences):
+        return [(t["id"], t["start"], t["end"], t["text"])
+                for s in sentences for t in s["tokens"] if t["text"].strip()]
+
+    assert positions(streamed) == positions(full)
+    with pytest.raises(ValueError):
+        list(analyzer._iter_blocks(["x" * 31], block_chars=1000))
+
+def test_split_long_line_prefers_sentence_ends():
+    assert split_long_line("One two. Three four five", 20) == [("One two.", " "), ("Three four five", "")]
+    assert split_long_line("One two three four", 10) == [("One two", " "), ("three four", "")]
+    assert split_long_line("short", 10) == [("short", "")]
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+
+from analyzer import AnalysisError
+from async_analyzer import AsyncSentenceAnalyzer
+
+
+class RecordingAnalyzer:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def analyze_many(self, texts, batch_size=64, raise_errors=True):
+        self.batch_sizes.append(len(texts))
+        for index, text in enumerate(texts):
+            if text == "bad":
+                yield AnalysisError(index, ValueError("bad"))
+            else:
+                yield [{"original_text": text}]
+
+
+def test_concurrent_requests_are_coalesced():
+    recorder = RecordingAnalyzer()
+
+    async def run():
+        wrapper = AsyncSentenceAnalyzer(recorder, max_wait_ms=50, max_batch_size=4)
+        texts = [f"Sentence {i}." for i in range(6)]
+        results = await asyncio.gather(*(wrapper.analyze(text) for text in texts))
+        metrics = wrapper.metrics()
+        await wrapper.close()
+        return texts, results, metrics
+
+    texts, results, metrics = asyncio.run(run())
+    assert [result[0]["original_text"] for result in results] == texts
+    assert recorder.batch_sizes == [4, 2]
+    assert metrics["requests"] == 6 and metrics["batches"] == 2
+    assert metrics["max_batch_size"] == 4 and metrics["queue_depth"] == 0
+
+
+def test_errors_resolve_only_the_failing_caller():
+    async def run():
+        wrapper = AsyncSentenceAnalyzer(RecordingAnalyzer(), max_wait_ms=20)
+        outcomes = await asyncio.gather(wrapper.analyze("good"), wrapper.analyze("bad"), return_exceptions=True)
+        await wrapper.close()
+        return outcomes
+
+    good, bad = asyncio.run(run())
+    assert good == [{"original_text": "good"}]
+    assert isinstance(bad, AnalysisError)
+
+
+def test_close_fails_queued_and_in_flight_requests():
+    release = threading.Event()
+
+    class BlockingAnalyzer(RecordingAnalyzer):
+        def analyze_many(self, texts, batch_size=64, raise_errors=True):
+            release.wait(5)
+            return super().analyze_many(texts, batch_size, raise_errors)
+
+    async def run():
+        wrapper = AsyncSentenceAnalyzer(BlockingAnalyzer(), max_wait_ms=1, max_batch_size=2)
+        tasks = [asyncio.create_task(wrapper.analyze(f"Sentence {i}.")) for i in range(5)]
+        await asyncio.sleep(0.1)  # 最初のバッチが解析中で、残りは待ち行列にある
+        await wrapper.close()
+        results = await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 1)
+        release.set()
+        return results
+
+    results = asyncio.run(run())
+    assert len(results) == 5 and all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,44 @@
+import pytest
+import spacy
+from analyzer import SentenceAnalyzer
+from benchmarks.suite import build_corpora, compare, corpus_signature, run_suite
+
+
+@pytest.fixture(scope="module")
+def nlp_model():
+    return spacy.load("en_core_web_sm")
+
+
+def test_corpora_are_fixed():
+    corpora = build_corpora(large_kb=4)
+    assert set(corpora) == {"short", "nested", "exercises", "large"}
+    assert len(corpora["large"]) >= 4 * 1024
+    assert corpus_signature(corpora) == corpus_signature(build_corpora(large_kb=4))
+    assert corpus_signature(corpora) != corpus_signature(build_corpora(large_kb=8))
+
+
+def test_compare_reports_regressions_above_threshold():
+    baseline = {
+        "analyze/short": {"median_ms": 10.0, "peak_kib": 100.0, "stages_ms": {"parse": 5.0, "dedup": 0.1}},
+        "format/short": {"median_ms": 0.2, "peak_kib": 10.0},
+    }
+    current = {
+        "analyze/short": {"median_ms": 11.0, "peak_kib": 100.0, "stages_ms": {"parse": 7.0, "dedup": 0.5}},
+        "format/short": {"median_ms": 0.9, "peak_kib": 20.0},
+    }
+    regressions = compare(current, baseline, threshold=0.2, min_ms=1.0)
+    # 10% の悪化はしきい値以内、1ms 未満の処理時間は比較しない
+    assert [(case, metric) for case, metric, _, _ in regressions] == [
+        ("analyze/short", "stages_ms.parse"),
+        ("format/short", "peak_kib"),
+    ]
+    assert compare(baseline, baseline) == []
+
+
+def test_run_suite_records_stages_and_memory(nlp_model):
+    corpora = {"short": build_corpora(large_kb=0)["short"]}
+    results = run_suite(SentenceAnalyzer(nlp_model), corpora, repeat=1)
+    assert set(results) == {"analyze/short", "format/short", "diagrams/short"}
+    for result in results.values():
+        assert result["median_ms"] > 0 and result["peak_kib"] > 0 and result["tokens_per_s"] > 0
+    assert {"parse", "tokens", "chunking"} <= set(results["analyze/short"]["stages_ms"])
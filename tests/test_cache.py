@@ -0,0 +1,49 @@
+from cache import AnalysisCache, make_cache_key, make_render_key
+
+
+def test_cache_key_depends_on_text_and_model():
+    key = make_cache_key("Hello world.", "en_core_web_sm", "3.8.0")
+    assert key == make_cache_key("Hello world.", "en_core_web_sm", "3.8.0")
+    assert key != make_cache_key("Hello world!", "en_core_web_sm", "3.8.0")
+    assert key != make_cache_key("Hello world.", "en_core_web_sm", "3.7.1")
+
+
+def test_lru_eviction_by_entries():
+    cache = AnalysisCache(max_entries=2)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    assert cache.get("a") == [1]  # a が最近使われたので b が追い出される
+    cache.put("c", [3])
+    assert "b" not in cache
+    assert cache.get("a") == [1] and cache.get("c") == [3]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_eviction_by_bytes():
+    cache = AnalysisCache(max_entries=100, max_bytes=20)
+    cache.put("a", ["x" * 10])
+    cache.put("b", ["y" * 10])
+    assert len(cache) == 1 and "b" in cache
+    cache.put("huge", ["z" * 100])
+    assert "huge" not in cache
+
+
+def test_hit_and_miss_counters():
+    cache = AnalysisCache()
+    assert cache.get("missing") is None
+    cache.put("k", [])
+    assert cache.get("k") == []
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+
+
+def test_render_key_depends_on_structure_and_kind():
+    tokens = [{'id': 0, 'text': "She", 'pos': "PRON", 'dep': "nsubj", 'head_id': 1, 'lemma': "she"},
+              {'id': 1, 'text': "works", 'pos': "VERB", 'dep': "ROOT", 'head_id': 1, 'lemma': "work"}]
+    chunks = [{'type': "NP", 'text': "She", 'start_id': 0, 'end_id': 0}]
+    key = make_render_key("chunk_dot", tokens, chunks)
+    # 図に使わないフィールドは無視する
+    assert make_render_key("chunk_dot", [dict(t, lemma="x") for t in tokens], chunks) == key
+    assert make_render_key("chunk_mermaid", tokens, chunks) != key
+    assert make_render_key("chunk_dot", tokens, []) != key
+    assert make_render_key("chunk_dot", [tokens[0], dict(tokens[1], dep="ccomp")], chunks) != key
@@ -0,0 +1,55 @@
+import re
+import time
+
+import pytest
+
+from cleaning import _legacy_clean_text, clean_line, clean_text
+
+
+SAMPLES = [
+    "",
+    "The cat sat on the mat.",
+    "1. The cat sat.\n2. She works hard.",
+    "  1. 2.Nested numbers \r\n\n---\n123\n\t  indented line  \n3.",
+    " 1. leading space keeps the number",
+    "1.\n2. The number on its own line\n\n",
+    "日本語だけの行\nEnglish after Japanese 日本語　",
+]
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_clean_text_matches_line_by_line_cleaning(text):
+    assert clean_text(text).text == _legacy_clean_text(text)
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_offsets_map_back_to_raw_text(text):
+    cleaned = clean_text(text)
+    for match in re.finditer(r"\S+", cleaned.text):
+        raw_start, raw_end = cleaned.span_to_raw(match.start(), match.end())
+        assert text[raw_start:raw_end] == match.group()
+
+
+def test_span_across_lines_covers_both_lines():
+    text = "1. The cat sat.\n\n2. She works."
+    cleaned = clean_text(text)
+    start, end = cleaned.span_to_raw(0, len(cleaned.text))
+    assert text[start:end] == "The cat sat.\n\n2. She works."
+
+
+def test_clean_line():
+    assert clean_line("3. The dog barked.  \n") == "The dog barked."
+    assert clean_line("---") is None
+
+
+@pytest.mark.parametrize("line", [
+    " " * 50_000, "1. " * 16_000, "1." * 25_000, "1. " * 16_000 + "x", " " * 50_000 + "a" + " " * 50_000,
+])
+def test_long_pathological_lines_are_linear(line):
+    # 番号や空白だけの長い行で正規表現の後戻りが行の長さの2乗にならないこと
+    text = f"{line}\nThe cat sat."
+    started = time.perf_counter()
+    cleaned = clean_text(text)
+    assert time.perf_counter() - started < 0.5
+    assert cleaned.text == _legacy_clean_text(text)
+    assert clean_line(line) == _legacy_clean_text(line) or (clean_line(line) is None and _legacy_clean_text(line) == "")
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+import cli
+from compact import iter_compact_records
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    corpus_dir = tmp_path / "corpus"
+    (corpus_dir / "sub").mkdir(parents=True)
+    (corpus_dir / "b.txt").write_text("He is running quickly in the park.", encoding="utf-8")
+    (corpus_dir / "a.txt").write_text("The cat sat on the mat. She works very hard.", encoding="utf-8")
+    (corpus_dir / "sub" / "c.txt").write_text("The dog barked.", encoding="utf-8")
+    (corpus_dir / "notes.md").write_text("ignored", encoding="utf-8")
+    return corpus_dir
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_iter_documents_walks_directories_in_order(corpus):
+    doc_ids = [doc_id for doc_id, _ in cli.iter_documents([str(corpus)])]
+    assert doc_ids == [str(corpus / "a.txt"), str(corpus / "b.txt"), str(corpus / "sub" / "c.txt")]
+
+
+def test_iter_documents_lines_mode(tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_text("The cat sat.\n\nShe works.\n", encoding="utf-8")
+    assert [doc_id for doc_id, _ in cli.iter_documents([str(path)], lines=True)] == \
+           [f"{path}:1", f"{path}:3"]
+
+
+def test_iter_batches_skips_completed_documents():
+    batches = list(cli.iter_batches(range(7), batch_size=3, skip=2))
+    assert batches == [[2, 3, 4], [5, 6]]
+
+
+def test_main_writes_one_record_per_sentence(corpus, tmp_path, capsys):
+    output = tmp_path / "out.jsonl"
+    assert cli.main([str(corpus), "-o", str(output), "--batch-size", "2"]) == 0
+    records = read_jsonl(output)
+    assert [(r["doc_id"].rsplit("/", 1)[-1], r["sentence_index"]) for r in records] == \
+           [("a.txt", 0), ("a.txt", 1), ("b.txt", 0), ("c.txt", 0)]
+    assert {"tokens", "chunks", "original_text"} <= set(records[0])
+    assert "docs/s" in capsys.readouterr().err
+
+
+def test_main_resumes_from_checkpoint(corpus, tmp_path):
+    output, checkpoint = tmp_path / "out.jsonl", tmp_path / "out.ckpt"
+    args = [str(corpus), "-o", str(output), "--granularity", "document",
+            "--batch-size", "1", "--checkpoint", str(checkpoint)]
+    cli.main(args)
+    expected = read_jsonl(output)
+
+    # 2文書目の途中で中断した状態を再現する
+    cli.write_checkpoint(str(checkpoint), 1, len(json.dumps(expected[0], ensure_ascii=False).encode("utf-8")) + 1)
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"doc_id": "partial')
+    cli.main(args)
+    assert read_jsonl(output) == expected
+
+
+@pytest.mark.parametrize("damage", ["deleted", "short"])
+def test_main_restarts_when_output_does_not_match_checkpoint(corpus, tmp_path, capsys, damage):
+    output, checkpoint = tmp_path / "out.jsonl", tmp_path / "out.ckpt"
+    args = [str(corpus), "-o", str(output), "--granularity", "document",
+            "--batch-size", "1", "--checkpoint", str(checkpoint)]
+    cli.main(args)
+    expected = read_jsonl(output)
+
+    # チェックポイントはあるが、出力ファイルが削除された / 書き出される前に中断した
+    if damage == "deleted":
+        output.unlink()
+    else:
+        output.write_text("", encoding="utf-8")
+    cli.main(args)
+    assert read_jsonl(output) == expected
+    err = capsys.readouterr().err
+    assert str(output) in err and str(checkpoint) in err
+
+
+def test_main_compact_format_writes_vocab_once_per_batch(corpus, tmp_path):
+    plain, compact = tmp_path / "plain.jsonl", tmp_path / "compact.jsonl"
+    assert cli.main([str(corpus), "-o", str(plain), "--batch-size", "2"]) == 0
+    assert cli.main([str(corpus), "-o", str(compact), "--batch-size", "2", "--format", "compact"]) == 0
+
+    lines = read_jsonl(compact)
+    assert sum("vocab" in record for record in lines) == 2  # 3文書を2文書ずつのバッチで処理
+    assert "vocab" in lines[0] and lines[0]["vocab"].count("the") <= 1
+    with open(compact, encoding="utf-8") as f:
+        sentences = list(iter_compact_records(f))
+    expected = read_jsonl(plain)
+    # JSON にすると chunk_index のトークンIDのキーは文字列になるため、同じ変換をして比べる
+    assert [json.loads(json.dumps(sentence.to_dict())) for sentence in sentences] == expected
+    assert compact.stat().st_size < plain.stat().st_size
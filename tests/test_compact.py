@@ -0,0 +1,192 @@
+import json
+import mmap
+
+import pytest
+
+from compact import (
+    CompactSentence, LabelTable, ResultsFile, batch_records, compact_results, iter_compact_records,
+    memory_report, write_results_file,
+)
+
+
+def make_sentence():
+    tokens = []
+    words = [("She", "PRON", "nsubj", 1), ("works", "VERB", "ROOT", 1), ("hard", "ADV", "advmod", 1), (".", "PUNCT", "punct", 1)]
+    start = 0
+    for i, (text, pos, dep, head) in enumerate(words):
+        tokens.append({
+            'id': i, 'text': text, 'lemma': text.lower(), 'pos': pos, 'tag': pos, 'dep': dep,
+            'dep_japanese': dep, 'head_id': head, 'children_ids': [0, 2, 3] if i == 1 else [],
+            'is_root': dep == "ROOT", 'pos_japanese': pos, 'start': start, 'end': start + len(text),
+            'morph': "", 'morph_japanese': "", 'ent_type': "", 'ent_type_japanese': "",
+            'is_entity_part': False, 'entity_text': None, 'entity_type': None,
+        })
+        start += len(text) + (0 if i == 2 else 1)
+    chunks = [
+        {'type': 'VP', 'text': 'works hard', 'start_id': 1, 'end_id': 2},
+        {'type': 'NP', 'text': 'She', 'start_id': 0, 'end_id': 0},
+        {'type': 'ADVP', 'text': 'hard', 'start_id': 2, 'end_id': 2},
+    ]
+    return {
+        "original_text": "She works hard.", "sent_offset": 0, "tokens": tokens, "chunks": chunks,
+        "chunk_hierarchy": {
+            'NP_0_0': {'parent': None, 'depth': 0, 'is_subset': False},
+            'VP_1_2': {'parent': None, 'depth': 0, 'is_subset': False},
+            'ADVP_2_2': {'parent': 'VP_1_2', 'depth': 1, 'is_subset': False},
+        },
+        "chunk_index": {
+            'children': {'NP_0_0': [], 'VP_1_2': ['ADVP_2_2'], 'ADVP_2_2': []},
+            'innermost': {0: 'NP_0_0', 1: 'VP_1_2', 2: 'ADVP_2_2'},
+        },
+        "pos_tagged_text": "", "subjects": [], "verbs": [], "noun_phrases": [],
+        "verb_phrases": [], "prepositional_phrases": [],
+    }
+
+
+def test_label_table_interns_strings():
+    table = LabelTable()
+    assert table.add("NOUN") == table.add("NOUN") == 0
+    assert table.add(None) == -1 and table.get(-1) is None
+    assert table.get(table.add("VERB")) == "VERB" and len(table) == 2
+
+
+def test_compact_sentence_round_trip():
+    sentence = make_sentence()
+    compact = CompactSentence.from_dict(sentence)
+    assert compact.to_dict() == sentence
+    json.dumps(compact.to_dict())
+
+
+def test_compact_sentence_views_behave_like_dicts():
+    compact = CompactSentence.from_dict(make_sentence())
+    tokens = compact['tokens']
+    assert len(tokens) == 4
+    assert tokens[1]['text'] == "works" and tokens[1]['is_root'] is True
+    assert tokens[1]['children_ids'] == [0, 2, 3]
+    assert tokens[-1].get('entity_text') is None
+    assert dict(tokens[0])['pos'] == "PRON"
+    assert compact['chunk_hierarchy']['ADVP_2_2']['parent'] == 'VP_1_2'
+    assert compact['chunk_index']['innermost'][2] == 'ADVP_2_2'
+    assert compact['original_text'] == "She works hard."
+
+
+def test_shared_labels_and_memory_report():
+    results = [make_sentence() for _ in range(20)]
+    compact = compact_results(results)
+    assert all(sentence.labels is compact[0].labels for sentence in compact)
+    report = memory_report(results, compact)
+    assert report['compact_bytes'] < report['dict_bytes']
+
+
+class UpperTranslator:
+    def translate_label(self, key, token_info):
+        return token_info[key.replace('_japanese', '')].upper()
+
+
+def test_compact_sentence_translates_raw_labels():
+    sentence = make_sentence()
+    for token in sentence['tokens']:
+        for key in ('dep_japanese', 'pos_japanese', 'morph_japanese', 'ent_type_japanese'):
+            del token[key]
+    compact = CompactSentence.from_dict(sentence, translator=UpperTranslator())
+    token = compact['tokens'][0]
+    assert token['dep_japanese'] == "NSUBJ"
+    assert 'pos_japanese' in dict(token)
+
+
+def test_batch_records_share_one_vocab_and_read_back():
+    sentence = make_sentence()
+    records = batch_records([("a", [sentence, sentence], None), ("b", None, "bad input"), ("c", [sentence], None)])
+    vocab = records[0]["vocab"]
+    assert len(vocab) == len(set(vocab)) and "works" in vocab
+    assert records[1]["tokens"]["text"] == [vocab.index(t["text"]) for t in sentence["tokens"]]
+    assert records[3] == {"doc_id": "b", "error": "bad input"}
+
+    lines = [json.dumps(record, ensure_ascii=False) for record in records]
+    read = list(iter_compact_records(lines))
+    assert read[2] == {"doc_id": "b", "error": "bad input"}
+    assert read[0]["doc_id"] == "a" and read[1]["sentence_index"] == 1
+    assert read[0].labels is read[3].labels
+    assert read[3].to_dict() == {"doc_id": "c", "sentence_index": 0, **sentence}
+
+
+def test_batch_records_document_granularity():
+    sentence = make_sentence()
+    records = batch_records([("a", [sentence], None)], granularity="document")
+    [document] = iter_compact_records(json.dumps(record) for record in records)
+    assert document["doc_id"] == "a"
+    assert [s.to_dict() for s in document["sentences"]] == [sentence]
+
+
+def test_to_bytes_round_trip_with_own_labels():
+    sentence = make_sentence()
+    shared = LabelTable(["unused", "other"])
+    blob = CompactSentence.from_dict(sentence, shared).to_bytes()
+    assert len(blob) % 4 == 0
+    restored = CompactSentence.from_bytes(blob)
+    assert restored.to_dict() == sentence
+    assert "other" not in restored.labels.strings  # 使う文字列だけの表を含む
+    assert isinstance(restored.int_columns['id'], memoryview)  # 列はバッファを直接指す
+    assert CompactSentence.from_bytes(restored.to_bytes()).to_dict() == sentence
+
+    empty = dict(sentence, tokens=[], chunks=[], chunk_hierarchy={}, chunk_index={'children': {}, 'innermost': {}})
+    assert CompactSentence.from_bytes(CompactSentence.from_dict(empty).to_bytes()).to_dict() == empty
+
+
+def test_from_bytes_rejects_other_data():
+    with pytest.raises(ValueError):
+        CompactSentence.from_bytes(b"\0" * 32)
+    blob = CompactSentence.from_dict(make_sentence()).to_bytes(include_labels=False)
+    with pytest.raises(ValueError):
+        CompactSentence.from_bytes(blob)
+
+
+def test_results_file_decodes_only_requested_sentences(tmp_path):
+    sentences = [dict(make_sentence(), sent_offset=i) for i in range(50)]
+    sentences[7]["tokens"][0] = dict(sentences[7]["tokens"][0], text="Ann", lemma="ann")
+    path = tmp_path / "results.bin"
+    inputs = sentences[:10] + compact_results(sentences[10:])
+    with open(path, "wb") as f:
+        assert write_results_file(f, inputs) == 50
+
+    with ResultsFile.open(path) as results:
+        assert len(results) == 50
+        assert results[7].to_dict() == sentences[7]
+        assert results[-1].to_dict() == sentences[-1]
+        assert [s["sent_offset"] for s in results[20:23]] == [20, 21, 22]
+        with pytest.raises(IndexError):
+            results[50]
+        assert results[0].labels is results[1].labels
+
+    with pytest.raises(ValueError):
+        ResultsFile(b"\0" * 64)
+
+
+def test_results_file_close_keeps_sentences_usable(tmp_path):
+    path = tmp_path / "results.bin"
+    with open(path, "wb") as f:
+        write_results_file(f, [make_sentence(), make_sentence()])
+    with ResultsFile.open(path) as results:
+        sentence = results[1]
+        tokens = results[0]["tokens"]
+    assert sentence.to_dict() == make_sentence()  # 閉じたあとも取り出した文は使える
+    assert tokens[1]["text"] == "works"
+    results.close()  # 2回目の close は何もしない
+    with pytest.raises(ValueError):
+        results[0]
+
+
+def test_results_file_open_closes_mmap_on_invalid_file(tmp_path, monkeypatch):
+    path = tmp_path / "broken.bin"
+    path.write_bytes(b"\0" * 64)
+    opened = []
+    real_mmap = mmap.mmap
+
+    def recording_mmap(*args, **kwargs):
+        opened.append(real_mmap(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(mmap, "mmap", recording_mmap)
+    with pytest.raises(ValueError):
+        ResultsFile.open(path)
+    assert opened and opened[0].closed
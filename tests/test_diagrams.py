@@ -0,0 +1,73 @@
+from analyzer import build_chunk_hierarchy, build_chunk_index
+from diagrams import (
+    build_chunk_tree_dot, build_chunk_tree_mermaid, build_dependency_dot, build_dependency_mermaid,
+    find_main_phrases, token_table,
+)
+
+
+def make_tokens():
+    words = [("The", "DET", "det", 1), ("cat", "NOUN", "nsubj", 2), ("sat", "VERB", "ROOT", 2),
+             ("on", "ADP", "prep", 2), ("mats", "NOUN", "pobj", 3), (".", "PUNCT", "punct", 2)]
+    return [
+        {'id': i + 10, 'text': text, 'pos': pos, 'pos_japanese': pos.lower(), 'dep': dep,
+         'dep_japanese': dep.upper(), 'head_id': head + 10, 'is_root': dep == "ROOT"}
+        for i, (text, pos, dep, head) in enumerate(words)
+    ]
+
+
+def make_chunks():
+    return [
+        {'type': 'NP', 'text': 'The cat', 'start_id': 10, 'end_id': 11},
+        {'type': 'VP', 'text': 'sat on mats', 'start_id': 12, 'end_id': 14},
+        {'type': 'PP', 'text': 'on mats', 'start_id': 13, 'end_id': 14},
+    ]
+
+
+def test_token_table_indexes_by_id():
+    tokens = make_tokens()
+    assert token_table(tokens)[12]['text'] == "sat"
+
+
+def test_dependency_dot_has_one_edge_per_dependent():
+    source = build_dependency_dot(make_tokens())
+    assert source.count(" -> ") == 5 + 1  # 依存関係5本と nsubj/ROOT の順序付けエッジ
+    assert '12 -> 11 [label=NSUBJ color=salmon dir=both penwidth=2]' in source
+    assert '11 -> 10 [label=DET color=black dir=back penwidth=1]' in source
+
+
+def test_dependency_mermaid_edges():
+    source = build_dependency_mermaid(make_tokens())
+    assert "    11 --- 12\n" in source
+    assert "    13 -- POBJ --> 14\n" in source
+    assert source.count(" --> ") == 5
+
+
+def test_chunk_tree_sources_link_tokens_to_innermost_chunk():
+    tokens, chunks = make_tokens(), make_chunks()
+    hierarchy = build_chunk_hierarchy(chunks)
+    index = build_chunk_index(chunks, hierarchy)
+
+    dot = build_chunk_tree_dot(tokens, chunks, hierarchy, index)
+    assert "S -> NP_10_11" in dot and "VP_12_14 -> PP_13_14" in dot
+    assert "PP_13_14 -> 14" in dot and "VP_12_14 -> 14" not in dot
+    assert '15 [label="." shape=plaintext]' in dot  # どの句にも含まれない単語
+
+    mermaid = build_chunk_tree_mermaid(tokens, chunks, hierarchy, index)
+    assert "        NP_10_11 --- VP_12_14\n" in mermaid
+    assert "    PP_13_14 --> token_13\n" in mermaid
+    assert "token_15" not in mermaid
+
+
+def test_find_main_phrases_when_root_is_first_token():
+    # "Run to the store." のように ROOT が ID 0 の場合も VP を見つける
+    words = [("Run", "VERB", "ROOT", 0), ("to", "ADP", "prep", 0), ("the", "DET", "det", 3),
+             ("store", "NOUN", "pobj", 1)]
+    tokens = [{'id': i, 'text': text, 'pos': pos, 'dep': dep, 'head_id': head, 'is_root': dep == "ROOT"}
+              for i, (text, pos, dep, head) in enumerate(words)]
+    chunks = [{'type': 'VP', 'text': 'Run to the store', 'start_id': 0, 'end_id': 3},
+              {'type': 'NP', 'text': 'the store', 'start_id': 2, 'end_id': 3}]
+    hierarchy = build_chunk_hierarchy(chunks)
+    index = build_chunk_index(chunks, hierarchy)
+    chunk_dict = {f"{c['type']}_{c['start_id']}_{c['end_id']}": c for c in chunks}
+    parent_map = {chunk_id: info['parent'] for chunk_id, info in hierarchy.items()}
+    assert find_main_phrases(tokens, chunk_dict, parent_map, index['innermost']) == (None, 'VP_0_3')
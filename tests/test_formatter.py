@@ -1,3 +1,6 @@
+import io
+import re
+
 import pytest
 from formatter import ResultFormatter
 
@@ -66,3 +69,64 @@ def test_format_with_all_phrases():
     assert "[名詞句: <span style=\"background-color:#ADD8E6; border:1px solid #00CED1; border-radius:3px; padding:0 2px;\">The quick brown fox</span>]" in html
     assert "(動詞句: <span style=\"background-color:#E0FFE0; border:1px solid #32CD32; border-radius:3px; padding:0 2px;\">jumps over the lazy dog</span>)" in html
     assert "{前置詞句: <span style=\"background-color:#FFFFE0; border:1px solid #FFD700; border-radius:3px; padding:0 2px;\">over the lazy dog</span>}" in html
+
+
+def _current_schema_sentence():
+    # "The dog runs in the park." を現在の解析結果の形式 (tokens と chunks) で表したもの
+    words = [("The", "DET", "det"), ("dog", "NOUN", "nsubj"), ("runs", "VERB", "ROOT"),
+             ("in", "ADP", "prep"), ("the", "DET", "det"), ("park", "NOUN", "pobj"), (".", "PUNCT", "punct")]
+    tokens, start = [], 10
+    for i, (text, pos, dep) in enumerate(words):
+        if text != "." and i:
+            start += 1
+        tokens.append({"id": i + 3, "text": text, "pos": pos, "dep": dep, "is_root": dep == "ROOT",
+                       "start": start, "end": start + len(text)})
+        start += len(text)
+    return {
+        "original_text": "The dog runs in the park.",
+        "sent_offset": 10,
+        "tokens": tokens,
+        "chunks": [
+            {"type": "NP", "text": "The dog", "start_id": 3, "end_id": 4},
+            {"type": "VP", "text": "runs in the park", "start_id": 5, "end_id": 8},
+            {"type": "PP", "text": "in the park", "start_id": 6, "end_id": 8},
+            {"type": "NP", "text": "the park", "start_id": 7, "end_id": 8},
+        ],
+        "subjects": [], "verbs": [], "noun_phrases": [], "verb_phrases": [], "prepositional_phrases": [],
+    }
+
+
+def test_format_current_schema():
+    html = ResultFormatter([_current_schema_sentence()]).format_html_all()
+    np_open = "[名詞句: <span style=\"background-color:#ADD8E6; border:1px solid #00CED1; border-radius:3px; padding:0 2px;\">"
+    assert html.startswith("<p>" + np_open + "The <span style=\"color:red; font-weight:bold;\">dog</span></span>]")
+    assert "<span style=\"color:blue; font-weight:bold;\">runs</span>" in html
+    # 外側の句から開き、内側の句から閉じる
+    assert "{前置詞句: " in html and html.index("(動詞句: ") < html.index("{前置詞句: ") < html.index(np_open + "the park")
+    assert html.endswith("park</span>]</span>}</span>).</p>")
+
+
+def test_format_crossing_spans_are_well_nested():
+    analyzed_data = {
+        "original_text": "a<b & c",
+        "sent_offset": 0,
+        "noun_phrases": [{"start": 0, "end": 3}],
+        "verb_phrases": [{"start": 2, "end": 7}],
+    }
+    html = ResultFormatter([analyzed_data]).format_html_all()
+    assert "a&lt;b &amp; c" == re.sub(r"<[^>]*>|\[名詞句: |\]|\(動詞句: |\)", "", html).replace("<p>", "")
+    depth = 0
+    for tag in re.findall(r"</?span", html):
+        depth += -1 if tag.startswith("</") else 1
+        assert depth >= 0
+    assert depth == 0
+
+
+def test_write_html_streams_same_output():
+    data = [_current_schema_sentence(), _current_schema_sentence()]
+    formatter = ResultFormatter(data)
+    out = io.StringIO()
+    written = formatter.write_html(out)
+    assert out.getvalue() == formatter.format_html_all()
+    assert written == len(out.getvalue())
+    assert out.getvalue().count("<p>") == 2
@@ -0,0 +1,34 @@
+import pytest
+
+from instrumentation import NULL_TRACE, Trace, process_memory
+
+
+def test_trace_accumulates_stages_in_order():
+    trace = Trace()
+    with trace.span("parse"):
+        pass
+    for _ in range(3):
+        with trace.span("tokens"):
+            pass
+    trace.annotate("cache", "miss")
+    profile = trace.to_dict()
+    assert list(profile["stages"]) == ["parse", "tokens"]
+    assert profile["stages"]["tokens"]["count"] == 3
+    assert profile["cache"] == "miss"
+    assert profile["total_ms"] >= profile["stages"]["parse"]["ms"]
+
+
+def test_null_trace_records_nothing():
+    with NULL_TRACE.span("parse"):
+        pass
+    NULL_TRACE.annotate("cache", "hit")
+    assert NULL_TRACE.enabled is False
+
+
+def test_process_memory_reads_smaps_rollup():
+    memory = process_memory()
+    if memory is None:
+        pytest.skip("/proc/self/smaps_rollup を読めない環境")
+    assert 0 < memory["uss_kib"] <= memory["rss_kib"]
+    assert memory["pss_kib"] <= memory["rss_kib"]
+    assert process_memory(pid=-1) is None
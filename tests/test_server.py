@@ -0,0 +1,188 @@
+import gc
+import json
+import multiprocessing
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+import server
+from analyzer import AnalysisError
+
+
+class StubAnalyzer:
+    def analyze_text(self, text, trace=None):
+        if trace is not None:
+            with trace.span("parse"):
+                pass
+        return [{"original_text": text, "sent_offset": 0, "tokens": [], "chunks": []}]
+
+    def analyze_many(self, texts, batch_size=64, raise_errors=True):
+        for index, text in enumerate(texts):
+            yield AnalysisError(index, ValueError("bad")) if text == "bad" else self.analyze_text(text)
+
+
+@pytest.fixture
+def running_server(monkeypatch):
+    monkeypatch.setattr(server, "_worker_analyzer", StubAnalyzer())
+    service = server.AnalysisService(ThreadPoolExecutor(max_workers=1), max_pending=2)
+    httpd = server.AnalysisHTTPServer(("127.0.0.1", 0), service)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}", service
+    httpd.shutdown()
+    httpd.server_close()
+    service.shutdown()
+
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"))
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_analyze_endpoint(running_server):
+    url, _ = running_server
+    status, body = post(f"{url}/analyze", {"text": "Hello."})
+    assert status == 200
+    assert body["sentences"][0]["original_text"] == "Hello."
+    assert "trace" not in body
+
+
+def test_analyze_endpoint_returns_trace(running_server):
+    url, _ = running_server
+    status, body = post(f"{url}/analyze", {"text": "Hello.", "trace": True})
+    assert status == 200
+    assert body["trace"]["stages"]["parse"]["count"] == 1
+
+
+def test_batch_endpoint_reports_errors_by_index(running_server):
+    url, _ = running_server
+    status, body = post(f"{url}/analyze/batch", {"texts": ["One.", "bad", "Three."]})
+    assert status == 200
+    assert body["results"][1] is None and body["results"][2][0]["original_text"] == "Three."
+    assert body["errors"] == [{"index": 1, "error": "bad"}]
+
+
+def test_invalid_request_and_busy_service(running_server):
+    url, service = running_server
+    assert post(f"{url}/analyze", {"text": 1})[0] == 400
+    for payload in ([], "x", 1):  # JSON として正しくてもオブジェクトでなければ 400
+        assert post(f"{url}/analyze", payload)[0] == 400
+        assert post(f"{url}/analyze/batch", payload)[0] == 400
+    for _ in range(service.max_pending):
+        service._slots.acquire()
+    try:
+        assert post(f"{url}/analyze", {"text": "Hello."})[0] == 503
+    finally:
+        for _ in range(service.max_pending):
+            service._slots.release()
+
+
+def test_timeout_returns_504_and_keeps_slot_until_job_finishes(running_server, monkeypatch):
+    url, service = running_server
+    service.timeout = 0.1
+    released = threading.Event()
+    stub = server._worker_analyzer
+
+    def slow_analyze_text(text, trace=None):
+        released.wait(5)
+        return StubAnalyzer.analyze_text(stub, text, trace)
+
+    monkeypatch.setattr(stub, "analyze_text", slow_analyze_text)
+    assert post(f"{url}/analyze", {"text": "Hello."})[0] == 504
+    assert service.pending == 1  # 実行中の解析は枠を使ったまま
+    # 2件目はワーカーに渡る前にタイムアウトするため取り消され、枠が返される
+    assert post(f"{url}/analyze", {"text": "Hello."})[0] == 504
+    assert service.pending == 1
+    released.set()
+    for _ in range(50):
+        if service.pending == 0:
+            break
+        time.sleep(0.05)
+    assert service.pending == 0
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_health_reports_loading_until_workers_are_warm(running_server, monkeypatch):
+    url, service = running_server
+    assert get(f"{url}/health") == (200, {"status": "ok", "pending": 0, "max_pending": 2,
+                                          "ready": True, "workers": [], "errors": [], "memory": []})
+    released = threading.Event()
+    monkeypatch.setattr(server, "_worker_timings", {"load": 0.5})
+    original_warm_up = server._warm_up
+
+    def slow_warm_up():
+        released.wait(5)
+        return original_warm_up()
+
+    monkeypatch.setattr(server, "_warm_up", slow_warm_up)
+    service.warm_up(1)
+    status, body = get(f"{url}/health")
+    assert status == 503 and body["status"] == "loading" and not body["ready"]
+    # 読み込み中もリクエストは受け付け、ワーカーの準備ができてから処理する
+    released.set()
+    service.warmup[0].result(timeout=5)
+    status, body = get(f"{url}/health")
+    assert status == 200 and body["ready"] and body["workers"][0]["timings_ms"] == {"load": 500.0}
+
+
+def _init_uneven_worker(barrier, started):
+    """2つ目以降に起動したワーカーだけ初期化に時間がかかる"""
+    with started.get_lock():
+        started.value += 1
+        order = started.value
+    if order > 1:
+        time.sleep(1.0)
+    server._worker_barrier = barrier
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="fork が使えない環境")
+def test_readiness_waits_for_every_worker():
+    context = multiprocessing.get_context("fork")
+    executor = ProcessPoolExecutor(max_workers=2, mp_context=context, initializer=_init_uneven_worker,
+                                   initargs=(context.Barrier(2), context.Value("i", 0)))
+    service = server.AnalysisService(executor)
+    try:
+        service.warm_up(2)
+        time.sleep(0.3)
+        assert not service.readiness()["ready"]  # 遅いワーカーの初期化がまだ終わっていない
+        workers = [future.result(timeout=10) for future in service.warmup]
+        assert service.readiness()["ready"]
+        assert len({worker["pid"] for worker in workers}) == 2
+    finally:
+        service.shutdown()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="fork が使えない環境")
+def test_prefork_service_shares_preloaded_analyzer(monkeypatch):
+    monkeypatch.setattr(server, "_worker_analyzer", None)
+    monkeypatch.setattr(server, "_worker_timings", {})
+    service = server.create_service(workers=2, prefork=True)
+    try:
+        assert gc.get_freeze_count() > 0
+        assert "analyzer_warmup" in server._worker_timings
+        workers = [future.result(timeout=60) for future in service.warmup]
+        assert all(worker["pid"] != os.getpid() for worker in workers)
+        # 各ワーカーが1つずつ _warm_up を処理する (先に起動したワーカーがまとめて処理しない)
+        assert len({worker["pid"] for worker in workers}) == 2
+        sentences, _ = service.analyze("The cat sat on the mat.")
+        assert sentences[0]["original_text"] == "The cat sat on the mat."
+        assert len(service.worker_memory()) == 2
+    finally:
+        service.shutdown()
+        gc.unfreeze()
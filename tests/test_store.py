@@ -0,0 +1,85 @@
+import random
+
+import pytest
+import spacy
+from analyzer import SentenceAnalyzer
+from cache import AnalysisCache
+from store import AnalysisStore, TieredCache
+
+
+@pytest.fixture(scope="module")
+def nlp_model():
+    return spacy.load("en_core_web_sm")
+
+
+def test_store_persists_across_reopen(tmp_path):
+    path = str(tmp_path / "analysis.sqlite3")
+    store = AnalysisStore(path)
+    store.put("a", [{"text": "x", "chunk_index": {"children": {1: [2]}}}])
+    store.close()
+
+    reopened = AnalysisStore(path)
+    assert "a" in reopened and len(reopened) == 1
+    assert reopened.get("a") == [{"text": "x", "chunk_index": {"children": {1: [2]}}}]
+    assert reopened.get("missing") is None
+    stats = reopened.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["bytes"] > 0
+
+
+def test_store_evicts_least_recently_used_by_size(tmp_path):
+    store = AnalysisStore(str(tmp_path / "analysis.sqlite3"), max_bytes=10_000)
+    payload = [random.Random(0).randbytes(1000)]  # 圧縮しても小さくならない約1KBの値
+    for key in "abcdefgh":
+        store.put(key, payload)
+    assert store.get("a") is not None  # a を最近使ったことにする
+    for key in "ijkl":
+        store.put(key, payload)
+    assert store.stats()["bytes"] <= 10_000
+    assert "a" in store and "b" not in store and "l" in store
+    assert store.evictions > 0
+    store.put("huge", [random.Random(1).randbytes(20_000)])
+    assert "huge" not in store
+
+
+def test_store_cap_holds_across_connections(tmp_path):
+    # サーバーのワーカーのように、同じファイルを別々に開いたストアが交互に書き込む
+    path = str(tmp_path / "analysis.sqlite3")
+    first, second = AnalysisStore(path, max_bytes=10_000), AnalysisStore(path, max_bytes=10_000)
+    rng = random.Random(0)
+    for i in range(30):
+        (first if i % 2 else second).put(f"k{i}", [rng.randbytes(1000)])
+        assert first._total_bytes() <= 10_000
+    assert first.stats()["bytes"] == second.stats()["bytes"] <= 10_000
+    assert "k29" in first and "k0" not in second
+
+
+def test_tiered_cache_warms_memory_from_store(tmp_path):
+    path = str(tmp_path / "analysis.sqlite3")
+    cache = TieredCache(AnalysisCache(max_entries=2), AnalysisStore(path))
+    for key in ("old", "mid", "new"):
+        cache.put(key, [key])
+    cache.store.close()
+
+    # 再起動: メモリには最近使われた2件だけを読み込み、古い結果はファイルから読む
+    restarted = TieredCache(AnalysisCache(max_entries=2), AnalysisStore(path))
+    assert restarted.warmed == 2
+    assert "new" in restarted.memory and "mid" in restarted.memory and "old" not in restarted.memory
+    assert restarted.get("old") == ["old"]
+    assert "old" in restarted.memory
+    stats = restarted.stats()
+    assert stats["store_hits"] == 1 and stats["hits"] == 1 and stats["store_entries"] == 3
+
+
+def test_lazy_labels_survive_the_store(nlp_model, tmp_path):
+    path = str(tmp_path / "analysis.sqlite3")
+    analyzer = SentenceAnalyzer(nlp_model, cache=TieredCache(AnalysisCache(), AnalysisStore(path)), lazy_labels=True)
+    text = "The cat sat on the mat."
+    expected = SentenceAnalyzer(nlp_model).analyze_text(text)
+    analyzer.analyze_text(text)
+    analyzer.cache.store.close()
+
+    restarted = SentenceAnalyzer(nlp_model, cache=TieredCache(AnalysisCache(), AnalysisStore(path), warm=False),
+                                 lazy_labels=True)
+    result = restarted.analyze_text(text)
+    assert restarted.cache.stats()["store_hits"] == 1
+    assert [dict(t) for t in result[0]["tokens"]] == [dict(t) for t in expected[0]["tokens"]]
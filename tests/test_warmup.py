@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+from warmup import ModelLoader
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        return text
+
+
+def test_loader_runs_in_background_and_signals_ready():
+    release = threading.Event()
+    model = FakeModel()
+
+    def load(model_name, profile):
+        release.wait(5)
+        return model
+
+    loader = ModelLoader("fake_model", load=load).start()
+    assert not loader.ready.is_set()
+    assert loader.status()["state"] == "loading"
+    release.set()
+    assert loader.wait(timeout=5) is model
+    assert model.calls == [loader.warmup_text]  # 最初の解析を済ませてから準備完了になる
+    status = loader.status()
+    assert status["state"] == "ready"
+    assert set(status["timings_ms"]) == {"import", "load", "first_inference"}
+
+
+def test_loader_reports_errors():
+    def load(model_name, profile):
+        raise OSError("model not found")
+
+    loader = ModelLoader("missing", load=load)
+    with pytest.raises(OSError, match="model not found"):
+        loader.wait(timeout=5)
+    assert loader.status()["state"] == "error"
+
+
+def test_wait_times_out_while_loading():
+    release = threading.Event()
+    model = FakeModel()
+    loader = ModelLoader("slow", load=lambda model_name, profile: release.wait(5) and model)
+    with pytest.raises(TimeoutError):
+        loader.wait(timeout=0.01)
+    release.set()
+    assert loader.wait(timeout=5) is model
@@ -0,0 +1,95 @@
+"""spaCy モデルをバックグラウンドで読み込み、起動直後から画面や API が応答できるようにする
+
+    loader = ModelLoader("en_core_web_sm").start()  # すぐに戻る
+    ...
+    if loader.ready.is_set(): ...                    # 準備ができたかどうか
+    nlp = loader.wait()                              # 準備ができるまで待つ
+
+読み込みは spaCy の import、モデルの読み込み、最初の解析 (ウォームアップ) の順に行い、
+それぞれにかかった時間を timings に記録する。
+"""
+import threading
+import time
+
+WARMUP_TEXT = "The quick brown fox jumps over the lazy dog."
+
+
+class ModelLoader:
+    """モデルの読み込みを1本のバックグラウンドスレッドで行い、完了を ready (threading.Event) で知らせる
+
+    load には (model_name, profile) を受け取ってモデルを返す関数を渡せる (省略時は
+    analyzer.load_pipeline)。読み込みに失敗した場合は error に例外を保持し、wait で送出する。
+    """
+
+    def __init__(self, model_name="en_core_web_sm", profile="full", load=None, warmup_text=WARMUP_TEXT):
+        self.model_name = model_name
+        self.profile = profile
+        self.warmup_text = warmup_text
+        self.ready = threading.Event()
+        self.nlp = None
+        self.error = None
+        self.timings = {}  # 段階名 -> 秒数 (import / load / first_inference)
+        self._load = load
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """読み込みスレッドを開始して self を返す (2回目以降の呼び出しは何もしない)"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="model-loader", daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            started = time.perf_counter()
+            load = self._load
+            if load is None:
+                import spacy  # noqa: F401  (import にかかる時間をモデルの読み込みと分けて計る)
+                from analyzer import load_pipeline
+                load = load_pipeline
+            self.timings["import"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            nlp = load(self.model_name, self.profile)
+            self.timings["load"] = time.perf_counter() - started
+
+            if self.warmup_text:
+                # 最初の解析でだけ行われる初期化 (語彙の表の読み込みなど) を済ませておく
+                started = time.perf_counter()
+                nlp(self.warmup_text)
+                self.timings["first_inference"] = time.perf_counter() - started
+            self.nlp = nlp
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ready.set()
+
+    def wait(self, timeout=None):
+        """モデルの準備ができるまで待ってモデルを返す
+
+        start されていなければ開始する。timeout 秒以内に準備ができなければ TimeoutError、
+        読み込みに失敗していればその例外を送出する。
+        """
+        self.start()
+        if not self.ready.wait(timeout):
+            raise TimeoutError(f"モデル {self.model_name} の読み込みが {timeout} 秒以内に終わりませんでした")
+        if self.error is not None:
+            raise self.error
+        return self.nlp
+
+    def status(self):
+        """準備状況と段階ごとの時間 (ms) を返す (/health や画面の表示用)"""
+        if not self.ready.is_set():
+            state = "loading"
+        else:
+            state = "error" if self.error is not None else "ready"
+        status = {
+            "state": state,
+            "model": self.model_name,
+            "timings_ms": {name: seconds * 1000 for name, seconds in self.timings.items()},
+        }
+        if self.error is not None:
+            status["error"] = str(self.error)
+        return status